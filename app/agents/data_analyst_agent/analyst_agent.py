@@ -3,10 +3,12 @@ from __future__ import annotations
 import asyncio
 from typing import Optional
 
+import pandas as pd
 from langgraph.graph import END, START, StateGraph
 from langgraph.checkpoint.memory import InMemorySaver
 
 from app.agents.data_analyst_agent.nodes.anomaly_detection_node import anomaly_detection_node
+from app.agents.data_analyst_agent.nodes.data_context_node import data_context_node
 from app.agents.data_analyst_agent.nodes.generate_final_output_node import generate_final_output_node
 from app.agents.data_analyst_agent.nodes.reflection_node import  stat_reflection_node, \
     trend_reflection_node, anomaly_reflection_node
@@ -20,6 +22,7 @@ from app.agents.data_analyst_agent.format import DataAnalysisOutput, Statistical
     AnomalyDetectionResult, DataQueryOutput
 
 from app.agents.data_analyst_agent.state import  AnalystState
+from app.services.dataset_registry import dataset_registry
 
 
 # ──────────────────────────────────────────────
@@ -30,6 +33,7 @@ class DataAnalystAgent:
     基于 LangGraph 的数据分析 Agent。
     
     采用 ReAct + Reflection 设计风格：
+    - 共享数据上下文节点（数据集概况、代表性样本、各分析引擎的预计算结果只准备一次）
     - 统计分析节点 -> 反思节点 -> 趋势预测节点 -> 反思节点 -> 异常检测节点 -> 反思节点 -> 最终输出
     """
     
@@ -47,6 +51,7 @@ class DataAnalystAgent:
         workflow = StateGraph(AnalystState)
         
         # 添加节点
+        workflow.add_node("data_context", data_context_node)
         workflow.add_node("statistical_analysis", statistical_analysis_node)
         workflow.add_node("stat_reflection", stat_reflection_node)
         workflow.add_node("trend_prediction", trend_prediction_node)
@@ -58,9 +63,11 @@ class DataAnalystAgent:
         workflow.add_node("saveToMd2", save_markdown_reports_node2)
         workflow.add_node("saveToMd3", save_markdown_reports_node3)
         # 定义边和路由
-        workflow.add_edge(START, "statistical_analysis")
-        workflow.add_edge(START, "trend_prediction")
-        workflow.add_edge(START, "anomaly_detection")
+        # 共享数据上下文只构建一次，再分发给三个并行的分析分支（补充轮次直接回到分析节点，不再重建）
+        workflow.add_edge(START, "data_context")
+        workflow.add_edge("data_context", "statistical_analysis")
+        workflow.add_edge("data_context", "trend_prediction")
+        workflow.add_edge("data_context", "anomaly_detection")
         
         # 统计分析 -> 反思 -> 根据反思结果决定下一步
         workflow.add_edge("statistical_analysis", "stat_reflection")
@@ -110,6 +117,7 @@ class DataAnalystAgent:
         # 初始化状态
         initial_state: AnalystState = {
             "input_data": input_data,
+            "data_context": None,
             "statistical_result": None,
             "trend_result": None,
             "anomaly_result": None,
@@ -157,53 +165,57 @@ if __name__ == "__main__":
     # 实际使用时，应该从数据查询 Agent 获取输出
     
     # 模拟数据查询 Agent 的输出
+    mock_rows = [
+        {"date": "2024-01-01", "sales": 1200, "region": "北京", "quantity": 8, "category": "电子产品"},
+        {"date": "2024-01-02", "sales": 950, "region": "上海", "quantity": 5, "category": "家居用品"},
+        {"date": "2024-01-03", "sales": 1800, "region": "广州", "quantity": 12, "category": "服装"},
+        {"date": "2024-01-04", "sales": 1450, "region": "深圳", "quantity": 10, "category": "电子产品"},
+        {"date": "2024-01-05", "sales": 2100, "region": "北京", "quantity": 15, "category": "美妆"},
+        {"date": "2024-01-06", "sales": 880, "region": "成都", "quantity": 6, "category": "家居用品"},
+        {"date": "2024-01-07", "sales": 1650, "region": "上海", "quantity": 11, "category": "服装"},
+        {"date": "2024-01-08", "sales": 2300, "region": "广州", "quantity": 18, "category": "电子产品"},
+        {"date": "2024-01-09", "sales": 1100, "region": "深圳", "quantity": 7, "category": "美妆"},
+        {"date": "2024-01-10", "sales": 1950, "region": "北京", "quantity": 14, "category": "家居用品"},
+        {"date": "2024-01-11", "sales": 750, "region": "成都", "quantity": 4, "category": "服装"},
+        {"date": "2024-01-12", "sales": 2600, "region": "上海", "quantity": 20, "category": "电子产品"},
+        {"date": "2024-01-13", "sales": 1350, "region": "广州", "quantity": 9, "category": "美妆"},
+        {"date": "2024-01-14", "sales": 1700, "region": "深圳", "quantity": 12, "category": "家居用品"},
+        {"date": "2024-01-15", "sales": 980, "region": "北京", "quantity": 6, "category": "服装"},
+        {"date": "2024-01-16", "sales": 2450, "region": "成都", "quantity": 17, "category": "电子产品"},
+        {"date": "2024-01-17", "sales": 1120, "region": "上海", "quantity": 8, "category": "美妆"},
+        {"date": "2024-01-18", "sales": 1890, "region": "广州", "quantity": 13, "category": "家居用品"},
+        {"date": "2024-01-19", "sales": 820, "region": "深圳", "quantity": 5, "category": "服装"},
+        {"date": "2024-01-20", "sales": 2750, "region": "北京", "quantity": 22, "category": "电子产品"},
+        {"date": "2024-01-21", "sales": 1400, "region": "成都", "quantity": 10, "category": "美妆"},
+        {"date": "2024-01-22", "sales": 1600, "region": "上海", "quantity": 11, "category": "家居用品"},
+        {"date": "2024-01-23", "sales": 1050, "region": "广州", "quantity": 7, "category": "服装"},
+        {"date": "2024-01-24", "sales": 2200, "region": "深圳", "quantity": 16, "category": "电子产品"},
+        {"date": "2024-01-25", "sales": 930, "region": "北京", "quantity": 6, "category": "美妆"},
+        {"date": "2024-01-26", "sales": 2550, "region": "成都", "quantity": 19, "category": "家居用品"},
+        {"date": "2024-01-27", "sales": 1280, "region": "上海", "quantity": 9, "category": "服装"},
+        {"date": "2024-01-28", "sales": 1980, "region": "广州", "quantity": 14, "category": "电子产品"},
+        {"date": "2024-01-29", "sales": 780, "region": "深圳", "quantity": 5, "category": "美妆"},
+        {"date": "2024-01-30", "sales": 2850, "region": "北京", "quantity": 23, "category": "家居用品"},
+        {"date": "2024-01-31", "sales": 1620, "region": "成都", "quantity": 12, "category": "服装"},
+        {"date": "2024-02-01", "sales": 3100, "region": "上海", "quantity": 25, "category": "电子产品"},
+        {"date": "2024-02-02", "sales": 1150, "region": "广州", "quantity": 8, "category": "美妆"},
+        {"date": "2024-02-03", "sales": 2050, "region": "深圳", "quantity": 15, "category": "家居用品"},
+        {"date": "2024-02-04", "sales": 890, "region": "北京", "quantity": 6, "category": "服装"},
+        {"date": "2024-02-05", "sales": 3400, "region": "成都", "quantity": 28, "category": "电子产品"},
+        {"date": "2024-02-06", "sales": 1330, "region": "上海", "quantity": 10, "category": "美妆"},
+        {"date": "2024-02-07", "sales": 2180, "region": "广州", "quantity": 16, "category": "家居用品"},
+        {"date": "2024-02-08", "sales": 960, "region": "深圳", "quantity": 7, "category": "服装"},
+        {"date": "2024-02-09", "sales": 3650, "region": "北京", "quantity": 30, "category": "电子产品"},
+    ]
+    # 完整数据登记到数据集注册表，状态中只流转句柄
+    handle = dataset_registry.register(pd.DataFrame(mock_rows), source="csv", path="data/test_sales.csv")
     mock_query_output = DataQueryOutput(
         source="csv",
         path="data/test_sales.csv",
-        columns=["date", "sales", "region", "quantity", "category"],
-        row_count=40,
-        all_rows=[
-            {"date": "2024-01-01", "sales": 1200, "region": "北京", "quantity": 8, "category": "电子产品"},
-            {"date": "2024-01-02", "sales": 950, "region": "上海", "quantity": 5, "category": "家居用品"},
-            {"date": "2024-01-03", "sales": 1800, "region": "广州", "quantity": 12, "category": "服装"},
-            {"date": "2024-01-04", "sales": 1450, "region": "深圳", "quantity": 10, "category": "电子产品"},
-            {"date": "2024-01-05", "sales": 2100, "region": "北京", "quantity": 15, "category": "美妆"},
-            {"date": "2024-01-06", "sales": 880, "region": "成都", "quantity": 6, "category": "家居用品"},
-            {"date": "2024-01-07", "sales": 1650, "region": "上海", "quantity": 11, "category": "服装"},
-            {"date": "2024-01-08", "sales": 2300, "region": "广州", "quantity": 18, "category": "电子产品"},
-            {"date": "2024-01-09", "sales": 1100, "region": "深圳", "quantity": 7, "category": "美妆"},
-            {"date": "2024-01-10", "sales": 1950, "region": "北京", "quantity": 14, "category": "家居用品"},
-            {"date": "2024-01-11", "sales": 750, "region": "成都", "quantity": 4, "category": "服装"},
-            {"date": "2024-01-12", "sales": 2600, "region": "上海", "quantity": 20, "category": "电子产品"},
-            {"date": "2024-01-13", "sales": 1350, "region": "广州", "quantity": 9, "category": "美妆"},
-            {"date": "2024-01-14", "sales": 1700, "region": "深圳", "quantity": 12, "category": "家居用品"},
-            {"date": "2024-01-15", "sales": 980, "region": "北京", "quantity": 6, "category": "服装"},
-            {"date": "2024-01-16", "sales": 2450, "region": "成都", "quantity": 17, "category": "电子产品"},
-            {"date": "2024-01-17", "sales": 1120, "region": "上海", "quantity": 8, "category": "美妆"},
-            {"date": "2024-01-18", "sales": 1890, "region": "广州", "quantity": 13, "category": "家居用品"},
-            {"date": "2024-01-19", "sales": 820, "region": "深圳", "quantity": 5, "category": "服装"},
-            {"date": "2024-01-20", "sales": 2750, "region": "北京", "quantity": 22, "category": "电子产品"},
-            {"date": "2024-01-21", "sales": 1400, "region": "成都", "quantity": 10, "category": "美妆"},
-            {"date": "2024-01-22", "sales": 1600, "region": "上海", "quantity": 11, "category": "家居用品"},
-            {"date": "2024-01-23", "sales": 1050, "region": "广州", "quantity": 7, "category": "服装"},
-            {"date": "2024-01-24", "sales": 2200, "region": "深圳", "quantity": 16, "category": "电子产品"},
-            {"date": "2024-01-25", "sales": 930, "region": "北京", "quantity": 6, "category": "美妆"},
-            {"date": "2024-01-26", "sales": 2550, "region": "成都", "quantity": 19, "category": "家居用品"},
-            {"date": "2024-01-27", "sales": 1280, "region": "上海", "quantity": 9, "category": "服装"},
-            {"date": "2024-01-28", "sales": 1980, "region": "广州", "quantity": 14, "category": "电子产品"},
-            {"date": "2024-01-29", "sales": 780, "region": "深圳", "quantity": 5, "category": "美妆"},
-            {"date": "2024-01-30", "sales": 2850, "region": "北京", "quantity": 23, "category": "家居用品"},
-            {"date": "2024-01-31", "sales": 1620, "region": "成都", "quantity": 12, "category": "服装"},
-            {"date": "2024-02-01", "sales": 3100, "region": "上海", "quantity": 25, "category": "电子产品"},
-            {"date": "2024-02-02", "sales": 1150, "region": "广州", "quantity": 8, "category": "美妆"},
-            {"date": "2024-02-03", "sales": 2050, "region": "深圳", "quantity": 15, "category": "家居用品"},
-            {"date": "2024-02-04", "sales": 890, "region": "北京", "quantity": 6, "category": "服装"},
-            {"date": "2024-02-05", "sales": 3400, "region": "成都", "quantity": 28, "category": "电子产品"},
-            {"date": "2024-02-06", "sales": 1330, "region": "上海", "quantity": 10, "category": "美妆"},
-            {"date": "2024-02-07", "sales": 2180, "region": "广州", "quantity": 16, "category": "家居用品"},
-            {"date": "2024-02-08", "sales": 960, "region": "深圳", "quantity": 7, "category": "服装"},
-            {"date": "2024-02-09", "sales": 3650, "region": "北京", "quantity": 30, "category": "电子产品"},
-        ]
+        columns=handle.columns,
+        row_count=handle.row_count,
+        dataset_id=handle.dataset_id,
+        fingerprint=handle.fingerprint,
     )
     
     # 创建数据分析 Agent
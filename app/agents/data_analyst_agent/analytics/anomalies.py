@@ -0,0 +1,313 @@
+from __future__ import annotations
+
+import time
+import warnings
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.agents.data_analyst_agent.analytics.columns import ColumnRoles, as_datetime, column_roles, hashable, \
+    time_column
+from app.agents.data_analyst_agent.analytics.statistics import fmt, markdown_table
+from app.config.env_utils import ANOMALY_IQR_K, ANOMALY_MAD_THRESHOLD, ANOMALY_MAX_ROWS, ANOMALY_MIN_VOTES, \
+    ANOMALY_ROLLING_K, ANOMALY_ROLLING_WINDOW, ANOMALY_Z_THRESHOLD
+from app.services.dataset_registry import ColumnarDataset
+
+METHODS = ("iqr", "zscore", "mad", "rolling")
+_METHOD_LABELS = {"iqr": "IQR", "zscore": "z-score", "mad": "MAD", "rolling": "滚动残差"}
+# MAD 换算为标准差的系数（正态分布下）
+_MAD_SCALE = 1.4826
+# 类型校验时用于判断列「应当」是什么类型的样本行数与比例
+_TYPE_SAMPLE_ROWS = 1000
+_TYPE_MAJORITY = 0.9
+
+
+# ──────────────────────────────────────────────
+# 1. 单列离群检测（NumPy 向量化，对全部行执行）
+# ──────────────────────────────────────────────
+def _window_sum(cumulative: np.ndarray, window: int) -> np.ndarray:
+    """由前缀和得到每个位置之前 window 个元素之和（不含当前位置），用切片平移而不是花式索引"""
+    n = len(cumulative) - 1
+    lagged = np.zeros(n, dtype=cumulative.dtype)
+    if n > window:
+        lagged[window:] = cumulative[:n - window]
+    return cumulative[:n] - lagged
+
+
+def _rolling_residual(values: np.ndarray, order: Any, window: int) -> np.ndarray:
+    """
+    按时间顺序，用前 window 个点中有效值的均值 / 标准差计算当前点的标准化残差。
+    滚动和通过累计和一次算出，复杂度 O(n)，不依赖 pandas rolling。
+    """
+    ordered = values[order]
+    valid = ~np.isnan(ordered)
+    filled = np.where(valid, ordered, 0.0)
+    count = _window_sum(np.concatenate(([0], np.cumsum(valid))), window)
+    total = _window_sum(np.concatenate(([0.0], np.cumsum(filled))), window)
+    squares = _window_sum(np.concatenate(([0.0], np.cumsum(filled * filled))), window)
+    del filled
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        std = np.sqrt(np.maximum((squares - count * mean * mean) / (count - 1), 0.0))
+        residual = (ordered - mean) / std
+    residual[~(valid & (count >= max(window // 2, 3)) & (std > 0))] = np.nan
+    result = np.empty_like(residual)
+    result[order] = residual
+    return result
+
+
+def detect_column(values: np.ndarray, order: Any = None) -> Dict[str, Any]:
+    """
+    对一列数值做四种检测，返回各方法的命中掩码与稳健 z 分数：
+    - IQR：超出 [Q1 - k·IQR, Q3 + k·IQR]
+    - z-score：|x - 均值| / 标准差 超过阈值
+    - MAD：|x - 中位数| / (1.4826·MAD) 超过阈值（对极端值不敏感）
+    - 滚动残差：相对前一个时间窗口的均值偏离超过 k 倍窗口标准差（有时间列时）
+    """
+    valid = ~np.isnan(values)
+    present = values[valid]
+    masks: Dict[str, np.ndarray] = {}
+    info: Dict[str, Any] = {"count": int(len(present))}
+    if len(present) < 4:
+        return {"masks": {}, "robust_z": np.zeros(len(values)), **info}
+
+    # 一次 partition 取出三个分位数（O(n)，不做全量排序）
+    q1, median, q3 = np.quantile(present, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    lower, upper = q1 - ANOMALY_IQR_K * iqr, q3 + ANOMALY_IQR_K * iqr
+    mean, std = float(present.mean()), float(present.std(ddof=1))
+    mad = float(np.median(np.abs(present - median)))
+    scale = _MAD_SCALE * mad if mad > 0 else 1.2533 * float(np.mean(np.abs(present - median)))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        masks["iqr"] = (values < lower) | (values > upper) if iqr > 0 else np.zeros(len(values), dtype=bool)
+        masks["zscore"] = np.abs(values - mean) > ANOMALY_Z_THRESHOLD * std if std > 0 else np.zeros(len(values), dtype=bool)
+        robust_z = np.abs(values - median) / scale if scale > 0 else np.zeros(len(values))
+        robust_z = np.where(valid, robust_z, 0.0)
+        masks["mad"] = robust_z > ANOMALY_MAD_THRESHOLD
+        if order is not None:
+            masks["rolling"] = np.abs(_rolling_residual(values, order, ANOMALY_ROLLING_WINDOW)) > ANOMALY_ROLLING_K
+
+    info.update({
+        "median": float(median),
+        "q1": float(q1),
+        "q3": float(q3),
+        "lower": float(lower),
+        "upper": float(upper),
+        "mean": mean,
+        "std": std,
+    })
+    return {"masks": masks, "robust_z": robust_z, **info}
+
+
+# ──────────────────────────────────────────────
+# 2. 数据质量：缺失值、重复行、类型违规
+# ──────────────────────────────────────────────
+_HASH_PRIME = np.uint64(0x100000001B3)
+
+
+def _encode_column(series: pd.Series) -> Tuple[np.ndarray, np.ndarray, Optional[Tuple[np.ndarray, pd.Index]]]:
+    """
+    把一列编码为 (缺失掩码, 逐行哈希, 字符串列的 (编码, 去重取值))。
+    字符串列只 factorize 一次：缺失值、重复行、类型校验都基于整数编码计算，不再逐行处理字符串。
+    """
+    if series.dtype == object or isinstance(series.dtype, (pd.CategoricalDtype, pd.StringDtype)):
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        return codes < 0, pd.util.hash_array(codes.astype(np.int64)), (codes, pd.Index(uniques))
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        values = series.to_numpy(dtype="float64", na_value=np.nan)
+        return np.isnan(values), pd.util.hash_array(values), None
+    return series.isna().to_numpy(), pd.util.hash_pandas_object(series, index=False).to_numpy(), None
+
+
+def _type_violation(name: str, codes: np.ndarray, uniques: pd.Index, expected: str) -> Optional[Dict[str, Any]]:
+    """只解析去重后的取值，再按编码统计违规行数"""
+    distinct = pd.Series(uniques, dtype=object)
+    parsed = as_datetime(distinct) if expected == "datetime" else pd.to_numeric(distinct, errors="coerce")
+    bad = parsed.isna().to_numpy()
+    if not bad.any():
+        return None
+    count = int(bad[codes[codes >= 0]].sum())
+    examples = [str(v) for v in uniques[bad][:3]]
+    return {"column": name, "expected": expected, "count": count, "examples": examples}
+
+
+def data_quality(frame: pd.DataFrame, roles: ColumnRoles) -> Dict[str, Any]:
+    """
+    - 缺失值：各列缺失数
+    - 重复行：各列哈希合成逐行哈希后统计重复
+    - 类型违规：字符串列中绝大多数（样本中 ≥90%）可解析为数值或日期时，其余无法解析的非空值；数值列中的 ±inf
+    """
+    missing: Dict[str, int] = {}
+    violations: List[Dict[str, Any]] = []
+    row_hash = np.zeros(len(frame), dtype=np.uint64)
+    for name in frame.columns:
+        series = hashable(frame[name])
+        is_missing, hashes, encoded = _encode_column(series)
+        row_hash = (row_hash ^ hashes) * _HASH_PRIME
+        if is_missing.any():
+            missing[str(name)] = int(is_missing.sum())
+
+        if encoded is not None and name in roles.categorical + roles.datetime:
+            expected = "datetime" if name in roles.datetime else None
+            sample = series.head(_TYPE_SAMPLE_ROWS).dropna()
+            if expected is None and len(sample) and pd.to_numeric(sample, errors="coerce").notna().mean() >= _TYPE_MAJORITY:
+                expected = "numeric"
+            if expected is not None:
+                violation = _type_violation(str(name), *encoded, expected)
+                if violation:
+                    violations.append(violation)
+        elif name in roles.numeric:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                count = int(np.isinf(series.to_numpy(dtype="float64", na_value=np.nan)).sum())
+            if count:
+                violations.append({"column": str(name), "expected": "finite", "count": count, "examples": ["inf"]})
+
+    # 排序后比较相邻哈希，比哈希表去重快
+    row_hash.sort()
+    return {
+        "missing": missing,
+        "duplicate_rows": int((row_hash[1:] == row_hash[:-1]).sum()),
+        "type_violations": violations,
+    }
+
+
+# ──────────────────────────────────────────────
+# 3. 汇总：各列命中计数 + 多种方法同时命中的异常行
+# ──────────────────────────────────────────────
+def _time_order(frame: pd.DataFrame, roles: ColumnRoles) -> Tuple[Optional[str], Any]:
+    """返回 (时间列名, 按时间排序的行下标)；已按时间排序时返回 slice(None)，避免整列重排"""
+    name, stamps = time_column(frame, roles)
+    if name is None:
+        return None, None
+    if stamps.is_monotonic_increasing:
+        return name, slice(None)
+    # NaT 排在最后
+    return name, np.argsort(stamps.to_numpy(dtype="datetime64[ns]"), kind="stable")
+
+
+def detect_anomalies(frame: pd.DataFrame, roles: Optional[ColumnRoles] = None) -> Dict[str, Any]:
+    start = time.perf_counter()
+    roles = roles or column_roles(frame)
+    n = len(frame)
+    time_column, order = _time_order(frame, roles)
+
+    row_score = np.zeros(n)
+    row_column = np.full(n, -1, dtype=np.int64)
+    row_methods = np.zeros(n, dtype=np.uint8)
+    columns = []
+    for ci, name in enumerate(roles.measures):
+        values = frame[name].to_numpy(dtype="float64", na_value=np.nan)
+        values = np.where(np.isinf(values), np.nan, values)
+        result = detect_column(values, order)
+        masks = result["masks"]
+        summary = {k: v for k, v in result.items() if k not in ("masks", "robust_z")}
+        summary["column"] = name
+        summary["flags"] = {m: int(masks[m].sum()) for m in METHODS if m in masks}
+        columns.append(summary)
+        if not masks:
+            continue
+
+        votes = sum(masks[m].astype(np.uint8) for m in masks)
+        bits = sum(masks[m].astype(np.uint8) << i for i, m in enumerate(METHODS) if m in masks)
+        # 只有多种方法同时命中才算异常行，按稳健 z 分数排序
+        score = np.where(votes >= min(ANOMALY_MIN_VOTES, len(masks)), result["robust_z"], 0.0)
+        better = score > row_score
+        row_score[better] = score[better]
+        row_column[better] = ci
+        row_methods[better] = bits[better]
+
+    flagged = np.flatnonzero(row_score > 0)
+    top = flagged[np.argsort(-row_score[flagged], kind="stable")[:ANOMALY_MAX_ROWS]]
+    context_columns = (roles.datetime + roles.categorical)[:3]
+    rows = []
+    for i in top:
+        name = roles.measures[row_column[i]]
+        stats = columns[row_column[i]]
+        rows.append({
+            "row": int(i),
+            "column": name,
+            "value": float(frame[name].iat[i]),
+            "median": stats["median"],
+            "robust_z": float(row_score[i]),
+            "methods": [m for bit, m in enumerate(METHODS) if row_methods[i] >> bit & 1],
+            "context": {c: str(frame[c].iat[i]) for c in context_columns},
+        })
+
+    return {
+        "row_count": n,
+        "time_column": time_column,
+        "columns": columns,
+        "flagged_total": int(len(flagged)),
+        "flagged_rows": rows,
+        "quality": data_quality(frame, roles),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+def dataset_anomalies(dataset: ColumnarDataset) -> Dict[str, Any]:
+    """数据集的异常检测结果（缓存在 dataset.analytics 中）"""
+    if "anomalies" not in dataset.analytics:
+        dataset.analytics["anomalies"] = detect_anomalies(dataset.frame)
+    return dataset.analytics["anomalies"]
+
+
+def render_anomalies(result: Dict[str, Any]) -> str:
+    """渲染为紧凑的 Markdown：各列命中计数、数据质量、需要解释的异常行"""
+    n = result["row_count"]
+    parts = [f"### 各数值字段离群检测（全部 {n} 行）"]
+    rolling = result["time_column"] is not None
+    header = ["字段", "中位数", "Q1", "Q3", "IQR 上下界", "IQR", "z-score", "MAD"] + (["滚动残差"] if rolling else [])
+    parts.append(markdown_table(header, [
+        [
+            c["column"],
+            fmt(c.get("median")),
+            fmt(c.get("q1")),
+            fmt(c.get("q3")),
+            f"[{fmt(c.get('lower'))}, {fmt(c.get('upper'))}]",
+        ] + [str(c["flags"].get(m, "-")) for m in METHODS if m != "rolling" or rolling]
+        for c in result["columns"]
+    ]))
+    if rolling:
+        parts.append(f"滚动残差按时间字段 {result['time_column']} 排序，窗口为前 {ANOMALY_ROLLING_WINDOW} 个点。")
+
+    quality = result["quality"]
+    missing = "，".join(f"{c}: {v}（{v / n * 100:.1f}%）" for c, v in quality["missing"].items()) if n else ""
+    parts.append("### 数据质量")
+    lines = [
+        f"- 缺失值：{missing or '无'}",
+        f"- 完全重复的行：{quality['duplicate_rows']}",
+    ]
+    if quality["type_violations"]:
+        lines.append("- 类型违规：" + "；".join(
+            f"{v['column']} 应为 {v['expected']}，{v['count']} 个值不符（如 {', '.join(v['examples'])}）"
+            for v in quality["type_violations"]
+        ))
+    else:
+        lines.append("- 类型违规：无")
+    parts.append("\n".join(lines))
+
+    total, shown = result["flagged_total"], len(result["flagged_rows"])
+    parts.append(
+        f"### 异常行（至少 {ANOMALY_MIN_VOTES} 种方法同时命中，共 {total} 行"
+        + (f"，按稳健 z 分数展示前 {shown} 行）" if shown < total else "）")
+    )
+    if result["flagged_rows"]:
+        context = list(result["flagged_rows"][0]["context"])
+        parts.append(markdown_table(
+            ["行索引", "字段", "值", "中位数", "稳健 z", "命中方法"] + context,
+            [
+                [str(r["row"]), r["column"], fmt(r["value"]), fmt(r["median"]), f"{r['robust_z']:.1f}",
+                 "、".join(_METHOD_LABELS[m] for m in r["methods"])] + [r["context"][c] for c in context]
+                for r in result["flagged_rows"]
+            ],
+        ))
+    else:
+        parts.append("（无）")
+    return "\n\n".join(parts)
+
+
+__all__ = ["METHODS", "data_quality", "dataset_anomalies", "detect_anomalies", "detect_column", "render_anomalies"]
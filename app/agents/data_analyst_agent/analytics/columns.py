@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.db.pushdown import infer_column_kinds
+
+# 推断列类型时使用的样本行数
+_KIND_SAMPLE_ROWS = 1000
+# 不可哈希、无法直接计数 / 分组 / factorize 的单元格类型（如 JSON 展开时保留的数组与对象）
+_UNHASHABLE = (list, dict, set, np.ndarray)
+
+
+def is_identifier(name: str) -> bool:
+    """主键 / 外键类的 id 列：求和、求均值、相关性都没有意义"""
+    return name == "id" or name.endswith("_id")
+
+
+@dataclass
+class ColumnRoles:
+    """各列在分析中的角色（列名均为数据集中的原列名）"""
+    numeric: List[str] = field(default_factory=list)
+    measures: List[str] = field(default_factory=list)
+    categorical: List[str] = field(default_factory=list)
+    datetime: List[str] = field(default_factory=list)
+
+
+def column_roles(frame: pd.DataFrame) -> ColumnRoles:
+    """按样本推断列类型：数值列中排除 id 列作为度量；字符串日期也识别为时间列"""
+    roles = ColumnRoles()
+    sample = frame.head(_KIND_SAMPLE_ROWS)
+    for name, kind in zip(frame.columns, infer_column_kinds(sample)):
+        if kind == "numeric":
+            roles.numeric.append(name)
+            if not is_identifier(str(name)):
+                roles.measures.append(name)
+        elif kind == "datetime":
+            roles.datetime.append(name)
+        else:
+            roles.categorical.append(name)
+    return roles
+
+
+def _cell_text(value):
+    if isinstance(value, _UNHASHABLE):
+        return json.dumps(value.tolist() if isinstance(value, np.ndarray) else value, ensure_ascii=False, default=str)
+    return value
+
+
+def hashable(series: pd.Series) -> pd.Series:
+    """含 list / dict 等不可哈希取值的对象列转为 JSON 文本，其余列原样返回；计数、分组、编码前调用"""
+    if series.dtype != object or pd.api.types.infer_dtype(series, skipna=True) in ("string", "empty"):
+        return series
+    if not series.map(lambda v: isinstance(v, _UNHASHABLE)).any():
+        return series
+    return series.map(_cell_text)
+
+
+def as_datetime(series: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    # 先按首个值推断统一格式（快），大部分解析失败时再逐个按混合格式解析
+    parsed = pd.to_datetime(series, errors="coerce")
+    if parsed.notna().sum() < series.notna().sum() / 2:
+        parsed = pd.to_datetime(series, errors="coerce", format="mixed")
+    return parsed
+
+
+def time_column(frame: pd.DataFrame, roles: ColumnRoles) -> Tuple[Optional[str], Optional[pd.Series]]:
+    """取第一个基本可解析（≥90% 非空）的时间列，返回 (列名, 解析后的时间序列)"""
+    for name in roles.datetime:
+        stamps = as_datetime(frame[name])
+        if stamps.notna().mean() > 0.9:
+            return name, stamps
+    return None, None
+
+
+def as_float(frame: pd.DataFrame, columns: List[str]):
+    """数值列转为 float64 的二维数组（缺失值为 NaN），供向量化计算使用"""
+    return frame[columns].to_numpy(dtype="float64", na_value=float("nan"))
+
+
+__all__ = ["ColumnRoles", "as_datetime", "as_float", "column_roles", "hashable", "is_identifier", "time_column"]
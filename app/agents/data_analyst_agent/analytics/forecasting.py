@@ -0,0 +1,424 @@
+from __future__ import annotations
+
+import time
+from statistics import NormalDist
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.agents.data_analyst_agent.analytics.columns import ColumnRoles, column_roles, time_column
+from app.agents.data_analyst_agent.analytics.statistics import fmt, markdown_table
+from app.config.env_utils import FORECAST_AGG, FORECAST_GRANULARITY, FORECAST_HORIZON, FORECAST_INTERVAL, \
+    FORECAST_MA_WINDOW, FORECAST_MAX_MEASURES, FORECAST_MIN_PERIODS, FORECAST_RECENT_PERIODS
+from app.services.dataset_registry import ColumnarDataset
+
+# 粒度 -> (中文名, 季节周期, 同比滞后期数)；季节周期为 None 时不拟合季节项
+GRANULARITIES: Dict[str, Tuple[str, Optional[int], int]] = {
+    "Y": ("年", None, 1),
+    "Q": ("季度", 4, 4),
+    "M": ("月", 12, 12),
+    "W": ("周", 52, 52),
+    "D": ("日", 7, 365),
+}
+COUNT_SERIES = "记录数"
+
+# Holt-Winters 平滑参数网格：beta、gamma 以 alpha 的比例给出，保证参数落在可行域内
+_ALPHAS = np.linspace(0.05, 0.95, 10)
+_BETA_FRACTIONS = np.array([0.0, 0.05, 0.1, 0.2, 0.4, 0.7, 1.0])
+_GAMMA_FRACTIONS = np.array([0.0, 0.05, 0.1, 0.2, 0.4, 0.7])
+# 相对变化低于该比例视为平稳
+_FLAT_CHANGE = 0.05
+
+
+# ──────────────────────────────────────────────
+# 1. 时间列识别与重采样
+# ──────────────────────────────────────────────
+def wall_clock(stamps: pd.Series) -> pd.Series:
+    """带时区的时间（如 PostgreSQL timestamptz）去掉时区、保留当地时间，按当地日历划分周期"""
+    return stamps.dt.tz_localize(None) if stamps.dt.tz is not None else stamps
+
+
+def choose_granularity(stamps: pd.Series, min_periods: int = FORECAST_MIN_PERIODS) -> str:
+    """从粗到细选择第一个能得到至少 min_periods 个周期的粒度（都不满足时按日）"""
+    stamps = wall_clock(stamps)
+    first, last = stamps.min(), stamps.max()
+    for freq in ("Y", "Q", "M", "W"):
+        if len(pd.period_range(first, last, freq=freq)) >= min_periods:
+            return freq
+    return "D"
+
+
+def resample(
+    frame: pd.DataFrame,
+    stamps: pd.Series,
+    measures: List[str],
+    freq: str,
+    agg: str = FORECAST_AGG,
+) -> Tuple[pd.PeriodIndex, Dict[str, np.ndarray], bool]:
+    """
+    按周期汇总：各行映射为周期序号后用 np.bincount 一次聚合，缺少数据的周期记录数为 0、度量为 NaN（均值口径）或 0（求和口径）。
+    返回 (周期索引, {序列名: 各周期取值}, 最后一个周期是否不完整)。
+    """
+    stamps = wall_clock(stamps)
+    valid = stamps.notna().to_numpy()
+    ordinals = stamps.dt.to_period(freq).array.asi8[valid]
+    start = int(ordinals.min())
+    codes = ordinals - start
+    size = int(codes.max()) + 1
+    periods = pd.period_range(pd.Period(ordinal=start, freq=freq), periods=size, freq=freq)
+
+    series: Dict[str, np.ndarray] = {COUNT_SERIES: np.bincount(codes, minlength=size).astype(np.float64)}
+    for name in measures:
+        values = frame[name].to_numpy(dtype="float64", na_value=np.nan)[valid]
+        present = ~np.isnan(values)
+        total = np.bincount(codes, weights=np.where(present, values, 0.0), minlength=size)
+        if agg == "mean":
+            count = np.bincount(codes, weights=present, minlength=size)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                series[name] = np.where(count > 0, total / count, np.nan)
+        else:
+            series[name] = total
+
+    # 最后一个周期还没结束（如月中导出的数据）时，其汇总值偏低，不参与增长率与建模
+    last = stamps.max()
+    partial = freq != "D" and periods[-1].end_time.normalize() > last.normalize()
+    return periods, series, bool(partial)
+
+
+# ──────────────────────────────────────────────
+# 2. 增长率与移动平均
+# ──────────────────────────────────────────────
+def growth(values: np.ndarray, lag: int) -> np.ndarray:
+    """相对 lag 个周期前的增长率；基期为 0 或缺失时为 NaN"""
+    result = np.full(len(values), np.nan)
+    if lag < len(values):
+        base = values[:-lag]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result[lag:] = np.where(base != 0, values[lag:] / base - 1, np.nan)
+    return result
+
+
+def moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    """尾随移动平均（窗口不足时为 NaN），由累计和一次算出"""
+    result = np.full(len(values), np.nan)
+    if 0 < window <= len(values):
+        csum = np.concatenate(([0.0], np.cumsum(values)))
+        result[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return result
+
+
+# ──────────────────────────────────────────────
+# 3. 预测模型：线性趋势、Holt-Winters（加法）
+# ──────────────────────────────────────────────
+def linear_trend(values: np.ndarray, horizon: int, level: float = FORECAST_INTERVAL) -> Dict[str, Any]:
+    """最小二乘线性趋势，区间为预测区间（含参数不确定性），分位数按正态近似"""
+    n = len(values)
+    x = np.arange(n, dtype=np.float64)
+    slope, intercept = np.polyfit(x, values, 1)
+    if abs(slope) * n <= 1e-9 * (float(np.abs(values).max()) or 1.0):
+        # 常数序列的斜率只剩浮点误差
+        slope, intercept = 0.0, float(values.mean())
+    fitted = intercept + slope * x
+    residual = values - fitted
+    sse = float(residual @ residual)
+    sst = float(((values - values.mean()) ** 2).sum())
+    s = np.sqrt(sse / max(n - 2, 1))
+
+    future = np.arange(n, n + horizon, dtype=np.float64)
+    xbar = x.mean()
+    sxx = float(((x - xbar) ** 2).sum())
+    se = s * np.sqrt(1 + 1 / n + (future - xbar) ** 2 / sxx)
+    z = NormalDist().inv_cdf(0.5 + level / 2)
+    forecast = intercept + slope * future
+    return {
+        "slope": float(slope),
+        "r2": 1 - sse / sst if sst > 0 else 0.0,
+        "fitted": fitted,
+        "forecast": forecast,
+        "lower": forecast - z * se,
+        "upper": forecast + z * se,
+    }
+
+
+def holt_winters(
+    values: np.ndarray,
+    season: Optional[int],
+    horizon: int,
+    level: float = FORECAST_INTERVAL,
+) -> Dict[str, Any]:
+    """
+    加法 Holt-Winters（误差修正形式）：
+        e = y - (l + b + s[t-m])，l ← l + b + α·e，b ← b + β·e，s[t] ← s[t-m] + γ·e
+    数据不足两个完整季节周期时退化为 Holt 线性趋势（无季节项）。
+    全部参数组合作为一个向量同时递推，按一步预测误差平方和选出最优组合，不依赖 scipy / statsmodels。
+    """
+    n = len(values)
+    m = season if season and n >= 2 * season else None
+    alpha, beta_fraction, gamma_fraction = np.meshgrid(
+        _ALPHAS, _BETA_FRACTIONS, _GAMMA_FRACTIONS if m else np.zeros(1), indexing="ij"
+    )
+    alpha, beta, gamma = alpha.ravel(), (alpha * beta_fraction).ravel(), ((1 - alpha) * gamma_fraction).ravel()
+    k = len(alpha)
+
+    if m:
+        first, second = values[:m].mean(), values[m:2 * m].mean()
+        lvl = np.full(k, first)
+        trend = np.full(k, (second - first) / m)
+        seasonal = np.tile(values[:m] - first, (k, 1))
+    else:
+        lvl = np.full(k, values[0])
+        trend = np.full(k, values[1] - values[0])
+        seasonal = np.zeros((k, 1))
+    width = seasonal.shape[1]
+
+    sse = np.zeros(k)
+    for t in range(n):
+        s = seasonal[:, t % width]
+        error = values[t] - (lvl + trend + s)
+        sse += error * error
+        lvl = lvl + trend + alpha * error
+        trend = trend + beta * error
+        seasonal[:, t % width] = s + gamma * error
+
+    best = int(np.argmin(sse))
+    a, b, g = alpha[best], beta[best], gamma[best]
+    steps = np.arange(1, horizon + 1)
+    forecast = lvl[best] + steps * trend[best] + seasonal[best, (n + steps - 1) % width]
+
+    # h 步预测方差：σ²·(1 + Σ_{j<h} c_j²)，c_j = α + β·j + γ·[j 是季节周期的整数倍]
+    params = 2 + (1 if m else 0)
+    sigma2 = sse[best] / max(n - params, 1)
+    j = np.arange(1, horizon, dtype=np.float64)
+    c = a + b * j + (g * (j % m == 0) if m else 0.0)
+    variance = sigma2 * (1 + np.concatenate(([0.0], np.cumsum(c * c))))
+    z = NormalDist().inv_cdf(0.5 + level / 2)
+    return {
+        "season": m,
+        "alpha": float(a),
+        "beta": float(b),
+        "gamma": float(g),
+        "forecast": forecast,
+        "lower": forecast - z * np.sqrt(variance),
+        "upper": forecast + z * np.sqrt(variance),
+    }
+
+
+def _backtest(values: np.ndarray, season: Optional[int], horizon: int) -> Optional[Dict[str, float]]:
+    """留出最后 horizon 个周期做回测，比较两种模型的平均绝对误差"""
+    train = len(values) - horizon
+    if horizon < 1 or train < max(8, 2 * (season or 0) + 1):
+        return None
+    actual = values[train:]
+    return {
+        "linear": float(np.abs(linear_trend(values[:train], horizon)["forecast"] - actual).mean()),
+        "holt_winters": float(np.abs(holt_winters(values[:train], season, horizon)["forecast"] - actual).mean()),
+    }
+
+
+# ──────────────────────────────────────────────
+# 4. 单个序列的完整分析
+# ──────────────────────────────────────────────
+def _direction(values: np.ndarray, linear: Dict[str, Any]) -> str:
+    scale = abs(float(values.mean())) or 1.0
+    change = linear["slope"] * (len(values) - 1) / scale
+    residual_cv = float(np.std(values - linear["fitted"])) / scale
+    if abs(change) < _FLAT_CHANGE:
+        return "波动" if residual_cv > 0.2 else "平稳"
+    if linear["r2"] < 0.3 and residual_cv > 0.2:
+        return "波动"
+    return "上升" if change > 0 else "下降"
+
+
+def _seasonal_autocorrelation(values: np.ndarray, linear: Dict[str, Any], season: Optional[int]) -> Optional[float]:
+    """去除线性趋势后在季节滞后处的自相关系数"""
+    if not season or len(values) < 2 * season:
+        return None
+    residual = values - linear["fitted"]
+    residual = residual - residual.mean()
+    denominator = float(residual @ residual)
+    if denominator <= 1e-18 * len(values) * (float(np.abs(values).max()) or 1.0) ** 2:
+        return None
+    return float(residual[season:] @ residual[:-season]) / denominator
+
+
+def analyze_series(values: np.ndarray, freq: str, horizon: int = FORECAST_HORIZON) -> Dict[str, Any]:
+    _, season, yoy_lag = GRANULARITIES[freq]
+    result: Dict[str, Any] = {
+        "mom": growth(values, 1),
+        "yoy": growth(values, yoy_lag),
+        "moving_average": moving_average(values, FORECAST_MA_WINDOW),
+    }
+    # 缺失周期（均值口径下无数据）用线性插值补齐后再建模
+    present = ~np.isnan(values)
+    if present.sum() < 4:
+        return result
+    if not present.all():
+        x = np.arange(len(values))
+        values = np.interp(x, x[present], values[present])
+
+    linear = linear_trend(values, horizon)
+    hw = holt_winters(values, season, horizon)
+    errors = _backtest(values, season, horizon)
+    if errors:
+        model = min(errors, key=errors.get)
+    else:
+        model = "holt_winters" if hw["season"] else "linear"
+    result.update({
+        "direction": _direction(values, linear),
+        "slope": linear["slope"],
+        "r2": linear["r2"],
+        "seasonality": _seasonal_autocorrelation(values, linear, season),
+        "linear": linear,
+        "holt_winters": hw,
+        "backtest_mae": errors,
+        "model": model,
+    })
+    return result
+
+
+def compute_forecast(
+    frame: pd.DataFrame,
+    roles: Optional[ColumnRoles] = None,
+    granularity: str = FORECAST_GRANULARITY,
+    horizon: int = FORECAST_HORIZON,
+) -> Dict[str, Any]:
+    start = time.perf_counter()
+    roles = roles or column_roles(frame)
+    name, stamps = time_column(frame, roles)
+    if name is None:
+        return {"time_column": None}
+
+    freq = choose_granularity(stamps) if granularity == "auto" else granularity.upper()
+    if freq not in GRANULARITIES:
+        raise ValueError(f"不支持的时间粒度：{granularity}，可选 auto / {' / '.join(GRANULARITIES)}")
+    measures = roles.measures[:FORECAST_MAX_MEASURES]
+    periods, series, partial = resample(frame, stamps, measures, freq)
+    fitted = periods[:-1] if partial and len(periods) > 1 else periods
+
+    counts = series[COUNT_SERIES][:len(fitted)]
+    if counts.min() == counts.max():
+        # 每个周期一行（如日报表按日汇总）时记录数没有分析价值
+        del series[COUNT_SERIES]
+    analyses = {}
+    for label, values in series.items():
+        analyses[label] = analyze_series(values[:len(fitted)], freq, horizon)
+        analyses[label]["values"] = values
+    return {
+        "time_column": name,
+        "granularity": freq,
+        "agg": FORECAST_AGG,
+        "periods": periods,
+        "partial": partial,
+        "future": pd.period_range(fitted[-1] + 1, periods=horizon, freq=freq),
+        "series": analyses,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+def dataset_forecast(dataset: ColumnarDataset, granularity: str = FORECAST_GRANULARITY) -> Dict[str, Any]:
+    """数据集的时间序列分析结果（按粒度缓存在 dataset.analytics 中）"""
+    key = f"forecast:{granularity}"
+    if key not in dataset.analytics:
+        dataset.analytics[key] = compute_forecast(dataset.frame, granularity=granularity)
+    return dataset.analytics[key]
+
+
+# ──────────────────────────────────────────────
+# 5. 渲染为提示词
+# ──────────────────────────────────────────────
+_MODEL_LABELS = {"linear": "线性趋势", "holt_winters": "Holt-Winters"}
+
+
+def _period_label(period: pd.Period) -> str:
+    # 周粒度的 Period 字符串形如 "2024-01-01/2024-01-07"，只保留起始日
+    return str(period.start_time.date()) if period.freqstr.startswith("W") else str(period)
+
+
+def _pct(value: float) -> str:
+    return "-" if not np.isfinite(value) else f"{value * 100:+.1f}%"
+
+
+def _render_series(label: str, analysis: Dict[str, Any], result: Dict[str, Any]) -> str:
+    freq = result["granularity"]
+    unit = GRANULARITIES[freq][0]
+    parts = [f"#### {label}"]
+    if "model" not in analysis:
+        parts.append("有效周期不足 4 个，无法建模。")
+        return "\n\n".join(parts)
+
+    seasonality = analysis["seasonality"]
+    season_text = "未检验（数据不足两个完整季节周期或序列无波动）" if seasonality is None else (
+        f"{'存在' if seasonality > 0.3 else '不明显'}（周期 {GRANULARITIES[freq][1]} 个{unit}，去趋势后滞后自相关 {seasonality:.2f}）"
+    )
+    hw = analysis["holt_winters"]
+    errors = analysis["backtest_mae"]
+    model_text = _MODEL_LABELS[analysis["model"]] + (
+        f"（回测 MAE：线性趋势 {fmt(errors['linear'])}，Holt-Winters {fmt(errors['holt_winters'])}）" if errors else ""
+    )
+    parts.append("\n".join([
+        f"- 趋势：{analysis['direction']}（线性斜率 {fmt(analysis['slope'])}/{unit}，R² {analysis['r2']:.2f}）",
+        f"- 季节性：{season_text}",
+        f"- Holt-Winters 参数：α={hw['alpha']:.2f}，β={hw['beta']:.2f}，γ={hw['gamma']:.2f}"
+        + ("" if hw["season"] else "（无季节项）"),
+        f"- 采用模型：{model_text}",
+    ]))
+
+    periods = result["periods"]
+    values = analysis["values"]
+    recent = range(max(len(periods) - FORECAST_RECENT_PERIODS, 0), len(periods))
+    fitted_count = len(analysis["mom"])
+    parts.append(markdown_table(
+        ["周期", "值", "环比", "同比", f"{FORECAST_MA_WINDOW} 期移动平均"],
+        [
+            [_period_label(periods[i]) + ("（不完整）" if i >= fitted_count else ""), fmt(values[i])]
+            + ([_pct(analysis["mom"][i]), _pct(analysis["yoy"][i]), fmt(analysis["moving_average"][i])]
+               if i < fitted_count else ["-", "-", "-"])
+            for i in recent
+        ],
+    ))
+
+    chosen = analysis[analysis["model"]]
+    level = f"{FORECAST_INTERVAL * 100:.0f}%"
+    parts.append(markdown_table(
+        ["预测周期", "线性趋势", "Holt-Winters", f"{level} 区间下限", f"{level} 区间上限"],
+        [
+            [_period_label(p), fmt(analysis["linear"]["forecast"][j]), fmt(hw["forecast"][j]),
+             fmt(chosen["lower"][j]), fmt(chosen["upper"][j])]
+            for j, p in enumerate(result["future"])
+        ],
+    ))
+    return "\n\n".join(parts)
+
+
+def render_forecast(result: Dict[str, Any]) -> str:
+    """渲染为紧凑的 Markdown：趋势判断、最近周期的增长率与移动平均、两种模型的预测值与区间"""
+    if result["time_column"] is None:
+        return "未识别到可解析的时间字段，无法进行时间序列分析与预测。"
+    periods = result["periods"]
+    unit = GRANULARITIES[result["granularity"]][0]
+    agg = "求和" if result["agg"] != "mean" else "取均值"
+    parts = [
+        f"### 时间序列（时间字段 {result['time_column']}，按{unit}{agg}，"
+        f"{_period_label(periods[0])} ~ {_period_label(periods[-1])}，共 {len(periods)} 个周期）"
+    ]
+    if result["partial"]:
+        parts.append(f"最后一个周期 {_period_label(periods[-1])} 数据不完整，未参与增长率计算与建模。")
+    parts.extend(_render_series(label, analysis, result) for label, analysis in result["series"].items())
+    return "\n\n".join(parts)
+
+
+__all__ = [
+    "COUNT_SERIES",
+    "GRANULARITIES",
+    "analyze_series",
+    "choose_granularity",
+    "compute_forecast",
+    "dataset_forecast",
+    "growth",
+    "holt_winters",
+    "linear_trend",
+    "moving_average",
+    "render_forecast",
+    "resample",
+]
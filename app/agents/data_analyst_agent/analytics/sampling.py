@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.agents.data_analyst_agent.analytics.columns import ColumnRoles, column_roles, hashable, time_column
+from app.config.env_utils import PROMPT_SAMPLE_MAX_ROWS, SAMPLE_MAX_STRATA, SAMPLE_SEED, SAMPLE_STRATEGY
+from app.services.dataset_registry import ColumnarDataset
+from app.services.prompt_serializer import serialize_frame
+
+STRATEGIES = ("reservoir", "stratified", "time", "outlier")
+_STRATEGY_LABELS = {"reservoir": "随机", "stratified": "按 {column} 分层", "time": "按 {column} 时间均匀", "outlier": "极值"}
+# 候选行的过采样倍数：只在随机键最小的约 size × 倍数 行里挑选，避免对全量数据排序
+_OVERSAMPLE = 50
+# 保留极值行的度量列数上限
+_OUTLIER_MEASURES = 4
+# 粗筛分层列时检查的随机行数
+_STRATA_PROBE_ROWS = 1000
+# 估算单行 token 数时序列化的行数
+_TOKEN_PROBE_ROWS = 20
+
+
+# ──────────────────────────────────────────────
+# 1. 各抽样策略：返回按优先级排列的行下标
+# ──────────────────────────────────────────────
+def _reservoir(candidates: np.ndarray, keys: np.ndarray, size: int) -> np.ndarray:
+    """
+    给每行一个随机键、取键最小的 size 行，等价于蓄水池抽样（一次遍历、无放回、等概率），
+    只是一次性向量化完成而不是逐行替换
+    """
+    return candidates[np.argsort(keys[candidates], kind="stable")][:size]
+
+
+def _strata_column(
+    frame: pd.DataFrame,
+    roles: ColumnRoles,
+    max_strata: int,
+    probe: np.ndarray,
+) -> Optional[Tuple[str, np.ndarray]]:
+    """
+    取第一个取值个数在 [2, max_strata] 之间的分类列，返回 (列名, 分组编码)。
+    probe 为随机抽取的行：先在其中粗筛，按类别排序的结果（ORDER BY）前若干行往往只有一个类别，不能用来粗筛
+    """
+    for name in roles.categorical:
+        if not 2 <= hashable(frame[name].iloc[probe]).nunique() <= max_strata:
+            continue
+        codes, uniques = pd.factorize(hashable(frame[name]), use_na_sentinel=True)
+        if 2 <= len(uniques) <= max_strata:
+            return name, codes
+    return None
+
+
+def _stratified(codes: np.ndarray, keys: np.ndarray, threshold: float, size: int) -> np.ndarray:
+    """
+    各类别等额分配（稀有类别也能出现在样本中），组内按随机键取前若干行；
+    结果按 (组内名次, 类别) 排列，任意前缀都覆盖尽可能多的类别
+    """
+    counts = np.bincount(codes[codes >= 0])
+    quota = math.ceil(size / len(counts))
+    # 行数少的类别全部作为候选，其余类别只在随机键较小的行中挑选
+    small = np.zeros(len(codes), dtype=bool)
+    small[codes >= 0] = counts[codes[codes >= 0]] * threshold < 2 * quota
+    rows = np.flatnonzero(((keys < threshold) | small) & (codes >= 0))
+
+    rows = rows[np.lexsort((keys[rows], codes[rows]))]
+    group = codes[rows]
+    first = np.concatenate(([0], np.flatnonzero(np.diff(group)) + 1))
+    rank = np.arange(len(rows)) - np.repeat(first, np.diff(np.concatenate((first, [len(rows)]))))
+    keep = rank < quota
+    rows, rank, group = rows[keep], rank[keep], group[keep]
+    return rows[np.lexsort((group, rank))][:size]
+
+
+def _time_uniform(stamps: pd.Series, keys: np.ndarray, threshold: float, size: int) -> np.ndarray:
+    """把时间跨度等分为 size 个区间，每个区间随机取一行（数据按时间排序时不再只看到最早的一段）"""
+    ns = stamps.to_numpy(dtype="datetime64[ns]").view(np.int64)
+    valid = stamps.notna().to_numpy()
+    rows = np.flatnonzero(valid & (keys < threshold))
+    if not len(rows):
+        return rows
+    low, high = ns[valid].min(), ns[valid].max()
+    bins = ((ns[rows] - low) / (high - low + 1) * size).astype(np.int64)
+    rows = rows[np.lexsort((keys[rows], bins))]
+    bins = np.sort(bins)
+    picked = rows[np.concatenate(([True], bins[1:] != bins[:-1]))]
+    # 区间按随机顺序排列，任意前缀在时间上都大致均匀
+    return picked[np.argsort(keys[picked], kind="stable")]
+
+
+def _outliers(frame: pd.DataFrame, measures: List[str], size: int) -> np.ndarray:
+    """各度量列中偏离中位数最远的行，各列轮流排列"""
+    per_column = max(1, size // (2 * max(len(measures), 1)))
+    picks = []
+    for name in measures:
+        values = frame[name].to_numpy(dtype="float64", na_value=np.nan)
+        present = np.isfinite(values)
+        if not present.any():
+            continue
+        deviation = np.where(present, np.abs(values - np.median(values[present])), -1.0)
+        k = min(per_column, int(present.sum()))
+        top = np.argpartition(-deviation, k - 1)[:k]
+        picks.append(top[np.argsort(-deviation[top], kind="stable")])
+    return _interleave(picks, size)
+
+
+def _interleave(picks: List[np.ndarray], size: int) -> np.ndarray:
+    """多个有序列表轮流取值并去重：第 i 个列表的第 j 个元素优先级为 j × 列表数 + i"""
+    picks = [p for p in picks if len(p)]
+    if not picks:
+        return np.empty(0, dtype=np.int64)
+    rows = np.concatenate(picks)
+    priority = np.concatenate([np.arange(len(p)) * len(picks) + i for i, p in enumerate(picks)])
+    rows = rows[np.argsort(priority, kind="stable")]
+    _, first = np.unique(rows, return_index=True)
+    return rows[np.sort(first)][:size]
+
+
+# ──────────────────────────────────────────────
+# 2. 组合抽样
+# ──────────────────────────────────────────────
+def sample_order(
+    frame: pd.DataFrame,
+    roles: Optional[ColumnRoles] = None,
+    size: int = PROMPT_SAMPLE_MAX_ROWS,
+    strategy: str = SAMPLE_STRATEGY,
+    seed: int = SAMPLE_SEED,
+) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    一次生成代表性样本的行下标（按优先级排列，任意前缀都是一个较小的代表性样本）。
+
+    strategy：reservoir / stratified / time / outlier 之一，或 mixed（默认，各策略轮流取行）。
+    所有策略共用同一组随机键，只在键最小的一小部分候选行中排序，全量数据上只做 O(n) 的向量化运算。
+    返回 (行下标, 说明)，说明中记录实际生效的策略与所用列。
+    """
+    if strategy != "mixed" and strategy not in STRATEGIES:
+        raise ValueError(f"不支持的抽样策略：{strategy}，可选 mixed / {' / '.join(STRATEGIES)}")
+    n = len(frame)
+    if n <= size:
+        return np.arange(n), {"strategies": ["all"]}
+
+    roles = roles or column_roles(frame)
+    keys = np.random.default_rng(seed).random(n)
+    threshold = min(1.0, _OVERSAMPLE * size / n)
+    wanted = STRATEGIES if strategy == "mixed" else (strategy,)
+    picks: Dict[str, np.ndarray] = {}
+    info: Dict[str, Any] = {}
+
+    candidates = np.flatnonzero(keys < threshold)
+    if "reservoir" in wanted:
+        picks["reservoir"] = _reservoir(candidates, keys, size)
+    if "stratified" in wanted:
+        probe = _reservoir(candidates, keys, _STRATA_PROBE_ROWS)
+        strata = _strata_column(frame, roles, SAMPLE_MAX_STRATA, probe)
+        if strata is not None:
+            info["stratified"] = strata[0]
+            picks["stratified"] = _stratified(strata[1], keys, threshold, size)
+    if "time" in wanted:
+        name, stamps = time_column(frame, roles)
+        if name is not None:
+            info["time"] = name
+            picks["time"] = _time_uniform(stamps, keys, threshold, size)
+    if "outlier" in wanted and roles.measures:
+        picks["outlier"] = _outliers(frame, roles.measures[:_OUTLIER_MEASURES], size)
+
+    order = _interleave(list(picks.values()), size)
+    info["strategies"] = [s for s in picks if len(picks[s])]
+    return order, info
+
+
+def describe_sample(info: Dict[str, Any]) -> str:
+    """样本构成的简短说明，放在提示词中样本块的标题里"""
+    if info["strategies"] == ["all"]:
+        return "全部数据"
+    return "、".join(_STRATEGY_LABELS[s].format(column=info.get(s, "")) for s in info["strategies"]) + "抽样"
+
+
+def dataset_sample(dataset: ColumnarDataset, budget_tokens: int) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    数据集的代表性样本：行顺序只计算一次（缓存在 dataset.analytics 中，各分析节点共享），
+    再按调用方的 token 预算估算行数并取前缀，交给 serialize_frame 精确截断。
+    """
+    cached = dataset.analytics.get("sample")
+    if cached is None:
+        order, info = sample_order(dataset.frame)
+        probe = serialize_frame(dataset.frame.iloc[order[:_TOKEN_PROBE_ROWS]], 1 << 30)
+        cached = {"order": order, "info": info, "row_tokens": probe.tokens / max(probe.rows, 1)}
+        dataset.analytics["sample"] = cached
+
+    # 按估算多取一些行，由序列化时按实际 token 数截断
+    size = math.ceil(budget_tokens / max(cached["row_tokens"], 1.0) * 1.25)
+    return dataset.frame.iloc[cached["order"][:size]], cached["info"]
+
+
+__all__ = ["STRATEGIES", "dataset_sample", "describe_sample", "sample_order"]
@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import math
+import time
+import warnings
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.agents.data_analyst_agent.analytics.columns import ColumnRoles, as_datetime, as_float, column_roles, \
+    hashable
+from app.config.env_utils import STATS_MAX_CORR_PAIRS, STATS_MAX_GROUP_COLUMNS, STATS_MAX_GROUPS, STATS_MAX_MEASURES
+from app.services.dataset_registry import ColumnarDataset
+
+
+def fmt(value: Any) -> str:
+    """提示词中的数字格式：整数原样，大数取整，其余保留 4 位有效数字"""
+    if value is None or pd.isna(value) or (isinstance(value, float) and not math.isfinite(value)):
+        return "-"
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    value = float(value)
+    if abs(value) >= 1e4:
+        return f"{value:.0f}"
+    return f"{value:.4g}"
+
+
+def _native(value: Any) -> Any:
+    if value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value
+
+
+# ──────────────────────────────────────────────
+# 1. 描述性统计与分布形态（按列向量化）
+# ──────────────────────────────────────────────
+def _shape(skew: float, kurt: float) -> str:
+    if not math.isfinite(skew):
+        return "-"
+    label = "近似对称" if abs(skew) < 0.5 else ("右偏" if skew > 0 else "左偏")
+    if math.isfinite(kurt) and kurt > 3:
+        label += "、厚尾"
+    return label
+
+
+def _quantiles(values: np.ndarray, n: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """
+    所有列一次排序后按线性插值取分位数（与 np.nanpercentile 默认口径一致）。
+    np.sort 把 NaN 排在末尾，因此每列前 n 个即为有效值。
+    """
+    if not len(values):
+        return np.full((len(q), values.shape[1]), np.nan)
+    ordered = np.sort(values, axis=0)
+    pos = q[:, None] * np.maximum(n - 1, 0)[None, :]
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.ceil(pos).astype(np.int64)
+    cols = np.arange(values.shape[1])[None, :]
+    result = ordered[lo, cols] + (ordered[hi, cols] - ordered[lo, cols]) * (pos - lo)
+    result[:, n == 0] = np.nan
+    return result
+
+
+def numeric_summary(frame: pd.DataFrame, columns: List[str]) -> List[Dict[str, Any]]:
+    """数值列的非空数、均值、标准差、分位数、偏度（调整 Fisher-Pearson）与超额峰度，与 pandas 口径一致"""
+    if not columns:
+        return []
+    values = as_float(frame, columns)
+    # 全为缺失值的列会触发 "Mean of empty slice" 警告，结果按 NaN 处理即可
+    with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        n = np.sum(~np.isnan(values), axis=0).astype(np.float64)
+        mean = np.nanmean(values, axis=0) if len(values) else np.full(len(columns), np.nan)
+        centered = values - mean
+        m2 = np.nanmean(centered ** 2, axis=0)
+        m3 = np.nanmean(centered ** 3, axis=0)
+        m4 = np.nanmean(centered ** 4, axis=0)
+        std = np.sqrt(m2 * n / (n - 1))
+        skew = np.where((n > 2) & (m2 > 0), m3 / m2 ** 1.5 * np.sqrt(n * (n - 1)) / (n - 2), np.nan)
+        g2 = m4 / m2 ** 2 - 3
+        kurt = np.where((n > 3) & (m2 > 0), ((n + 1) * g2 + 6) * (n - 1) / ((n - 2) * (n - 3)), np.nan)
+        quantiles = _quantiles(values, n, np.array([0.0, 0.25, 0.5, 0.75, 1.0]))
+
+    rows = []
+    for i, name in enumerate(columns):
+        rows.append({
+            "column": name,
+            "count": int(n[i]),
+            "missing": int(len(values) - n[i]),
+            "mean": _native(mean[i]),
+            "std": _native(std[i]),
+            "min": _native(quantiles[0, i]),
+            "p25": _native(quantiles[1, i]),
+            "median": _native(quantiles[2, i]),
+            "p75": _native(quantiles[3, i]),
+            "max": _native(quantiles[4, i]),
+            "skew": _native(skew[i]),
+            "kurtosis": _native(kurt[i]),
+            "shape": _shape(float(skew[i]), float(kurt[i])),
+        })
+    return rows
+
+
+def categorical_summary(frame: pd.DataFrame, columns: List[str], top: int = 3) -> List[Dict[str, Any]]:
+    rows = []
+    total = len(frame)
+    for name in columns:
+        # 不排序计数后只取 Top N，高基数字段（如名称、编号）无需整体排序
+        counts = hashable(frame[name]).value_counts(dropna=True, sort=False)
+        rows.append({
+            "column": name,
+            "distinct": int(len(counts)),
+            "missing": int(total - counts.sum()),
+            "top": [
+                {"value": str(v), "count": int(c), "share": c / total if total else 0.0}
+                for v, c in counts.nlargest(top).items()
+            ],
+        })
+    return rows
+
+
+def datetime_summary(frame: pd.DataFrame, columns: List[str]) -> List[Dict[str, Any]]:
+    rows = []
+    for name in columns:
+        series = as_datetime(frame[name]).dropna()
+        if series.empty:
+            continue
+        start, end = series.min(), series.max()
+        rows.append({
+            "column": name,
+            "min": start.isoformat(),
+            "max": end.isoformat(),
+            "span_days": int((end - start).days),
+            "missing": int(len(frame) - len(series)),
+        })
+    return rows
+
+
+# ──────────────────────────────────────────────
+# 2. 分组统计与相关性
+# ──────────────────────────────────────────────
+def _group_columns(frame: pd.DataFrame, categorical: List[str], distinct: Dict[str, int]) -> List[str]:
+    """适合分组的类别列：至少 2 组，且不是每行各不相同的标识类字段；按组数从少到多取前几个"""
+    candidates = [c for c in categorical if 2 <= distinct.get(c, 0) <= max(len(frame) // 2, 2)]
+    return sorted(candidates, key=lambda c: distinct[c])[:STATS_MAX_GROUP_COLUMNS]
+
+
+def group_summary(frame: pd.DataFrame, by: str, measures: List[str], max_groups: int = STATS_MAX_GROUPS) -> Dict[str, Any]:
+    grouped = frame.groupby(hashable(frame[by]), dropna=False, observed=True, sort=False)
+    table = grouped[measures].agg(["mean", "sum"]) if measures else pd.DataFrame(index=grouped.size().index)
+    table.insert(0, ("_rows", ""), grouped.size())
+    table = table.sort_values(("_rows", ""), ascending=False)
+
+    total = len(frame)
+    groups = []
+    for key, row in table.head(max_groups).iterrows():
+        item = {"group": "(空)" if pd.isna(key) else str(key), "rows": int(row[("_rows", "")])}
+        item["share"] = item["rows"] / total if total else 0.0
+        for m in measures:
+            item[f"mean:{m}"] = _native(row[(m, "mean")])
+            item[f"sum:{m}"] = _native(row[(m, "sum")])
+        groups.append(item)
+    return {"by": by, "group_count": int(len(table)), "measures": measures, "groups": groups}
+
+
+def _strength(r: float) -> str:
+    r = abs(r)
+    return "强" if r >= 0.7 else ("中" if r >= 0.4 else "弱")
+
+
+def correlation_pairs(frame: pd.DataFrame, columns: List[str], max_pairs: int = STATS_MAX_CORR_PAIRS) -> List[Dict[str, Any]]:
+    """Pearson 相关系数矩阵（成对剔除缺失值），取绝对值最大的若干字段对"""
+    if len(columns) < 2:
+        return []
+    corr = frame[columns].astype("float64").corr().to_numpy()
+    upper = np.triu_indices(len(columns), k=1)
+    values = corr[upper]
+    valid = ~np.isnan(values)
+    order = np.argsort(-np.abs(values[valid]))[:max_pairs]
+    left, right = upper[0][valid][order], upper[1][valid][order]
+    return [
+        {"a": columns[i], "b": columns[j], "r": float(corr[i, j]), "strength": _strength(corr[i, j])}
+        for i, j in zip(left, right)
+    ]
+
+
+# ──────────────────────────────────────────────
+# 3. 汇总与渲染
+# ──────────────────────────────────────────────
+def compute_statistics(frame: pd.DataFrame, roles: Optional[ColumnRoles] = None) -> Dict[str, Any]:
+    start = time.perf_counter()
+    roles = roles or column_roles(frame)
+    categorical = categorical_summary(frame, roles.categorical)
+    distinct = {c["column"]: c["distinct"] for c in categorical}
+    numeric = numeric_summary(frame, roles.measures)
+    # 全部缺失的数值列不参与分组与相关性
+    measures = [r["column"] for r in numeric if r["count"]]
+    return {
+        "row_count": int(len(frame)),
+        "numeric": numeric,
+        "categorical": categorical,
+        "datetime": datetime_summary(frame, roles.datetime),
+        "groups": [
+            group_summary(frame, c, measures[:STATS_MAX_MEASURES])
+            for c in _group_columns(frame, roles.categorical, distinct)
+        ],
+        "correlations": correlation_pairs(frame, measures),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+def dataset_statistics(dataset: ColumnarDataset) -> Dict[str, Any]:
+    """数据集的统计结果（缓存在 dataset.analytics 中，反思重跑时直接复用）"""
+    if "statistics" not in dataset.analytics:
+        dataset.analytics["statistics"] = compute_statistics(dataset.frame)
+    return dataset.analytics["statistics"]
+
+
+def markdown_table(header: List[str], rows: List[List[str]]) -> str:
+    lines = ["| " + " | ".join(header) + " |", "|" + "|".join("---" for _ in header) + "|"]
+    lines += ["| " + " | ".join(r) + " |" for r in rows]
+    return "\n".join(lines)
+
+
+def _pct(share: float) -> str:
+    return f"{share * 100:.1f}%"
+
+
+def render_statistics(stats: Dict[str, Any]) -> str:
+    """渲染为紧凑的 Markdown 表格，供提示词使用"""
+    parts = [f"### 描述性统计（共 {stats['row_count']} 行）"]
+    if stats["numeric"]:
+        parts.append(markdown_table(
+            ["字段", "非空", "缺失", "均值", "标准差", "最小值", "P25", "中位数", "P75", "最大值", "偏度", "峰度", "分布形态"],
+            [
+                [r["column"], str(r["count"]), str(r["missing"])]
+                + [fmt(r[k]) for k in ("mean", "std", "min", "p25", "median", "p75", "max", "skew", "kurtosis")]
+                + [r["shape"]]
+                for r in stats["numeric"]
+            ],
+        ))
+    else:
+        parts.append("（无数值字段）")
+
+    if stats["categorical"]:
+        parts.append("### 类别字段")
+        parts.append(markdown_table(
+            ["字段", "去重数", "缺失", "最常见取值（行数，占比）"],
+            [
+                [r["column"], str(r["distinct"]), str(r["missing"]),
+                 "；".join(f"{t['value']}（{t['count']}，{_pct(t['share'])}）" for t in r["top"])]
+                for r in stats["categorical"]
+            ],
+        ))
+
+    if stats["datetime"]:
+        parts.append("### 时间字段")
+        parts.append(markdown_table(
+            ["字段", "最早", "最晚", "跨度（天）", "缺失"],
+            [[r["column"], r["min"], r["max"], str(r["span_days"]), str(r["missing"])] for r in stats["datetime"]],
+        ))
+
+    for g in stats["groups"]:
+        shown = len(g["groups"])
+        suffix = f"，按行数展示前 {shown} 组" if shown < g["group_count"] else ""
+        parts.append(f"### 分组统计：按 {g['by']}（共 {g['group_count']} 组{suffix}）")
+        header = [g["by"], "行数", "占比"]
+        for m in g["measures"]:
+            header += [f"{m} 均值", f"{m} 合计"]
+        parts.append(markdown_table(
+            header,
+            [
+                [item["group"], str(item["rows"]), _pct(item["share"])]
+                + [fmt(item[f"{kind}:{m}"]) for m in g["measures"] for kind in ("mean", "sum")]
+                for item in g["groups"]
+            ],
+        ))
+
+    if stats["correlations"]:
+        parts.append("### 相关性（Pearson，按 |r| 降序）")
+        parts.append(markdown_table(
+            ["字段 A", "字段 B", "r", "强度"],
+            [[p["a"], p["b"], f"{p['r']:.3f}", p["strength"]] for p in stats["correlations"]],
+        ))
+    return "\n\n".join(parts)
+
+
+__all__ = [
+    "categorical_summary",
+    "compute_statistics",
+    "correlation_pairs",
+    "dataset_statistics",
+    "datetime_summary",
+    "fmt",
+    "markdown_table",
+    "group_summary",
+    "numeric_summary",
+    "render_statistics",
+]
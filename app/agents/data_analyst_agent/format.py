@@ -85,4 +85,5 @@ class DataQueryOutput(BaseModel):
     path: str = Field(description="文件举例路径，如data/sales.csv")
     columns: List[str] = Field(description="文件中的列表属性")
     row_count: int = Field(description="文件的行数")
-    all_rows: List[Dict[str, Any]] = Field(description="展示所有行的内容")
+    dataset_id: str = Field(description="数据集 ID，完整数据保存在进程内数据集注册表中")
+    fingerprint: str = Field(default="", description="数据内容指纹")
@@ -1,14 +1,14 @@
 # ──────────────────────────────────────────────
 # 6. 节点函数：异常检测
 # ──────────────────────────────────────────────
-import json
-
-from langchain_core.messages import SystemMessage, HumanMessage
 from langgraph.types import Command
 
 from app.agents.data_analyst_agent.format import AnomalyDetectionResult
 from app.models.LLM_MODEL import ModelInstances
-from app.prompts.data_analyst_agent_prompt import ANOMALY_DETECTION_PROMPT, DATA_ANALYST_AGENT_SYSTEM_PROMPT
+from app.agents.data_analyst_agent.nodes.data_context_node import build_data_context
+from app.agents.data_analyst_agent.report_patch import run_with_patch
+from app.services.dataset_registry import dataset_registry
+from app.prompts.data_analyst_agent_prompt import ANOMALY_DETECTION_PROMPT
 from app.agents.data_analyst_agent.state import AnalystState
 
 async def anomaly_detection_node(state: AnalystState) :
@@ -17,28 +17,23 @@ async def anomaly_detection_node(state: AnalystState) :
 
     input_data = state["input_data"]
 
-    # 准备提示词
+    # 数据集概况、样本与各引擎的预计算结果已由共享数据上下文节点准备好，这里只拼接任务提示词
+    context = state["data_context"]
+    if context is None:
+        context = await build_data_context(dataset_registry.get(input_data.dataset_id), input_data)
+
     prompt = ANOMALY_DETECTION_PROMPT.format(
         source=input_data.source,
         path=input_data.path,
         columns=", ".join(input_data.columns),
         row_count=input_data.row_count,
-        all_rows=input_data.all_rows,
-        reflection="" if not state["anomaly_reflection"] else state["anomaly_reflection"]
     )
+    # 离群检测与数据质量检查由检测引擎对全部数据向量化执行，LLM 只负责解释被标记的行
+    prompt += f"\n\n预先执行的异常检测结果：\n{context['anomalies']}"
 
-    # 将数据行转换为字符串
-    sample_rows = input_data.all_rows[:100]
-    data_sample = json.dumps(sample_rows, ensure_ascii=False, indent=2)
-    prompt += f"\n\n数据样本（前100行）：\n{data_sample}"
-
-    # 调用 LLM
-    messages = [
-        SystemMessage(content=DATA_ANALYST_AGENT_SYSTEM_PROMPT),
-        HumanMessage(content=prompt)
-    ]
-
-    llm = ModelInstances.analyst_llm
-    response = await llm.ainvoke(messages)
+    # 补充轮次只生成增量修改并合并回上一轮报告
+    content = await run_with_patch(
+        ModelInstances.analyst_llm, context, prompt, state["anomaly_reflection"], state["anomaly_result"], "anomaly"
+    )
 
-    return Command(update={"anomaly_result":response.content})
\ No newline at end of file
+    return Command(update={"anomaly_result": content})
\ No newline at end of file
@@ -0,0 +1,124 @@
+# ──────────────────────────────────────────────
+# 3. 节点函数：共享数据上下文
+# ──────────────────────────────────────────────
+import asyncio
+from typing import Any, Callable, Dict, Optional
+
+from langchain_core.messages import SystemMessage, HumanMessage
+from langgraph.types import Command
+
+from app.agents.data_analyst_agent.analytics.anomalies import dataset_anomalies, render_anomalies
+from app.agents.data_analyst_agent.analytics.columns import column_roles
+from app.agents.data_analyst_agent.analytics.forecasting import dataset_forecast, render_forecast
+from app.agents.data_analyst_agent.analytics.sampling import dataset_sample, describe_sample
+from app.agents.data_analyst_agent.analytics.statistics import dataset_statistics, render_statistics
+from app.agents.data_analyst_agent.format import DataQueryOutput
+from app.agents.data_analyst_agent.state import AnalystState
+from app.config.env_utils import PROMPT_DATA_TOKENS, PROMPT_SAMPLE_MAX_ROWS
+from app.db.pushdown import render_aggregates
+from app.prompts.data_analyst_agent_prompt import DATA_ANALYST_AGENT_SYSTEM_PROMPT
+from app.services.dataset_registry import ColumnarDataset, dataset_registry
+from app.services.prompt_serializer import serialize_frame
+
+
+def _profile(dataset: ColumnarDataset, input_data: DataQueryOutput) -> str:
+    roles = column_roles(dataset.frame)
+    kinds = {**{c: "数值" for c in roles.numeric}, **{c: "时间" for c in roles.datetime}}
+    fields = "、".join(f"{c}（{kinds.get(c, '文本')}）" for c in dataset.columns)
+    return "\n".join([
+        "## 数据集",
+        f"- 数据来源：{input_data.source}",
+        f"- 数据路径：{input_data.path}",
+        f"- 数据行数：{dataset.row_count}",
+        f"- 字段：{fields}",
+    ])
+
+
+def _failure(name: str, error: BaseException) -> str:
+    print(f"⚠️ {name}预计算失败：{error!r}")
+    return f"此项预计算失败：{type(error).__name__}: {error}，请仅根据数据样本谨慎分析，并在报告中说明。"
+
+
+def _render(name: str, result: Any, render: Callable[[Any], str]) -> str:
+    """单个引擎失败（或渲染失败）只影响对应分支的这一段，其余分支照常进行"""
+    if isinstance(result, BaseException):
+        return _failure(name, result)
+    try:
+        return render(result)
+    except Exception as exc:
+        return _failure(name, exc)
+
+
+async def build_data_context(dataset: ColumnarDataset, input_data: DataQueryOutput) -> Dict[str, str]:
+    """
+    一次性准备三个分析分支共用的数据上下文（缓存在 dataset.analytics 中）：
+    - prefix：系统提示词 + 数据集概况 + 代表性样本 + 数据库端聚合统计，三个分支与各自的补充轮次逐字节相同，
+      可以命中模型服务端的前缀缓存
+    - statistics / forecast / anomalies：各分支专用的预计算结果，放在各自提示词的后半部分
+    """
+    cached = dataset.analytics.get("context")
+    if cached is not None:
+        return cached
+
+    # 各分析引擎互不依赖，在线程池中并行计算；单个引擎出错时只在对应位置说明，不影响整个分析流程
+    stats, forecast, anomalies, sample = await asyncio.gather(
+        asyncio.to_thread(dataset_statistics, dataset),
+        asyncio.to_thread(dataset_forecast, dataset),
+        asyncio.to_thread(dataset_anomalies, dataset),
+        asyncio.to_thread(dataset_sample, dataset, PROMPT_DATA_TOKENS),
+        return_exceptions=True,
+    )
+    if isinstance(sample, BaseException):
+        _failure("代表性抽样", sample)
+        sample, description = dataset.frame.head(PROMPT_SAMPLE_MAX_ROWS), "抽样失败，取前若干行"
+    else:
+        sample, description = sample[0], describe_sample(sample[1])
+    block = serialize_frame(sample, PROMPT_DATA_TOKENS)
+    parts = [
+        DATA_ANALYST_AGENT_SYSTEM_PROMPT.strip(),
+        "以下是本次分析的数据集，统计分析、趋势预测、异常检测三个任务共用：",
+        _profile(dataset, input_data),
+        f"## 数据样本（{block.rows} 行，{description}，仅用于理解字段含义）\n{block.text}",
+    ]
+    if dataset.aggregates:
+        # 明细只是样本时，数据库端下推计算的全量聚合统计才反映真实分布
+        parts.append(
+            f"## 数据库端全量聚合统计（共 {dataset.aggregates['row_count']} 行，统计结论以此为准）\n"
+            f"{render_aggregates(dataset.aggregates)}"
+        )
+
+    context = {
+        "prefix": "\n\n".join(parts),
+        "statistics": _render("统计分析", stats, render_statistics),
+        "forecast": _render("时间序列分析", forecast, render_forecast),
+        "anomalies": _render("异常检测", anomalies, render_anomalies),
+    }
+    dataset.analytics["context"] = context
+    return context
+
+
+def context_messages(context: Dict[str, str], prompt: str, reflection: Optional[Dict] = None) -> list:
+    """
+    分析节点的消息：共享前缀在前，任务提示词在后；上一轮反思放在最末尾，
+    补充轮次只有结尾不同，前面的内容仍能复用前缀缓存
+    """
+    if reflection:
+        prompt += f"\n\n上一轮输出的反思与优化建议：{reflection}"
+    return [
+        SystemMessage(content=context["prefix"]),
+        HumanMessage(content=prompt),
+    ]
+
+
+async def data_context_node(state: AnalystState):
+    """共享数据上下文节点：在三个分析分支之前只执行一次"""
+    print("🗂️ 准备共享数据上下文...")
+
+    input_data = state["input_data"]
+    dataset = dataset_registry.get(input_data.dataset_id)
+    context = await build_data_context(dataset, input_data)
+
+    return Command(update={"data_context": context})
+
+
+__all__ = ["build_data_context", "context_messages", "data_context_node"]
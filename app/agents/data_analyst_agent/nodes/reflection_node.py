@@ -1,18 +1,54 @@
 # ──────────────────────────────────────────────
 # 7. 节点函数：反思节点（通用）
 # ──────────────────────────────────────────────
+import asyncio
 import json
+from typing import Any, Dict, Optional
 
 from langchain_core.messages import SystemMessage, HumanMessage
 from langgraph.types import Command
 
 from app.agents.data_analyst_agent.format import ReflectionResult
+from app.agents.data_analyst_agent.report_checker import check_report, expected_coverage, reflection_metrics
 from app.agents.data_analyst_agent.state import AnalystState
+from app.config.env_utils import REPORT_CHECK_ENABLED
 from app.models.LLM_MODEL import ModelInstances
+from app.services.dataset_registry import dataset_registry
 from app.prompts.data_analyst_agent_prompt import DATA_ANALYST_AGENT_SYSTEM_PROMPT, REFLECTION_PROMPT, \
     ANOMALY_REFLECTION_PROMPT, TREND_REFLECTION_PROMPT, STAT_REFLECTION_PROMPT
 
 
+async def _rule_reflection(kind: str, report: Optional[str], state: AnalystState, iteration_count: int) -> Optional[Dict[str, Any]]:
+    """
+    先做规则检查：能确定通过 / 需要补充，或已达到最大迭代次数（路由必然继续）时直接返回反思结果，
+    只有检查无法下结论时返回 None，由 LLM 反思
+    """
+    if not REPORT_CHECK_ENABLED:
+        reflection_metrics.record(kind, "llm")
+        return None
+
+    # 应覆盖的字段取自各分析引擎的缓存结果（共享数据上下文节点已算好，缓存缺失时在线程池中补算）
+    try:
+        dataset = dataset_registry.get(state["input_data"].dataset_id)
+        columns, min_tables = await asyncio.to_thread(expected_coverage, kind, dataset)
+    except Exception as exc:
+        # 数据集已被注册表淘汰，或对应引擎的预计算失败：没有可核对的数值结果，只检查报告结构
+        print(f"⚠️ 规则检查（{kind}）无法取得预计算结果，只检查报告结构：{exc!r}")
+        columns, min_tables = [], 0
+    result = check_report(kind, report, columns, min_tables)
+    if iteration_count >= state["max_iteration"]:
+        outcome = "max_iteration"
+    elif result.verdict != "inconclusive":
+        outcome = result.verdict
+    else:
+        reflection_metrics.record(kind, "llm")
+        return None
+
+    reflection_metrics.record(kind, outcome)
+    print(f"规则检查（{kind}）：{result.verdict}，得分 {result.score}，跳过 LLM 反思（{outcome}）")
+    return result.to_reflection()
+
+
 async def stat_reflection_node(state: AnalystState) :
     """反思统计分析报告的质量"""
     print("🤔 执行统计分析反思节点...")
@@ -23,6 +59,10 @@ async def stat_reflection_node(state: AnalystState) :
     state["stat_iteration_count"] += 1
     iteration_count = state["stat_iteration_count"]
 
+    reflection_result = await _rule_reflection("statistical", state.get("statistical_result"), state, iteration_count)
+    if reflection_result is not None:
+        return Command(update={"stat_iteration_count":iteration_count,"stat_reflection":reflection_result})
+
     prompt = STAT_REFLECTION_PROMPT.format(
         node_name=node_name,
         analysis_summary=analysis_summary[:3000]  # 可适当放宽长度，因为 Markdown 可能较长
@@ -54,6 +94,10 @@ async def trend_reflection_node(state: AnalystState):
     state["trend_iteration_count"] += 1
     iteration_count = state["trend_iteration_count"]
 
+    reflection_result = await _rule_reflection("trend", state.get("trend_result"), state, iteration_count)
+    if reflection_result is not None:
+        return Command(update={"trend_iteration_count":iteration_count,"trend_reflection":reflection_result})
+
     prompt = TREND_REFLECTION_PROMPT.format(
         node_name=node_name,
         analysis_summary=analysis_summary[:3000]
@@ -87,6 +131,10 @@ async def anomaly_reflection_node(state: AnalystState) :
     state["anomaly_iteration_count"] += 1
     iteration_count = state["anomaly_iteration_count"]
 
+    reflection_result = await _rule_reflection("anomaly", state.get("anomaly_result"), state, iteration_count)
+    if reflection_result is not None:
+        return Command(update={"anomaly_iteration_count":iteration_count,"anomaly_reflection":reflection_result})
+
     prompt = ANOMALY_REFLECTION_PROMPT.format(
         node_name=node_name,
         analysis_summary=analysis_summary[:3000]
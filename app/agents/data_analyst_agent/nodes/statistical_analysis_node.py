@@ -1,16 +1,15 @@
 # ──────────────────────────────────────────────
 # 4. 节点函数：统计分析
 # ──────────────────────────────────────────────
-import json
-
-
-from langchain_core.messages import SystemMessage, HumanMessage
 from langgraph.types import Command
 
 
 from app.agents.data_analyst_agent.state import AnalystState
 from app.models.LLM_MODEL import ModelInstances
-from app.prompts.data_analyst_agent_prompt import STATISTICAL_ANALYSIS_PROMPT, DATA_ANALYST_AGENT_SYSTEM_PROMPT
+from app.agents.data_analyst_agent.nodes.data_context_node import build_data_context
+from app.agents.data_analyst_agent.report_patch import run_with_patch
+from app.services.dataset_registry import dataset_registry
+from app.prompts.data_analyst_agent_prompt import STATISTICAL_ANALYSIS_PROMPT
 
 
 async def statistical_analysis_node(state: AnalystState) :
@@ -19,30 +18,25 @@ async def statistical_analysis_node(state: AnalystState) :
 
     input_data = state["input_data"]
 
-    # 准备提示词
+    # 数据集概况、样本与各引擎的预计算结果已由共享数据上下文节点准备好，这里只拼接任务提示词
+    context = state["data_context"]
+    if context is None:
+        context = await build_data_context(dataset_registry.get(input_data.dataset_id), input_data)
+
     prompt = STATISTICAL_ANALYSIS_PROMPT.format(
         source=input_data.source,
         path=input_data.path,
         columns=", ".join(input_data.columns),
         row_count=input_data.row_count,
-        reflection="" if not state["stat_reflection"] else state["stat_reflection"]
     )
+    # 统计量由统计引擎基于全部数据精确计算，LLM 只负责解读，不再从样本里自行估算
+    prompt += f"\n\n预先计算的统计结果：\n{context['statistics']}"
 
-    # 将数据行转换为字符串，方便 LLM 理解
-    sample_rows = input_data.all_rows[:100]  # 限制样本数量，避免 token 过多
-    data_sample = json.dumps(sample_rows, ensure_ascii=False, indent=2)
-    prompt += f"\n\n数据样本（前100行）：\n{data_sample}"
-    # print(f"检查提示词：{prompt}")
-
-    # 调用 LLM
-    messages = [
-        SystemMessage(content=DATA_ANALYST_AGENT_SYSTEM_PROMPT),
-        HumanMessage(content=prompt)
-    ]
-
-    llm = ModelInstances.analyst_llm
-    response =await llm.ainvoke(messages)
+    # 补充轮次只生成增量修改并合并回上一轮报告
+    content = await run_with_patch(
+        ModelInstances.analyst_llm, context, prompt, state["stat_reflection"], state["statistical_result"], "statistical"
+    )
 
     #保存md格式输出
 
-    return Command(update={"statistical_result":response.content})
\ No newline at end of file
+    return Command(update={"statistical_result": content})
\ No newline at end of file
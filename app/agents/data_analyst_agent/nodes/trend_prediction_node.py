@@ -1,15 +1,15 @@
 # ──────────────────────────────────────────────
 # 5. 节点函数：趋势预测
 # ──────────────────────────────────────────────
-import json
-
-from langchain_core.messages import SystemMessage, HumanMessage
 from langgraph.types import Command
 
 from app.agents.data_analyst_agent.format import TrendPredictionResult
 from app.agents.data_analyst_agent.state import AnalystState
 from app.models.LLM_MODEL import ModelInstances
-from app.prompts.data_analyst_agent_prompt import TREND_PREDICTION_PROMPT, DATA_ANALYST_AGENT_SYSTEM_PROMPT
+from app.agents.data_analyst_agent.nodes.data_context_node import build_data_context
+from app.agents.data_analyst_agent.report_patch import run_with_patch
+from app.services.dataset_registry import dataset_registry
+from app.prompts.data_analyst_agent_prompt import TREND_PREDICTION_PROMPT
 
 
 async def trend_prediction_node(state: AnalystState) :
@@ -18,29 +18,23 @@ async def trend_prediction_node(state: AnalystState) :
 
     input_data = state["input_data"]
 
-    # 准备提示词
+    # 数据集概况、样本与各引擎的预计算结果已由共享数据上下文节点准备好，这里只拼接任务提示词
+    context = state["data_context"]
+    if context is None:
+        context = await build_data_context(dataset_registry.get(input_data.dataset_id), input_data)
+
     prompt = TREND_PREDICTION_PROMPT.format(
         source=input_data.source,
         path=input_data.path,
         columns=", ".join(input_data.columns),
         row_count=input_data.row_count,
-        all_rows=input_data.all_rows,
-        reflection="" if not state["trend_reflection"] else state["trend_reflection"]
     )
+    # 重采样、增长率与预测由时间序列引擎基于全部数据确定性地计算，LLM 只负责解读
+    prompt += f"\n\n预先计算的时间序列分析与预测结果：\n{context['forecast']}"
 
-    # 将数据行转换为字符串
-    sample_rows = input_data.all_rows[:100]
-    data_sample = json.dumps(sample_rows, ensure_ascii=False, indent=2)
-    prompt += f"\n\n数据样本（前100行）：\n{data_sample}"
-
-    # 调用 LLM
-    messages = [
-        SystemMessage(content=DATA_ANALYST_AGENT_SYSTEM_PROMPT),
-        HumanMessage(content=prompt)
-    ]
-
-    llm = ModelInstances.analyst_llm
-    response = await llm.ainvoke(messages)
-
+    # 补充轮次只生成增量修改并合并回上一轮报告
+    content = await run_with_patch(
+        ModelInstances.analyst_llm, context, prompt, state["trend_reflection"], state["trend_result"], "trend"
+    )
 
-    return Command(update={"trend_result":response.content})
\ No newline at end of file
+    return Command(update={"trend_result": content})
\ No newline at end of file
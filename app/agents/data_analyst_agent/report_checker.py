@@ -0,0 +1,202 @@
+# ──────────────────────────────────────────────
+# 反思前的规则检查：能确定结论时不再调用 LLM 反思
+# ──────────────────────────────────────────────
+from __future__ import annotations
+
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+from app.agents.data_analyst_agent.analytics.anomalies import dataset_anomalies
+from app.agents.data_analyst_agent.analytics.forecasting import COUNT_SERIES, dataset_forecast
+from app.agents.data_analyst_agent.analytics.statistics import dataset_statistics
+from app.agents.data_analyst_agent.format import ReflectionResult
+from app.config.env_utils import STATS_MAX_MEASURES
+from app.services.dataset_registry import ColumnarDataset
+
+REPORT_KINDS = ("statistical", "trend", "anomaly")
+# 各类报告必须包含的二级标题（标题中包含该关键词即可）
+REQUIRED_SECTIONS: Dict[str, Tuple[str, ...]] = {
+    "statistical": ("数据概述", "描述性统计", "分组统计", "相关性", "关键洞察", "可视化建议"),
+    "trend": ("数据概述", "时间序列", "预测", "增长率", "关键洞察", "可视化建议"),
+    "anomaly": ("数据概述", "离群值", "异常模式", "数据质量", "关键洞察", "可视化建议"),
+}
+_CHART_RE = re.compile(r"图表类型|折线图|柱状图|条形图|散点图|饼图|热力图|箱线图|直方图|面积图|雷达图")
+_HEADING_RE = re.compile(r"^(#{1,6})\s*(.+?)\s*#*\s*$", re.M)
+_TABLE_SEPARATOR_RE = re.compile(r"^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)+\|?\s*$", re.M)
+_NUMBER_RE = re.compile(r"\d")
+
+
+@dataclass
+class CheckResult:
+    """
+    verdict：
+    - pass：结构完整且各字段都有数值结论，直接继续
+    - fail：缺少必需的章节 / 表格 / 可视化建议，直接要求补充（缺失项由规则给出）
+    - inconclusive：结构完整但字段覆盖不全等，是否需要补充交给 LLM 判断
+    """
+    verdict: str
+    score: int
+    missing_aspects: List[str] = field(default_factory=list)
+    suggestions: List[str] = field(default_factory=list)
+
+    def to_reflection(self) -> Dict[str, Any]:
+        """转换为与 LLM 反思相同结构的结果，供路由函数与补充轮次使用"""
+        complete = self.verdict == "pass"
+        return ReflectionResult(
+            completeness_score=self.score,
+            is_complete=complete,
+            missing_aspects=self.missing_aspects,
+            suggestions=self.suggestions,
+            next_action="continue" if complete else "supplement",
+        ).model_dump()
+
+
+def _sections(report: str) -> Dict[str, str]:
+    """二级及以下标题 -> 该章节正文（到下一个同级或更高级标题为止）"""
+    headings = list(_HEADING_RE.finditer(report))
+    sections = {}
+    for i, match in enumerate(headings):
+        level = len(match.group(1))
+        if level < 2:
+            continue
+        end = len(report)
+        for following in headings[i + 1:]:
+            if len(following.group(1)) <= level:
+                end = following.start()
+                break
+        sections[match.group(2)] = report[match.end():end].strip()
+    return sections
+
+
+def _find_section(sections: Dict[str, str], keyword: str) -> Tuple[bool, str]:
+    for title, body in sections.items():
+        if keyword in title:
+            return True, body
+    return False, ""
+
+
+def _covered(report: str, column: str) -> bool:
+    """字段在某一行中与数字一同出现（表格行或列表项），视为给出了该字段的数值结论"""
+    return any(column in line and _NUMBER_RE.search(line.replace(column, "")) for line in report.splitlines())
+
+
+def expected_coverage(kind: str, dataset: ColumnarDataset) -> Tuple[List[str], int]:
+    """
+    报告应覆盖的字段与至少应有的表格数，取自各分析引擎已缓存的预计算结果：
+    统计分析覆盖各度量列，趋势预测覆盖参与预测的序列，异常检测覆盖有异常行的字段
+    """
+    if kind == "statistical":
+        stats = dataset_statistics(dataset)
+        columns = [r["column"] for r in stats["numeric"] if r["count"]][:STATS_MAX_MEASURES]
+        return columns, 1 + (1 if stats["groups"] else 0)
+    if kind == "trend":
+        forecast = dataset_forecast(dataset)
+        if forecast["time_column"] is None:
+            return [], 0
+        columns = [label for label, a in forecast["series"].items() if label != COUNT_SERIES and "model" in a]
+        return columns, 2 if columns else 0
+    anomalies = dataset_anomalies(dataset)
+    columns = list(dict.fromkeys(r["column"] for r in anomalies["flagged_rows"]))
+    return columns, 1 if columns else 0
+
+
+def check_report(kind: str, report: str, columns: List[str], min_tables: int) -> CheckResult:
+    """对 Markdown 报告做确定性检查：必需章节、表格数、字段的数值覆盖、可视化建议"""
+    report = (report or "").strip()
+    if not report:
+        return CheckResult("fail", 0, ["报告为空"], ["按提示词中的报告结构重新生成完整报告"])
+
+    sections = _sections(report)
+    missing, suggestions = [], []
+    checks = 0
+
+    for keyword in REQUIRED_SECTIONS[kind]:
+        checks += 1
+        found, body = _find_section(sections, keyword)
+        if not found or not body:
+            missing.append(f"缺少「{keyword}」章节")
+            suggestions.append(f"补充「{keyword}」章节")
+    # 没有时间字段时趋势报告无法给出预测表与增长率，结构是否合理交给 LLM 判断
+    if kind == "trend" and min_tables == 0:
+        missing = [m for m in missing if not any(k in m for k in ("时间序列", "预测", "增长率"))]
+
+    checks += 1
+    tables = len(_TABLE_SEPARATOR_RE.findall(report))
+    if tables < min_tables:
+        missing.append(f"表格不足（{tables}/{min_tables}）")
+        suggestions.append("用 Markdown 表格列出预先计算的数值结果")
+
+    checks += 1
+    _, charts = _find_section(sections, "可视化建议")
+    if charts and not _CHART_RE.search(charts):
+        missing.append("可视化建议未给出图表类型")
+        suggestions.append("在可视化建议中写明图表类型、坐标轴与描述")
+
+    uncovered = [c for c in columns if not _covered(report, c)]
+    checks += len(columns)
+    score = round(100 * (checks - len(missing) - len(uncovered)) / checks)
+
+    if missing:
+        if uncovered:
+            missing.append(f"未给出字段 {', '.join(uncovered)} 的数值结论")
+        return CheckResult("fail", score, missing, suggestions)
+    if uncovered:
+        # 结构完整但部分字段没有数值结论：可能是合理取舍，交给 LLM 判断
+        return CheckResult("inconclusive", score, [f"未给出字段 {', '.join(uncovered)} 的数值结论"])
+    return CheckResult("pass", score)
+
+
+# ──────────────────────────────────────────────
+# 反思调用统计
+# ──────────────────────────────────────────────
+class ReflectionMetrics:
+    """
+    记录每次反思的处理方式：
+    - llm：规则检查无法下结论，调用了 LLM 反思
+    - pass / fail：规则检查直接判定为通过 / 需要补充，跳过 LLM
+    - max_iteration：已达到最大迭代次数，路由必然继续，跳过 LLM
+    """
+
+    OUTCOMES = ("llm", "pass", "fail", "max_iteration")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Counter] = {kind: Counter() for kind in REPORT_KINDS}
+
+    def record(self, kind: str, outcome: str) -> None:
+        with self._lock:
+            self._counts[kind][outcome] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = {kind: {o: c[o] for o in self.OUTCOMES} for kind, c in self._counts.items()}
+        total = sum(sum(c.values()) for c in counts.values())
+        skipped = total - sum(c["llm"] for c in counts.values())
+        return {
+            "reflections": total,
+            "llm_calls": total - skipped,
+            "skipped_llm_calls": skipped,
+            "skip_ratio": round(skipped / total, 4) if total else 0.0,
+            "by_kind": counts,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            for counter in self._counts.values():
+                counter.clear()
+
+
+reflection_metrics = ReflectionMetrics()
+
+__all__ = [
+    "CheckResult",
+    "REPORT_KINDS",
+    "REQUIRED_SECTIONS",
+    "ReflectionMetrics",
+    "check_report",
+    "expected_coverage",
+    "reflection_metrics",
+]
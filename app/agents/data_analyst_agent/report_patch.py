@@ -0,0 +1,167 @@
+# ──────────────────────────────────────────────
+# 补充轮次的增量修改：LLM 只输出新增 / 修改的章节，按标题合并回原报告
+# ──────────────────────────────────────────────
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.agents.data_analyst_agent.nodes.data_context_node import context_messages
+from app.agents.data_analyst_agent.report_checker import REQUIRED_SECTIONS
+from app.config.env_utils import REPORT_PATCH_ENABLED
+from app.prompts.data_analyst_agent_prompt import SUPPLEMENT_PATCH_PROMPT
+
+_FENCE_RE = re.compile(r"^\s*```[\w-]*\n(.*?)\n```\s*$", re.S)
+_H2_RE = re.compile(r"^##(?!#)\s*(.+?)\s*#*\s*$", re.M)
+_H3_RE = re.compile(r"^###(?!#)\s*(.+?)\s*#*\s*$", re.M)
+# 标题前的编号（"1." / "一、" / "（2）"）与标点不参与匹配
+_NUMBERING_RE = re.compile(r"^[\d一二三四五六七八九十]+[.、．)]\s*|^[（(][\d一二三四五六七八九十]+[)）]\s*")
+_PUNCT_RE = re.compile(r"[\s*_`:：，,。.（）()]+")
+# 新增章节默认插在这些收尾章节之前
+_CLOSING_SECTIONS = ("关键洞察", "可视化建议")
+# 无法按标题合并的增量内容，整体作为该标题的新章节追加
+_FALLBACK_SECTION = "补充分析"
+
+
+def patch_mode(reflection: Optional[Dict[str, Any]], report: Optional[str]) -> bool:
+    """上一轮已有报告且反思要求补充时，本轮只生成增量修改"""
+    if not REPORT_PATCH_ENABLED or not reflection or not (report or "").strip():
+        return False
+    return reflection.get("next_action") == "supplement" or not reflection.get("is_complete", True)
+
+
+def patch_instructions(report: str, reflection: Dict[str, Any]) -> str:
+    def bullets(items: List[str]) -> str:
+        return "\n".join(f"- {item}" for item in items) or "- 无"
+
+    return SUPPLEMENT_PATCH_PROMPT.format(
+        report=report.strip(),
+        missing_aspects=bullets(reflection.get("missing_aspects") or []),
+        suggestions=bullets(reflection.get("suggestions") or []),
+    )
+
+
+def _split(text: str, heading: "re.Pattern[str]") -> Tuple[str, List[Tuple[str, str]]]:
+    matches = list(heading.finditer(text))
+    if not matches:
+        return text.strip(), []
+    sections = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        sections.append((match.group(1), text[match.start():end].strip()))
+    return text[:matches[0].start()].strip(), sections
+
+
+def split_sections(report: str) -> Tuple[str, List[Tuple[str, str]]]:
+    """拆分为 (第一个二级标题之前的内容, [(二级标题, 含标题行的整节文本)])，三级及以下标题属于所在的二级章节"""
+    return _split(report, _H2_RE)
+
+
+def _normalize_title(title: str) -> str:
+    return _PUNCT_RE.sub("", _NUMBERING_RE.sub("", title.strip()))
+
+
+def _section_key(title: str, kind: str) -> str:
+    """章节的匹配键：包含必需章节关键词时取关键词（"相关性分析" 与 "相关性" 视为同一章节），否则取规范化后的标题"""
+    for keyword in REQUIRED_SECTIONS.get(kind, ()):
+        if keyword in title:
+            return keyword
+    return _normalize_title(title)
+
+
+def _insert_position(keys: List[str], key: str, kind: str) -> int:
+    """新增章节的插入位置：必需章节按模板顺序插入，其他章节插在收尾章节之前"""
+    order = REQUIRED_SECTIONS.get(kind, ())
+    if key in order:
+        rank = order.index(key)
+        for i, existing in enumerate(keys):
+            if existing in order and order.index(existing) > rank:
+                return i
+        return len(keys)
+    for i, existing in enumerate(keys):
+        if existing in _CLOSING_SECTIONS:
+            return i
+    return len(keys)
+
+
+def _merge_subsections(bodies: List[str], patch: str, changes: Dict[str, List[str]]) -> None:
+    """只有三级标题的修改：替换已有报告中同名的三级小节（在所属二级章节内，小节到下一个三级标题为止）"""
+    _, subsections = _split(patch, _H3_RE)
+    for title, body in subsections:
+        key = _normalize_title(title)
+        for i, section in enumerate(bodies):
+            head, owned = _split(section, _H3_RE)
+            keys = [_normalize_title(t) for t, _ in owned]
+            if key in keys:
+                owned[keys.index(key)] = (title, body)
+                bodies[i] = "\n\n".join(([head] if head else []) + [b for _, b in owned])
+                changes["replaced"].append(title)
+                break
+        else:
+            changes["unmatched"].append(title)
+
+
+def merge_report(report: str, patch: str, kind: str) -> Tuple[str, Dict[str, List[str]]]:
+    """
+    把增量修改按二级标题合并回原报告：同名章节整节替换，新章节按模板顺序插入，其余章节保持不变；
+    只有三级标题时，替换所属章节中的同名小节。
+    返回 (合并后的报告, {"replaced": [...], "added": [...], "unmatched": [...]})，unmatched 为无法合并的内容。
+    以一级标题开头且没有二级标题时视为完整重写；没有任何内容能按标题合并时，增量输出整体作为"补充分析"章节追加。
+    """
+    fenced = _FENCE_RE.match(patch)
+    patch = fenced.group(1) if fenced else patch
+    head, sections = split_sections(report)
+    _, patches = split_sections(patch)
+    changes: Dict[str, List[str]] = {"replaced": [], "added": [], "unmatched": []}
+    keys = [_section_key(title, kind) for title, _ in sections]
+    bodies = [body for _, body in sections]
+
+    if not patches:
+        if patch.lstrip().startswith("# "):
+            changes["replaced"].append("（完整报告）")
+            return patch.strip(), changes
+        if _H3_RE.search(patch):
+            _merge_subsections(bodies, patch, changes)
+        elif patch.strip():
+            changes["unmatched"].append("（未按章节输出）")
+        if not changes["replaced"]:
+            if not patch.strip():
+                return report, changes
+            # 没有任何内容能按标题合并：把增量输出整体作为新章节追加，不再为完整重新生成多调用一次 LLM
+            patches = [(_FALLBACK_SECTION, f"## {_FALLBACK_SECTION}\n\n{patch.strip()}")]
+    for title, body in patches:
+        key = _section_key(title, kind)
+        if key in keys:
+            bodies[keys.index(key)] = body
+            changes["replaced"].append(title)
+        else:
+            position = _insert_position(keys, key, kind)
+            keys.insert(position, key)
+            bodies.insert(position, body)
+            changes["added"].append(title)
+    return "\n\n".join(([head] if head else []) + bodies) + "\n", changes
+
+
+async def run_with_patch(
+    llm: Any,
+    context: Dict[str, str],
+    prompt: str,
+    reflection: Optional[Dict[str, Any]],
+    report: Optional[str],
+    kind: str,
+) -> str:
+    """
+    调用 LLM 生成分析报告：补充轮次只让 LLM 输出需要新增或修改的章节并合并回原报告，
+    输出长度随缺失内容而不是整份报告增长；其他轮次完整生成（共享前缀在前，反思建议在最后）。
+    """
+    if not patch_mode(reflection, report):
+        response = await llm.ainvoke(context_messages(context, prompt, reflection))
+        return response.content
+
+    response = await llm.ainvoke(context_messages(context, prompt + "\n\n" + patch_instructions(report, reflection)))
+    content, changes = merge_report(report, response.content, kind)
+    print(f"🩹 增量合并：替换 {changes['replaced']}，新增 {changes['added']}，未能合并 {changes['unmatched']}")
+    return content
+
+
+__all__ = ["merge_report", "patch_instructions", "patch_mode", "run_with_patch", "split_sections"]
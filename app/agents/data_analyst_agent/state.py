@@ -9,6 +9,9 @@ class AnalystState(TypedDict):
     # 输入数据
     input_data: DataQueryOutput
 
+    # 共享数据上下文（三个分析分支共用的提示词前缀与各引擎的预计算结果，只构建一次）
+    data_context: Optional[Dict[str, str]]
+
     # 中间分析结果
     statistical_result: Optional[str]
     trend_result: Optional[str]
@@ -25,7 +25,8 @@ class json_response_format(BaseModel):
     path: str=Field(description="文件举例路径，如data/sales.csv")
     columns: list =Field(description="文件中的列表属性，如age,year,name等表格文件的首行属性")
     row_count: int = Field(description="文件的行数，如128")
-    all_rows: list =Field(description="展示所有行的内容，列表中也是json格式")
+    dataset_id: str = Field(description="工具返回的 dataset_id，原样填写，完整数据通过它从数据集注册表取回")
+    fingerprint: str = Field(default="", description="工具返回的 fingerprint，原样填写")
 
 
 
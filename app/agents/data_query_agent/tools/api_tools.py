@@ -1,11 +1,21 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
-
-import requests
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
+import orjson
 import pandas as pd
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
+
+from app.agents.data_query_agent.tools.pagination import PageFetcher, PaginationSpec
+from app.config.env_utils import API_STREAM_BATCH_ROWS, API_STREAM_CHUNK_BYTES
+from app.services.dataset_registry import ColumnarDatasetBuilder, dataset_registry, records_to_frame
+from app.services.flatten import RecordFlattener
+from app.services.http_cache import cached_http_client
+from app.services.http_client import http_client_pool
+from app.services.json_stream import JSONPathStream
 
 
 def _extract_data_by_path(obj: Any, data_path: Optional[str]) -> Any:
@@ -21,35 +31,28 @@ def _extract_data_by_path(obj: Any, data_path: Optional[str]) -> Any:
     return cur
 
 
-def _request_api(
+def _make_flattener(flatten: Optional[Dict[str, Any]]) -> RecordFlattener:
+    """payload.flatten：{"max_depth": 2, "list_policy": "explode", "explode": "items"}，缺省取环境变量配置"""
+    flatten = flatten or {}
+    kwargs = {k: flatten[k] for k in ("max_depth", "list_policy") if flatten.get(k) is not None}
+    return RecordFlattener(explode_path=flatten.get("explode"), **kwargs)
+
+
+def _tabulate_response(
+    data: Any,
     url: str,
-    method: str = "GET",
-    params: Optional[Dict[str, Any]] = None,
-    headers: Optional[Dict[str, str]] = None,
-    json_body: Optional[Dict[str, Any]] = None,
-    data_path: Optional[str] = None,
+    method: str,
+    data_path: Optional[str],
+    flattener: Optional[RecordFlattener] = None,
 ) -> Dict[str, Any]:
-    resp = requests.request(
-        method=method,
-        url=url,
-        params=params,
-        headers=headers,
-        json=json_body,
-        timeout=30,
-    )
-    resp.raise_for_status()
-    data = resp.json()
     data = _extract_data_by_path(data, data_path)
 
     # 尝试归一化为表格结构
     try:
-        df = pd.json_normalize(data)
-        df.columns = [
-            str(c).strip().lower().replace(" ", "_").replace("-", "_") for c in df.columns
-        ]
+        df = records_to_frame(data, flattener)
+        handle = dataset_registry.register(df, source="api", path=url)
         return {
-            "columns": list(df.columns),
-            "rows": df.to_dict(orient="records"),
+            **dataset_registry.describe(handle.dataset_id),
             "url": url,
             "method": method,
             "data_path": data_path,
@@ -64,30 +67,259 @@ def _request_api(
         }
 
 
-import json
+def _page_fetcher(
+    pagination: Dict[str, Any],
+    url: str,
+    method: str,
+    params: Optional[Dict[str, Any]],
+    headers: Optional[Dict[str, str]],
+    json_body: Optional[Dict[str, Any]],
+    data_path: Optional[str],
+    flattener: RecordFlattener,
+) -> PageFetcher:
+    return PageFetcher(
+        PaginationSpec(**pagination),
+        url,
+        method=method,
+        params=params,
+        headers=headers,
+        json_body=json_body,
+        extract=lambda body: _extract_data_by_path(body, data_path),
+        flattener=flattener,
+    )
+
+
+def _paged_result(
+    frame: pd.DataFrame,
+    stats: Dict[str, Any],
+    url: str,
+    method: str,
+    data_path: Optional[str],
+) -> Dict[str, Any]:
+    handle = dataset_registry.register(frame, source="api", path=url)
+    return {
+        **dataset_registry.describe(handle.dataset_id),
+        "url": url,
+        "method": method,
+        "data_path": data_path,
+        "pagination": stats,
+    }
+
+
+class _StreamIngest:
+    """流式读取时的增量入库：按 data_path 逐条取出记录，攒够一批后展开并写入列式数据集"""
+
+    def __init__(
+        self,
+        url: str,
+        data_path: Optional[str],
+        flattener: RecordFlattener,
+        batch_rows: int = API_STREAM_BATCH_ROWS,
+    ):
+        self.stream = JSONPathStream(data_path)
+        self.flattener = flattener
+        self.builder = ColumnarDatasetBuilder(source="api", path=url)
+        self.batch_rows = batch_rows
+        self.batch: List[Any] = []
+        self.batches = 0
+        self.start = time.perf_counter()
+
+    def _flush(self) -> None:
+        if self.batch:
+            self.builder.append(records_to_frame(self.batch, self.flattener))
+            self.batches += 1
+            self.batch = []
+
+    def feed(self, chunk: bytes) -> None:
+        self.batch += self.stream.feed(chunk)
+        if len(self.batch) >= self.batch_rows:
+            self._flush()
+
+    def finish(self) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        self.batch += self.stream.close()
+        self._flush()
+        frame = self.builder.build()
+        stats = {
+            "bytes": self.stream.bytes_read,
+            "rows": int(len(frame)),
+            "batches": self.batches,
+            "data_path_found": self.stream.found,
+            "elapsed_ms": round((time.perf_counter() - self.start) * 1000, 1),
+        }
+        return frame, stats
+
+
+def _streamed_result(
+    frame: pd.DataFrame,
+    stats: Dict[str, Any],
+    url: str,
+    method: str,
+    data_path: Optional[str],
+) -> Dict[str, Any]:
+    if not stats["data_path_found"]:
+        return {"error": f"响应中不存在 data_path：{data_path}", "url": url, "method": method, "data_path": data_path}
+    handle = dataset_registry.register(frame, source="api", path=url)
+    return {
+        **dataset_registry.describe(handle.dataset_id),
+        "url": url,
+        "method": method,
+        "data_path": data_path,
+        "stream": stats,
+    }
+
+
+def _stream_api(
+    url: str,
+    method: str,
+    params: Optional[Dict[str, Any]],
+    headers: Optional[Dict[str, str]],
+    json_body: Optional[Dict[str, Any]],
+    data_path: Optional[str],
+    flattener: RecordFlattener,
+) -> Dict[str, Any]:
+    # 流式读取不经过 HTTP 缓存：缓存需要整体持有响应体
+    ingest = _StreamIngest(url, data_path, flattener)
+    with http_client_pool.stream(method, url, params=params, headers=headers, json=json_body) as resp:
+        resp.raise_for_status()
+        for chunk in resp.iter_bytes(API_STREAM_CHUNK_BYTES):
+            ingest.feed(chunk)
+    frame, stats = ingest.finish()
+    return _streamed_result(frame, stats, url, method, data_path)
+
+
+async def _astream_api(
+    url: str,
+    method: str,
+    params: Optional[Dict[str, Any]],
+    headers: Optional[Dict[str, str]],
+    json_body: Optional[Dict[str, Any]],
+    data_path: Optional[str],
+    flattener: RecordFlattener,
+) -> Dict[str, Any]:
+    ingest = _StreamIngest(url, data_path, flattener)
+    async with http_client_pool.astream(method, url, params=params, headers=headers, json=json_body) as resp:
+        resp.raise_for_status()
+        async for chunk in resp.aiter_bytes(API_STREAM_CHUNK_BYTES):
+            await asyncio.to_thread(ingest.feed, chunk)
+    frame, stats = await asyncio.to_thread(ingest.finish)
+    return _streamed_result(frame, stats, url, method, data_path)
 
-@tool
-def _api_reader_tool(input_str: str) -> Dict[str, Any]:
+
+def _request_api(
+    url: str,
+    method: str = "GET",
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    json_body: Optional[Dict[str, Any]] = None,
+    data_path: Optional[str] = None,
+    pagination: Optional[Dict[str, Any]] = None,
+    stream: bool = False,
+    flatten: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    flattener = _make_flattener(flatten)
+    if stream and not pagination:
+        return _stream_api(url, method, params, headers, json_body, data_path, flattener)
+    if pagination:
+        fetcher = _page_fetcher(pagination, url, method, params, headers, json_body, data_path, flattener)
+        frame, stats = fetcher.fetch_all()
+        return _paged_result(frame, stats, url, method, data_path)
+
+    # 共享连接池 + 磁盘 HTTP 缓存：有效期内直接复用，过期后发条件请求
+    resp = cached_http_client.request(
+        method,
+        url,
+        params=params,
+        headers=headers,
+        json=json_body,
+    )
+    resp.raise_for_status()
+    result = _tabulate_response(orjson.loads(resp.content), url, method, data_path, flattener)
+    result["http_cache"] = resp.extensions.get("http_cache")
+    return result
+
+
+async def _arequest_api(
+    url: str,
+    method: str = "GET",
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    json_body: Optional[Dict[str, Any]] = None,
+    data_path: Optional[str] = None,
+    pagination: Optional[Dict[str, Any]] = None,
+    stream: bool = False,
+    flatten: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    _request_api 的异步版本：使用共享的 httpx.AsyncClient 发请求，JSON 解析与表格化放到线程中执行。
+    page / offset 分页时剩余页面受限并发抓取，一次工具调用拿回全部页面。
+    stream 为真时边下载边按 data_path 解析，响应体不整体读入内存。
+    """
+    flattener = _make_flattener(flatten)
+    if stream and not pagination:
+        return await _astream_api(url, method, params, headers, json_body, data_path, flattener)
+    if pagination:
+        fetcher = _page_fetcher(pagination, url, method, params, headers, json_body, data_path, flattener)
+        frame, stats = await fetcher.afetch_all()
+        return _paged_result(frame, stats, url, method, data_path)
+
+    resp = await cached_http_client.arequest(
+        method,
+        url,
+        params=params,
+        headers=headers,
+        json=json_body,
+    )
+    resp.raise_for_status()
+    result = await asyncio.to_thread(
+        lambda: _tabulate_response(orjson.loads(resp.content), url, method, data_path, flattener)
+    )
+    result["http_cache"] = resp.extensions.get("http_cache")
+    return result
+
+
+def _parse_payload(input_str: str) -> Dict[str, Any]:
+    payload = json.loads(input_str)
+    return {
+        "url": payload["url"],
+        "method": payload.get("method", "GET"),
+        "params": payload.get("params"),
+        "headers": payload.get("headers"),
+        "json_body": payload.get("json_body"),
+        "data_path": payload.get("data_path"),
+        "pagination": payload.get("pagination"),
+        "stream": bool(payload.get("stream", False)),
+        "flatten": payload.get("flatten"),
+    }
+
+
+def api_reader(input_str: str) -> Dict[str, Any]:
     """
     构建一个用于 ReAct Agent 的 HTTP API 读取 Tool。
 
     由于 ReAct 以自然语言规划，这里简化为：
     - 输入字符串的格式为一个简单的 JSON 字符串
       例如：{"url": "...", "method": "GET", "data_path": "data.items"}
+    - 分页接口通过 pagination 一次抓取全部页面，合并为同一个数据集，不要逐页多次调用本工具：
+      页码：{"type": "page", "param": "page", "size_param": "page_size", "size": 100, "total_path": "data.total"}
+      偏移：{"type": "offset", "param": "offset", "size_param": "limit", "size": 100}
+      游标：{"type": "cursor", "param": "cursor", "cursor_path": "data.next_cursor"}
+      Link 响应头：{"type": "link"}
+      可选 max_pages（最多页数）、concurrency（并发页数）、total_pages_path（总页数路径）、start（起始页码 / 偏移）
+    - 响应体很大（几十 MB 以上）时加上 "stream": true，边下载边按 data_path 解析入库
+    - 嵌套记录的展平方式可用 flatten 指定，例如 {"max_depth": 2, "list_policy": "explode", "explode": "items"}
+      list_policy：stringify（列表转为 JSON 字符串，默认）/ explode（把一个列表列展开为多行）/ keep（保留列表）
     """
-    payload = json.loads(input_str)
-    url = payload["url"]
-    method = payload.get("method", "GET")
-    params = payload.get("params")
-    headers = payload.get("headers")
-    json_body = payload.get("json_body")
-    data_path = payload.get("data_path")
-    return _request_api(
-        url=url,
-        method=method,
-        params=params,
-        headers=headers,
-        json_body=json_body,
-        data_path=data_path,
-    )
+    return _request_api(**_parse_payload(input_str))
+
+
+async def aapi_reader(input_str: str) -> Dict[str, Any]:
+    """api_reader 的异步版本"""
+    return await _arequest_api(**_parse_payload(input_str))
+
 
+# 同时提供同步与异步实现：Agent 通过 ainvoke 调用时走 httpx 异步请求，不阻塞事件循环
+_api_reader_tool = StructuredTool.from_function(
+    func=api_reader,
+    coroutine=aapi_reader,
+    name="_api_reader_tool",
+)
@@ -1,19 +1,87 @@
 from __future__ import annotations
 
+import asyncio
 import os
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 import pandas as pd
 
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
 
+from app.config.env_utils import FILE_STREAM_CHUNK_ROWS, FILE_STREAM_THRESHOLD_BYTES, FILE_CACHE_ENABLED, \
+    FILE_CACHE_DIR, FILE_CACHE_MAX_BYTES
+from app.services.dataset_registry import ColumnarDatasetBuilder, dataset_registry, normalize_columns
+from app.services.frame_cache import FrameDiskCache
 
-@tool
-def _read_table_file(
+# 解析后（列名已规范化）的完整表格缓存，key 为 (绝对路径, mtime, size, encoding, file_type)
+table_file_cache = FrameDiskCache(FILE_CACHE_DIR, FILE_CACHE_MAX_BYTES)
+
+
+def _file_cache_key(path: str, encoding: str, file_type: str) -> str:
+    stat = os.stat(path)
+    return FrameDiskCache.make_key(os.path.abspath(path), stat.st_mtime_ns, stat.st_size, encoding, file_type)
+
+
+def _cache_put(cache_key: str, df: pd.DataFrame) -> None:
+    """写磁盘缓存只是优化：磁盘已满、无权限、Windows 上缓存文件仍被映射占用等写入失败时，不影响本次读取"""
+    try:
+        table_file_cache.put(cache_key, df)
+    except OSError as e:
+        print(f"写入文件解析缓存失败，已跳过：{e}")
+
+
+def _project_and_filter(
+    df: pd.DataFrame,
+    usecols: Optional[List[str]] = None,
+    where: Optional[str] = None,
+) -> pd.DataFrame:
+    """对（已规范化列名的）DataFrame 做行过滤与列投影。"""
+    if where:
+        df = df.query(where).reset_index(drop=True)
+    if usecols:
+        missing = [c for c in usecols if c not in df.columns]
+        if missing:
+            raise KeyError(f"文件中不存在以下列: {missing}")
+        df = df[usecols]
+    return df
+
+
+def _stream_csv(
+    path: str,
+    encoding: str,
+    chunk_size: int,
+    usecols: Optional[List[str]] = None,
+    where: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    分块流式读取 CSV：每块读入后立即规范化列名、过滤、投影，再追加到列式数据集中。
+    内存峰值由 chunk_size 决定，而不是文件大小。
+    """
+    wanted = set(usecols) if usecols else None
+    reader = pd.read_csv(
+        path,
+        encoding=encoding,
+        chunksize=chunk_size,
+        # 列投影在解析阶段完成，未选中的列不会被读入内存
+        usecols=(lambda c: normalize_columns([c])[0] in wanted) if wanted else None,
+    )
+    builder = ColumnarDatasetBuilder(source="csv", path=path)
+    with reader:
+        for chunk in reader:
+            chunk.columns = normalize_columns(chunk.columns)
+            builder.append(_project_and_filter(chunk, usecols=usecols, where=where))
+    return builder.build()
+
+
+def read_table_file(
     path: str,
     *,
     file_type: Optional[str] = None,
     encoding: str = "utf-8",
+    stream: Optional[bool] = None,
+    chunk_size: int = FILE_STREAM_CHUNK_ROWS,
+    usecols: Optional[List[str]] = None,
+    where: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     读取本地 CSV/Excel，返回结构化数据。
@@ -21,7 +89,14 @@ def _read_table_file(
     "输入应包含文件路径，例如：'path=data/sales.csv'。"
 
     - 自动根据后缀推断类型，或通过 file_type 指定：csv / excel
-    - 返回 {"columns": [...], "rows": [ {...}, ... ]}
+    - stream：是否分块流式读取 CSV；不传时文件超过阈值自动启用
+    - chunk_size：流式读取时每块的行数
+    - usecols：只读取这些列（使用规范化后的小写下划线列名），如 ["date", "sales"]
+    - where：行过滤条件（pandas query 表达式，列名为规范化后的列名，且需包含在 usecols 中），
+      如 "sales > 1000 and region == '北京'"
+    - 解析结果按 (绝对路径, mtime, size, encoding, file_type) 缓存到本地磁盘，文件未变化时直接复用
+    - 数据登记到进程内数据集注册表，只返回句柄与少量预览行：
+      {"dataset_id": "...", "columns": [...], "row_count": 128, "fingerprint": "...", "preview_rows": [...]}
     """
     if not os.path.exists(path):
         raise FileNotFoundError(f"文件不存在: {path}")
@@ -32,18 +107,67 @@ def _read_table_file(
     if _type not in {"csv", "xlsx", "xls", "excel"}:
         raise ValueError(f"暂不支持的文件类型: {_type}")
 
-    if _type == "csv":
-        df = pd.read_csv(path, encoding=encoding)
+    if stream is None:
+        stream = os.path.getsize(path) > FILE_STREAM_THRESHOLD_BYTES
+
+    source = "csv" if _type == "csv" else "excel"
+    cache_key = _file_cache_key(path, encoding, source) if FILE_CACHE_ENABLED else None
+    cached = table_file_cache.get(cache_key) if cache_key else None
+
+    if cached is not None:
+        # 命中磁盘缓存：直接从内存映射的列式文件中过滤与投影
+        df = _project_and_filter(cached[0], usecols=usecols, where=where)
+    elif _type == "csv" and stream:
+        df = _stream_csv(path, encoding, chunk_size, usecols=usecols, where=where)
+        if cache_key and not usecols and not where:
+            _cache_put(cache_key, df)
     else:
-        df = pd.read_excel(path)
+        if _type == "csv":
+            df = pd.read_csv(path, encoding=encoding)
+        else:
+            # Excel 不支持分块解析，读入后再过滤与投影
+            df = pd.read_excel(path)
+        df.columns = normalize_columns(df.columns)
+        if cache_key:
+            _cache_put(cache_key, df)
+        df = _project_and_filter(df, usecols=usecols, where=where)
 
-    df.columns = [
-        str(c).strip().lower().replace(" ", "_").replace("-", "_") for c in df.columns
-    ]
+    handle = dataset_registry.register(df, source=source, path=path)
     return {
-        "columns": list(df.columns),
-        "rows": df.to_dict(orient="records"),
+        **dataset_registry.describe(handle.dataset_id),
         "path": path,
-        "type": "csv" if _type == "csv" else "excel",
+        "type": source,
+        "streamed": bool(cached is None and stream and _type == "csv"),
+        "cache_hit": cached is not None,
     }
 
+
+async def aread_table_file(
+    path: str,
+    *,
+    file_type: Optional[str] = None,
+    encoding: str = "utf-8",
+    stream: Optional[bool] = None,
+    chunk_size: int = FILE_STREAM_CHUNK_ROWS,
+    usecols: Optional[List[str]] = None,
+    where: Optional[str] = None,
+) -> Dict[str, Any]:
+    """read_table_file 的异步版本：磁盘读取与解析放到线程中执行，不阻塞事件循环"""
+    return await asyncio.to_thread(
+        read_table_file,
+        path,
+        file_type=file_type,
+        encoding=encoding,
+        stream=stream,
+        chunk_size=chunk_size,
+        usecols=usecols,
+        where=where,
+    )
+
+
+# 同时提供同步与异步实现：Agent 通过 ainvoke 调用时走异步路径
+_read_table_file = StructuredTool.from_function(
+    func=read_table_file,
+    coroutine=aread_table_file,
+    name="_read_table_file",
+)
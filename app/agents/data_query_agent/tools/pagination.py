@@ -0,0 +1,324 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
+
+import httpx
+import orjson
+import pandas as pd
+from pydantic import BaseModel, Field
+
+from app.config.env_utils import API_MAX_PAGES, API_PAGE_CONCURRENCY
+from app.services.dataset_registry import ColumnarDatasetBuilder, records_to_frame
+from app.services.flatten import RecordFlattener
+from app.services.http_cache import cached_http_client
+
+
+def _get_path(obj: Any, path: Optional[str]) -> Any:
+    """按 a.b.c 取值，路径不存在时返回 None"""
+    if not path:
+        return None
+    cur = obj
+    for key in path.split("."):
+        if not isinstance(cur, dict):
+            return None
+        cur = cur.get(key)
+    return cur
+
+
+# ──────────────────────────────────────────────
+# 1. 声明式分页配置（放在 _api_reader_tool 的 payload.pagination 中）
+# ──────────────────────────────────────────────
+class PaginationSpec(BaseModel):
+    """
+    分页方式：
+    - page：页码参数，如 ?page=1&page_size=100
+    - offset：偏移量参数，如 ?offset=0&limit=100
+    - cursor：游标参数，下一页游标从响应中按 cursor_path 取出
+    - link：按响应头 Link: <...>; rel="next" 翻页
+    """
+    type: Literal["page", "offset", "cursor", "link"] = Field(description="分页方式")
+    param: Optional[str] = Field(None, description="页码 / 偏移量 / 游标的参数名，默认 page、offset、cursor")
+    size_param: Optional[str] = Field(None, description="每页条数的参数名，如 page_size、limit")
+    size: Optional[int] = Field(None, description="每页条数；page / offset 方式下，返回条数不足一页即视为最后一页")
+    start: Optional[int] = Field(None, description="起始页码或偏移量，默认 page 为 1、offset 为 0")
+    total_path: Optional[str] = Field(None, description="响应中总条数的路径，如 data.total")
+    total_pages_path: Optional[str] = Field(None, description="响应中总页数的路径，如 data.pages")
+    cursor_path: Optional[str] = Field(None, description="cursor 方式下，响应中下一页游标的路径，如 data.next_cursor")
+    max_pages: int = Field(API_MAX_PAGES, description="最多抓取的页数")
+    concurrency: int = Field(API_PAGE_CONCURRENCY, description="并发抓取的页数")
+
+    @property
+    def page_param(self) -> str:
+        return self.param or {"page": "page", "offset": "offset", "cursor": "cursor"}.get(self.type, "")
+
+    @property
+    def first(self) -> int:
+        if self.start is not None:
+            return self.start
+        return 1 if self.type == "page" else 0
+
+    def params_for(self, index: int) -> Dict[str, Any]:
+        """page / offset 方式下第 index 页（从 0 开始）的查询参数"""
+        params: Dict[str, Any] = {}
+        if self.size and self.size_param:
+            params[self.size_param] = self.size
+        if self.type == "page":
+            params[self.page_param] = self.first + index
+        elif self.type == "offset":
+            if not self.size:
+                raise ValueError("offset 分页必须指定 size")
+            params[self.page_param] = self.first + index * self.size
+        return params
+
+    def total_pages(self, body: Any) -> Optional[int]:
+        pages = _get_path(body, self.total_pages_path)
+        if pages is not None:
+            return int(pages)
+        total = _get_path(body, self.total_path)
+        if total is not None and self.size:
+            return math.ceil(int(total) / self.size)
+        return None
+
+    def is_last(self, records: List[Any]) -> bool:
+        return not records or (self.size is not None and len(records) < self.size)
+
+
+def _past_end(exc: httpx.HTTPStatusError) -> bool:
+    """页码 / 偏移量超出范围时，不少接口返回 404 而不是空列表"""
+    return exc.response.status_code == 404
+
+
+def _to_records(data: Any) -> List[Any]:
+    if data is None:
+        return []
+    return data if isinstance(data, list) else [data]
+
+
+# ──────────────────────────────────────────────
+# 2. 抓取：page / offset 并发扇出，cursor / link 只能顺序翻页
+# ──────────────────────────────────────────────
+class PageFetcher:
+    """
+    按分页配置抓取全部页面，逐页规范化后按页序写入同一个列式数据集。
+
+    extract 为从单页响应 JSON 中取出记录列表的函数（即按 data_path 取值）；flattener 为各页共用的展平器。
+    """
+
+    def __init__(
+        self,
+        spec: PaginationSpec,
+        url: str,
+        method: str = "GET",
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        json_body: Optional[Dict[str, Any]] = None,
+        extract: Callable[[Any], Any] = lambda body: body,
+        flattener: Optional[RecordFlattener] = None,
+    ):
+        self.spec = spec
+        self.url = url
+        self.method = method
+        self.params = params or {}
+        self.headers = headers
+        self.json_body = json_body
+        self.extract = extract
+        # 所有页面共用一个展平器：schema 只按第一页推断一次
+        self.flattener = flattener or RecordFlattener()
+        # 并发页面在线程池中解析；展平器会记录推断出的 schema（可变状态），展平与计数在锁内串行执行
+        self._lock = threading.Lock()
+        self.pages: Dict[int, pd.DataFrame] = {}
+        self.requests = 0
+        self.cache_status: Counter = Counter()
+        self.stop_reason = ""
+
+    def _request_kwargs(self, extra_params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "params": {**self.params, **(extra_params or {})} if extra_params is not None else None,
+            "headers": self.headers,
+            "json": self.json_body,
+        }
+
+    def _handle(self, index: int, resp: httpx.Response) -> Tuple[Any, List[Any]]:
+        with self._lock:
+            self.cache_status[resp.extensions.get("http_cache", "bypass")] += 1
+        resp.raise_for_status()
+        body = orjson.loads(resp.content)
+        records = _to_records(self.extract(body))
+        if records:
+            with self._lock:
+                self.pages[index] = records_to_frame(records, self.flattener)
+        return body, records
+
+    # ---------- 异步 ----------
+    async def _afetch(self, index: int, url: str, extra_params: Optional[Dict[str, Any]]) -> Tuple[Any, List[Any]]:
+        self.requests += 1
+        resp = await cached_http_client.arequest(self.method, url, **self._request_kwargs(extra_params))
+        return await asyncio.to_thread(self._handle, index, resp), resp
+
+    async def afetch_all(self) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        start = time.perf_counter()
+        if self.spec.type in ("page", "offset"):
+            await self._afetch_indexed()
+        else:
+            await self._afetch_sequential()
+        return self._build(start)
+
+    async def _afetch_indexed(self) -> None:
+        spec = self.spec
+        (body, records), _ = await self._afetch(0, self.url, spec.params_for(0))
+        total_pages = spec.total_pages(body)
+        semaphore = asyncio.Semaphore(max(spec.concurrency, 1))
+
+        async def fetch(index: int) -> Tuple[int, Any]:
+            """返回 (页序号, 记录列表)；HTTP 错误不在这里抛出，由调用方判断是否已越过最后一页"""
+            async with semaphore:
+                try:
+                    (_, page_records), _ = await self._afetch(index, self.url, spec.params_for(index))
+                except httpx.HTTPStatusError as exc:
+                    return index, exc
+                return index, page_records
+
+        if total_pages is not None:
+            # 已知总页数：剩余页面一次性并发扇出
+            last = min(total_pages, spec.max_pages)
+            for _, page_records in await asyncio.gather(*(fetch(i) for i in range(1, last))):
+                if isinstance(page_records, httpx.HTTPStatusError):
+                    raise page_records
+            self.stop_reason = "total" if total_pages <= spec.max_pages else "max_pages"
+            return
+
+        # 总页数未知：按并发数分批抓取，某一页不足一页时停止
+        if spec.is_last(records):
+            self.stop_reason = "last_page"
+            return
+        index = 1
+        while index < spec.max_pages:
+            batch = range(index, min(index + spec.concurrency, spec.max_pages))
+            results = sorted(await asyncio.gather(*(fetch(i) for i in batch)), key=lambda r: r[0])
+            index = batch.stop
+            last_index = None
+            # 按页序检查：最后一页之后多抓的页面可能返回错误状态（如 404），不视为失败
+            for i, page_records in results:
+                if isinstance(page_records, httpx.HTTPStatusError):
+                    if not _past_end(page_records):
+                        raise page_records
+                    last_index = i - 1
+                    break
+                if spec.is_last(page_records):
+                    last_index = i
+                    break
+            if last_index is not None:
+                # 最后一页之后的页面（同一批中多抓的页面）丢弃
+                for i in list(self.pages):
+                    if i > last_index:
+                        self.pages.pop(i)
+                self.stop_reason = "last_page"
+                return
+        self.stop_reason = "max_pages"
+
+    async def _afetch_sequential(self) -> None:
+        url, extra = self.url, self._first_sequential_params()
+        for index in range(self.spec.max_pages):
+            (body, records), resp = await self._afetch(index, url, extra)
+            next_page = self._next_page(body, resp, records)
+            if next_page is None:
+                return
+            url, extra = next_page
+        self.stop_reason = "max_pages"
+
+    # ---------- 同步 ----------
+    def _fetch(self, index: int, url: str, extra_params: Optional[Dict[str, Any]]) -> Tuple[Tuple[Any, List[Any]], httpx.Response]:
+        self.requests += 1
+        resp = cached_http_client.request(self.method, url, **self._request_kwargs(extra_params))
+        return self._handle(index, resp), resp
+
+    def fetch_all(self) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        """同步版本：所有分页方式都顺序翻页"""
+        start = time.perf_counter()
+        spec = self.spec
+        if spec.type in ("page", "offset"):
+            total_pages = None
+            for index in range(spec.max_pages):
+                try:
+                    (body, records), _ = self._fetch(index, self.url, spec.params_for(index))
+                except httpx.HTTPStatusError as exc:
+                    # 最后一页恰好满页时，下一页可能直接返回 404
+                    if index == 0 or total_pages is not None or not _past_end(exc):
+                        raise
+                    self.stop_reason = "last_page"
+                    break
+                if index == 0:
+                    total_pages = spec.total_pages(body)
+                if total_pages is not None and index + 1 >= total_pages:
+                    self.stop_reason = "total"
+                    break
+                if total_pages is None and spec.is_last(records):
+                    self.stop_reason = "last_page"
+                    break
+            else:
+                self.stop_reason = "max_pages"
+        else:
+            url, extra = self.url, self._first_sequential_params()
+            for index in range(spec.max_pages):
+                (body, records), resp = self._fetch(index, url, extra)
+                next_page = self._next_page(body, resp, records)
+                if next_page is None:
+                    break
+                url, extra = next_page
+            else:
+                self.stop_reason = "max_pages"
+        return self._build(start)
+
+    # ---------- 公共 ----------
+    def _first_sequential_params(self) -> Dict[str, Any]:
+        params: Dict[str, Any] = {}
+        if self.spec.size and self.spec.size_param:
+            params[self.spec.size_param] = self.spec.size
+        return params
+
+    def _next_page(
+        self,
+        body: Any,
+        resp: httpx.Response,
+        records: List[Any],
+    ) -> Optional[Tuple[str, Optional[Dict[str, Any]]]]:
+        """cursor / link 方式的下一页 (url, 额外参数)；没有下一页时返回 None"""
+        if not records:
+            self.stop_reason = "last_page"
+            return None
+        if self.spec.type == "cursor":
+            cursor = _get_path(body, self.spec.cursor_path)
+            if not cursor:
+                self.stop_reason = "no_cursor"
+                return None
+            return self.url, {**self._first_sequential_params(), self.spec.page_param: cursor}
+        next_url = resp.links.get("next", {}).get("url")
+        if not next_url:
+            self.stop_reason = "no_next_link"
+            return None
+        # Link 头中的 URL 已包含全部查询参数
+        return str(resp.url.join(next_url)), None
+
+    def _build(self, start: float) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        builder = ColumnarDatasetBuilder(source="api", path=self.url)
+        for index in sorted(self.pages):
+            builder.append(self.pages[index])
+        frame = builder.build()
+        stats = {
+            "type": self.spec.type,
+            "pages": len(self.pages),
+            "requests": self.requests,
+            "rows": int(len(frame)),
+            "stop_reason": self.stop_reason,
+            "http_cache": dict(self.cache_status),
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+        return frame, stats
+
+
+__all__ = ["PaginationSpec", "PageFetcher"]
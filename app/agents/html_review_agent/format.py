@@ -21,7 +21,8 @@ class DataQueryInput(BaseModel):
     path: str = Field(default="")
     columns: List[str] = Field(default_factory=list)
     row_count: int = Field(default=0)
-    all_rows: List[Dict[str, Any]] = Field(default_factory=list)
+    dataset_id: str = Field(default="")
+    fingerprint: str = Field(default="")
 
 
 # ──────────────────────────────────────────────
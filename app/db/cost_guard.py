@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import json
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.config.env_utils import COST_GUARD_LIMIT_ROWS, COST_GUARD_MAX_ROWS_EXAMINED, COST_GUARD_POLICY
+from app.db.streaming import add_limit, is_select
+
+COST_GUARD_POLICIES = ("limit", "regenerate", "reject")
+
+
+# ──────────────────────────────────────────────
+# 1. 执行计划估算结果
+# ──────────────────────────────────────────────
+@dataclass
+class CostEstimate:
+    """EXPLAIN 得到的成本估算；available=False 表示该数据库 / 语句拿不到估算"""
+    available: bool
+    rows_examined: Optional[int] = None
+    query_cost: Optional[float] = None
+    full_scans: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+@dataclass
+class CostDecision:
+    """
+    成本检查结论：
+    - pass：估算在阈值内（或无法估算），按原 SQL 执行
+    - limit：已把 SQL 改写为带 LIMIT 的版本
+    - regenerate：需要让 LLM 生成更省的 SQL
+    - reject：拒绝执行
+    """
+    action: str
+    sql: str
+    estimate: CostEstimate
+    threshold: int
+    reason: str = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("sql")
+        data.update(data.pop("estimate"))
+        return data
+
+
+# ──────────────────────────────────────────────
+# 2. 各数据库的 EXPLAIN 解析
+# ──────────────────────────────────────────────
+def _as_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _walk_mysql(node: Any, estimate: CostEstimate, prefix: float = 1.0) -> float:
+    """
+    遍历 MySQL EXPLAIN FORMAT=JSON 的计划树，估算总扫描行数。
+
+    nested_loop 中第 i 张表的扫描行数 = 前面各表连接产出的行数 × 本表每次扫描的行数，
+    派生表 / 子查询按同样规则递归累加。
+    """
+    rows = 0.0
+    if isinstance(node, list):
+        for item in node:
+            rows += _walk_mysql(item, estimate, prefix)
+    elif isinstance(node, dict):
+        for key, value in node.items():
+            if key == "nested_loop" and isinstance(value, list):
+                loop_prefix = prefix
+                for item in value:
+                    rows += _walk_mysql(item, estimate, loop_prefix)
+                    produced = _as_float((item.get("table") or {}).get("rows_produced_per_join"))
+                    loop_prefix = prefix * max(produced, 1.0)
+            elif key == "table" and isinstance(value, dict):
+                rows += prefix * _as_float(value.get("rows_examined_per_scan"))
+                if value.get("access_type") == "ALL":
+                    estimate.full_scans.append(value.get("table_name", ""))
+                rows += _walk_mysql(value, estimate, 1.0)
+            elif isinstance(value, (dict, list)):
+                rows += _walk_mysql(value, estimate, prefix)
+    return rows
+
+
+def _explain_mysql(conn: Connection, sql: str) -> CostEstimate:
+    raw = conn.execute(text(f"EXPLAIN FORMAT=JSON {sql}")).scalar()
+    plan = json.loads(raw)
+    estimate = CostEstimate(available=True)
+    estimate.rows_examined = int(_walk_mysql(plan, estimate))
+    estimate.query_cost = _as_float((plan.get("query_block", {}).get("cost_info") or {}).get("query_cost")) or None
+    return estimate
+
+
+def _walk_postgres(plan: Dict[str, Any], estimate: CostEstimate) -> float:
+    rows = 0.0
+    if "Relation Name" in plan:
+        rows += _as_float(plan.get("Plan Rows"))
+        if plan.get("Node Type") == "Seq Scan":
+            estimate.full_scans.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        rows += _walk_postgres(child, estimate)
+    return rows
+
+
+def _explain_postgres(conn: Connection, sql: str) -> CostEstimate:
+    raw = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+    estimate = CostEstimate(available=True)
+    estimate.rows_examined = int(_walk_postgres(plan, estimate))
+    estimate.query_cost = _as_float(plan.get("Total Cost")) or None
+    return estimate
+
+
+def _explain_sqlite(conn: Connection, sql: str) -> CostEstimate:
+    # SQLite 的 EXPLAIN QUERY PLAN 不给出行数估算，只能识别全表扫描
+    estimate = CostEstimate(available=False)
+    for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")):
+        detail = str(row[-1])
+        if detail.startswith("SCAN ") and "INDEX" not in detail:
+            estimate.full_scans.append(detail.split()[1])
+    return estimate
+
+
+_EXPLAINERS = {
+    "mysql": _explain_mysql,
+    "mariadb": _explain_mysql,
+    "postgresql": _explain_postgres,
+    "sqlite": _explain_sqlite,
+}
+
+
+def explain_cost(conn: Connection, sql: str) -> CostEstimate:
+    """对 SELECT / WITH 语句执行 EXPLAIN 并估算扫描行数；EXPLAIN 失败时不影响后续执行"""
+    explainer = _EXPLAINERS.get(conn.dialect.name)
+    if explainer is None or not is_select(sql):
+        return CostEstimate(available=False)
+    try:
+        return explainer(conn, sql.strip().rstrip(";"))
+    except Exception as e:
+        # PostgreSQL 语句失败后事务不可用，回滚后再执行正式查询
+        conn.rollback()
+        return CostEstimate(available=False, error=str(e))
+
+
+# ──────────────────────────────────────────────
+# 3. 执行前的成本检查
+# ──────────────────────────────────────────────
+def check_cost(
+    conn: Connection,
+    sql: str,
+    *,
+    max_rows_examined: int = COST_GUARD_MAX_ROWS_EXAMINED,
+    policy: str = COST_GUARD_POLICY,
+    limit_rows: int = COST_GUARD_LIMIT_ROWS,
+) -> CostDecision:
+    """
+    根据 EXPLAIN 估算的扫描行数决定如何处理 LLM 生成的 SQL。
+
+    超过 max_rows_examined 时按 policy 处理：
+    - limit：在最外层追加 LIMIT limit_rows（已有 LIMIT 等无法安全追加时按原 SQL 执行）
+    - regenerate：交给调用方让 LLM 生成更省的 SQL
+    - reject：拒绝执行
+    """
+    if policy not in COST_GUARD_POLICIES:
+        raise ValueError(f"不支持的成本检查策略: {policy}，可选：{COST_GUARD_POLICIES}")
+
+    estimate = explain_cost(conn, sql)
+    decision = CostDecision(action="pass", sql=sql, estimate=estimate, threshold=max_rows_examined)
+    if estimate.rows_examined is None or estimate.rows_examined <= max_rows_examined:
+        return decision
+
+    decision.action = policy
+    decision.reason = f"预计扫描 {estimate.rows_examined} 行，超过上限 {max_rows_examined} 行"
+    if policy == "limit":
+        limited = add_limit(sql, limit_rows, conn.dialect.name)
+        if limited is None:
+            decision.reason += "，无法安全追加 LIMIT，按原 SQL 执行（结果行数仍受查询预算限制）"
+        else:
+            decision.sql = limited
+            decision.reason += f"，已追加 LIMIT {limit_rows}"
+    return decision
+
+
+__all__ = ["CostEstimate", "CostDecision", "COST_GUARD_POLICIES", "explain_cost", "check_cost"]
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Connection, Engine, make_url
+
+from app.config.env_utils import DATABASE_URL, DB_EXECUTOR_WORKERS, DB_MAX_OVERFLOW, DB_POOL_PRE_PING, \
+    DB_POOL_RECYCLE, DB_POOL_SIZE, DB_POOL_TIMEOUT
+
+T = TypeVar("T")
+
+
+# ──────────────────────────────────────────────
+# 进程级 SQLAlchemy Engine 注册表（按 db_url 复用连接池）
+# ──────────────────────────────────────────────
+class EngineRegistry:
+    """
+    按数据库 URL 缓存 Engine，整个进程共享同一个连接池，避免每次查询都重新建池、重新握手。
+
+    - get_engine：获取（必要时创建）对应 URL 的 Engine
+    - connect：从连接池借出连接，并记录等待时间
+    - pool_stats：连接池统计（借出数、溢出数、等待时间），用于压测时调整池大小
+    - run_in_executor：在专用线程池中执行阻塞的数据库调用，供异步工具使用，不占用事件循环
+    """
+
+    def __init__(
+        self,
+        pool_size: int = DB_POOL_SIZE,
+        max_overflow: int = DB_MAX_OVERFLOW,
+        pool_recycle: int = DB_POOL_RECYCLE,
+        pool_pre_ping: bool = DB_POOL_PRE_PING,
+        pool_timeout: int = DB_POOL_TIMEOUT,
+        executor_workers: int = DB_EXECUTOR_WORKERS,
+    ):
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_recycle = pool_recycle
+        self.pool_pre_ping = pool_pre_ping
+        self.pool_timeout = pool_timeout
+        self.executor_workers = executor_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._engines: Dict[str, Engine] = {}
+        self._metrics: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def get_engine(self, db_url: Optional[str] = None) -> Engine:
+        db_url = db_url or DATABASE_URL
+        engine = self._engines.get(db_url)
+        if engine is not None:
+            return engine
+        with self._lock:
+            engine = self._engines.get(db_url)
+            if engine is None:
+                engine = create_engine(db_url, **self._engine_kwargs(db_url))
+                self._engines[db_url] = engine
+                self._metrics[db_url] = {"checkouts": 0, "wait_total": 0.0, "wait_max": 0.0, "connect_failures": 0}
+            return engine
+
+    def _engine_kwargs(self, db_url: str) -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = {"pool_pre_ping": self.pool_pre_ping}
+        # SQLite 使用单线程 / 静态连接池，不支持 QueuePool 的大小参数
+        if make_url(db_url).get_backend_name() != "sqlite":
+            kwargs.update(
+                pool_size=self.pool_size,
+                max_overflow=self.max_overflow,
+                pool_recycle=self.pool_recycle,
+                pool_timeout=self.pool_timeout,
+            )
+        return kwargs
+
+    @contextmanager
+    def connect(self, db_url: Optional[str] = None) -> Iterator[Connection]:
+        """借出连接（用完自动归还连接池），同时记录借出等待时间"""
+        db_url = db_url or DATABASE_URL
+        engine = self.get_engine(db_url)
+        start = time.perf_counter()
+        try:
+            conn = engine.connect()
+        except Exception:
+            with self._lock:
+                self._metrics[db_url]["connect_failures"] += 1
+            raise
+        waited = time.perf_counter() - start
+        with self._lock:
+            metrics = self._metrics[db_url]
+            metrics["checkouts"] += 1
+            metrics["wait_total"] += waited
+            metrics["wait_max"] = max(metrics["wait_max"], waited)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """数据库专用线程池：与默认线程池隔离，慢查询不会拖住文件读取等其他 to_thread 任务"""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.executor_workers, thread_name_prefix="db-executor"
+                    )
+        return self._executor
+
+    async def run_in_executor(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """在数据库专用线程池中执行 fn，并保留当前的 contextvars（回调、追踪等上下文）"""
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, functools.partial(ctx.run, fn, *args, **kwargs))
+
+    def pool_stats(self, db_url: Optional[str] = None) -> Dict[str, Any]:
+        db_url = db_url or DATABASE_URL
+        engine = self._engines.get(db_url)
+        if engine is None:
+            return {}
+        pool = engine.pool
+        metrics = dict(self._metrics[db_url])
+        checkouts = metrics["checkouts"]
+        return {
+            "db_url": engine.url.render_as_string(hide_password=True),
+            "pool_class": type(pool).__name__,
+            "size": getattr(pool, "size", lambda: None)(),
+            "checked_in": getattr(pool, "checkedin", lambda: None)(),
+            "checked_out": getattr(pool, "checkedout", lambda: None)(),
+            "overflow": getattr(pool, "overflow", lambda: None)(),
+            "checkouts": checkouts,
+            "connect_failures": metrics["connect_failures"],
+            "wait_avg_ms": round(metrics["wait_total"] / checkouts * 1000, 3) if checkouts else 0.0,
+            "wait_max_ms": round(metrics["wait_max"] * 1000, 3),
+        }
+
+    def all_pool_stats(self) -> List[Dict[str, Any]]:
+        return [self.pool_stats(url) for url in list(self._engines)]
+
+    def dispose(self, db_url: Optional[str] = None) -> None:
+        """释放连接池；不传 db_url 时释放全部"""
+        with self._lock:
+            urls = [db_url] if db_url else list(self._engines)
+            for url in urls:
+                engine = self._engines.pop(url, None)
+                self._metrics.pop(url, None)
+                if engine is not None:
+                    engine.dispose()
+            if db_url is None and self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+engine_registry = EngineRegistry()
+
+
+def get_engine(db_url: Optional[str] = None) -> Engine:
+    return engine_registry.get_engine(db_url)
+
+
+__all__ = ["EngineRegistry", "engine_registry", "get_engine"]
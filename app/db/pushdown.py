@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import json
+import math
+import time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.config.env_utils import AGG_MAX_GROUP_COLUMNS, AGG_MAX_GROUPS, AGG_MAX_MEASURES, QUERY_MAX_EXECUTION_MS
+from app.db.engine_registry import engine_registry
+from app.db.streaming import statement_timeout
+from app.services.dataset_registry import normalize_columns
+
+# 各数据库的日期分桶表达式（{col} 为已加引号的列名）
+_DATE_BUCKETS = {
+    "mysql": {"day": "DATE_FORMAT({col}, '%Y-%m-%d')", "month": "DATE_FORMAT({col}, '%Y-%m')"},
+    "mariadb": {"day": "DATE_FORMAT({col}, '%Y-%m-%d')", "month": "DATE_FORMAT({col}, '%Y-%m')"},
+    "postgresql": {"day": "to_char({col}, 'YYYY-MM-DD')", "month": "to_char({col}, 'YYYY-MM')"},
+    "sqlite": {"day": "strftime('%Y-%m-%d', {col})", "month": "strftime('%Y-%m', {col})"},
+}
+# 时间跨度不超过该天数时按天分桶，否则按月
+_DAY_BUCKET_MAX_SPAN = 92
+
+
+def _plain(value: Any) -> Any:
+    """数据库返回值转为可 JSON 序列化的 Python 原生类型"""
+    if value is None:
+        return None
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, float):
+        return None if math.isnan(value) else round(value, 6)
+    if isinstance(value, (int, str, bool)):
+        return value
+    return str(value)
+
+
+def infer_column_kinds(sample: pd.DataFrame) -> List[str]:
+    """根据样本推断每列的类型：numeric / datetime / categorical"""
+    kinds = []
+    for col in sample.columns:
+        series = sample[col]
+        if pd.api.types.is_bool_dtype(series):
+            kinds.append("categorical")
+        elif pd.api.types.is_numeric_dtype(series):
+            kinds.append("numeric")
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            kinds.append("datetime")
+        else:
+            values = series.dropna()
+            parsed = pd.to_datetime(values.astype(str), errors="coerce", format="mixed") if len(values) else values
+            looks_like_date = len(values) and values.astype(str).str.contains(r"\d{4}[-/]\d{1,2}").mean() > 0.9
+            kinds.append("datetime" if looks_like_date and parsed.notna().mean() > 0.9 else "categorical")
+    return kinds
+
+
+# ──────────────────────────────────────────────
+# 聚合下推：在数据库端计算统计量，只把千字节级的汇总结果拉回 Python
+# ──────────────────────────────────────────────
+class AggregatePushdown:
+    """
+    为一条查询生成并执行配套的聚合 SQL（都以原查询为子查询）：
+
+    - 列概况：行数、非空数、最小 / 最大值，数值列的均值与标准差，类别列的去重数
+    - 分组计数：类别列按出现次数取 Top N，并附带各数值列的组内均值
+    - 时间序列：日期列按天 / 月分桶，统计行数与各数值列的合计
+    """
+
+    def __init__(self, conn: Connection, sql: str, params: Optional[Dict[str, Any]] = None):
+        self.conn = conn
+        self.base_sql = sql.strip().rstrip(";")
+        self.params = params or {}
+        self.dialect = conn.dialect.name
+        self.queries = 0
+
+    def _quote(self, name: str) -> str:
+        return self.conn.dialect.identifier_preparer.quote(name)
+
+    def _from(self) -> str:
+        return f"FROM (\n{self.base_sql}\n) AS _agg_q"
+
+    def _run(self, sql: str) -> List[Dict[str, Any]]:
+        self.queries += 1
+        with statement_timeout(self.conn, sql, QUERY_MAX_EXECUTION_MS) as sql:
+            return [dict(row) for row in self.conn.execute(text(sql), self.params).mappings()]
+
+    def raw_columns(self) -> List[str]:
+        """取原查询的输出列名（未规范化），用于拼接聚合 SQL"""
+        self.queries += 1
+        result = self.conn.execute(text(f"SELECT * {self._from()} LIMIT 0"), self.params)
+        columns = list(result.keys())
+        result.close()
+        return columns
+
+    def profile(self, columns: List[Tuple[str, str, str]]) -> Tuple[int, Dict[str, Dict[str, Any]]]:
+        selects = ["COUNT(*) AS n"]
+        for i, (raw, _, kind) in enumerate(columns):
+            col = self._quote(raw)
+            selects += [f"COUNT({col}) AS c{i}_n", f"MIN({col}) AS c{i}_min", f"MAX({col}) AS c{i}_max"]
+            if kind == "numeric":
+                selects.append(f"AVG({col}) AS c{i}_avg")
+                if self.dialect == "sqlite":
+                    selects.append(f"AVG({col} * {col}) AS c{i}_sq")
+                else:
+                    selects.append(f"STDDEV_SAMP({col}) AS c{i}_std")
+            elif kind == "categorical":
+                selects.append(f"COUNT(DISTINCT {col}) AS c{i}_distinct")
+        row = self._run(f"SELECT {', '.join(selects)} {self._from()}")[0]
+
+        total = int(row["n"] or 0)
+        stats: Dict[str, Dict[str, Any]] = {}
+        for i, (_, name, kind) in enumerate(columns):
+            non_null = int(row[f"c{i}_n"] or 0)
+            item = {
+                "kind": kind,
+                "non_null": non_null,
+                "nulls": total - non_null,
+                "min": _plain(row[f"c{i}_min"]),
+                "max": _plain(row[f"c{i}_max"]),
+            }
+            if kind == "numeric":
+                mean = _plain(row[f"c{i}_avg"])
+                item["mean"] = mean
+                if f"c{i}_std" in row:
+                    item["std"] = _plain(row[f"c{i}_std"])
+                elif mean is not None and non_null > 1:
+                    # SQLite 没有标准差函数，用 E[x²] - E[x]² 换算为样本标准差
+                    var = max(float(row[f"c{i}_sq"]) - float(mean) ** 2, 0.0) * non_null / (non_null - 1)
+                    item["std"] = round(math.sqrt(var), 6)
+            elif kind == "categorical":
+                item["distinct"] = int(row[f"c{i}_distinct"] or 0)
+            stats[name] = item
+        return total, stats
+
+    def group_counts(self, raw: str, measures: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        col = self._quote(raw)
+        selects = [f"{col} AS g_value", "COUNT(*) AS g_count"]
+        selects += [f"AVG({self._quote(m_raw)}) AS avg_{i}" for i, (m_raw, _) in enumerate(measures)]
+        rows = self._run(
+            f"SELECT {', '.join(selects)} {self._from()} GROUP BY {col} ORDER BY g_count DESC LIMIT {AGG_MAX_GROUPS}"
+        )
+        return [
+            {
+                "value": _plain(r["g_value"]),
+                "count": int(r["g_count"]),
+                **{f"avg_{name}": _plain(r[f"avg_{i}"]) for i, (_, name) in enumerate(measures)},
+            }
+            for r in rows
+        ]
+
+    def date_series(self, raw: str, granularity: str, measures: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        bucket = _DATE_BUCKETS[self.dialect][granularity].format(col=self._quote(raw))
+        selects = [f"{bucket} AS d_bucket", "COUNT(*) AS d_count"]
+        selects += [f"SUM({self._quote(m_raw)}) AS sum_{i}" for i, (m_raw, _) in enumerate(measures)]
+        rows = self._run(
+            f"SELECT {', '.join(selects)} {self._from()} WHERE {self._quote(raw)} IS NOT NULL "
+            f"GROUP BY {bucket} ORDER BY d_bucket"
+        )
+        return [
+            {
+                "bucket": _plain(r["d_bucket"]),
+                "count": int(r["d_count"]),
+                **{f"sum_{name}": _plain(r[f"sum_{i}"]) for i, (_, name) in enumerate(measures)},
+            }
+            for r in rows
+        ]
+
+
+def _granularity(stats: Dict[str, Any]) -> str:
+    try:
+        span = pd.Timestamp(stats["max"]) - pd.Timestamp(stats["min"])
+    except (TypeError, ValueError):
+        return "month"
+    return "day" if span.days <= _DAY_BUCKET_MAX_SPAN else "month"
+
+
+def compute_aggregates(
+    db_url: str,
+    sql: str,
+    params: Optional[Dict[str, Any]],
+    sample: pd.DataFrame,
+) -> Dict[str, Any]:
+    """
+    对查询的全量结果做聚合下推，返回紧凑的统计字典（列名为规范化后的列名）。
+    sample 为已拉取的样本（列名已规范化），只用来推断列类型。
+    """
+    start = time.perf_counter()
+    with engine_registry.connect(db_url) as conn:
+        pushdown = AggregatePushdown(conn, sql, params)
+        raw_columns = pushdown.raw_columns()
+        names = normalize_columns(raw_columns)
+        kinds = infer_column_kinds(sample.reindex(columns=names))
+        columns = list(zip(raw_columns, names, kinds))
+
+        total, column_stats = pushdown.profile(columns)
+        # 主键 / 外键类的 id 列求和、求均值没有意义，不作为度量
+        measures = [
+            (raw, name) for raw, name, kind in columns
+            if kind == "numeric" and name != "id" and not name.endswith("_id")
+        ][:AGG_MAX_MEASURES]
+
+        categoricals = sorted(
+            (c for c in columns if c[2] == "categorical" and column_stats[c[1]]["distinct"] > 0),
+            key=lambda c: column_stats[c[1]]["distinct"],
+        )[:AGG_MAX_GROUP_COLUMNS]
+        group_counts = {name: pushdown.group_counts(raw, measures) for raw, name, _ in categoricals}
+
+        date_series = {}
+        if pushdown.dialect in _DATE_BUCKETS:
+            for raw, name, kind in columns:
+                if kind == "datetime" and column_stats[name]["non_null"]:
+                    granularity = _granularity(column_stats[name])
+                    date_series[name] = {
+                        "granularity": granularity,
+                        "buckets": pushdown.date_series(raw, granularity, measures),
+                    }
+
+    return {
+        "row_count": total,
+        "columns": column_stats,
+        "group_counts": group_counts,
+        "date_series": date_series,
+        "queries": pushdown.queries,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+def render_aggregates(aggregates: Dict[str, Any]) -> str:
+    """把聚合结果渲染为提示词文本"""
+    body = {k: aggregates[k] for k in ("row_count", "columns", "group_counts", "date_series") if k in aggregates}
+    return json.dumps(body, ensure_ascii=False, default=str)
+
+
+__all__ = ["AggregatePushdown", "compute_aggregates", "infer_column_kinds", "render_aggregates"]
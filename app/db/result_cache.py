@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy.exc import DBAPIError
+
+from app.config.env_utils import QUERY_BUDGET_POLICY, QUERY_MAX_ROWS, RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES, \
+    RESULT_CACHE_TTL
+from app.db.engine_registry import engine_registry
+from app.db.streaming import execute_streaming
+from app.services.frame_cache import FrameDiskCache
+
+# 字符串字面量 / 反引号标识符原样保留，其余部分压缩空白
+_SQL_TOKEN_RE = re.compile(r"('(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`)|(\s+)")
+# 只有逐行查询才能按水位列增量追加；聚合、去重、分页的结果必须整体重算
+_NOT_INCREMENTAL_RE = re.compile(
+    r"\b(group\s+by|distinct|limit|offset|union|having|count|sum|avg|min|max|over)\b", re.IGNORECASE
+)
+
+
+def normalize_sql(sql: str) -> str:
+    """SQL 归一化：去掉末尾分号，字面量之外的连续空白压缩为一个空格"""
+    sql = sql.strip().rstrip(";").strip()
+    return _SQL_TOKEN_RE.sub(lambda m: m.group(1) or " ", sql)
+
+
+def supports_watermark(sql: str) -> bool:
+    return not _NOT_INCREMENTAL_RE.search(sql)
+
+
+def _to_param(value: Any) -> Any:
+    """numpy / pandas 标量转为驱动可以绑定的 Python 原生类型"""
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def _watermark_source(watermark_column: str, columns: List[str], normalize: Callable[[Any], List[str]]) -> Optional[str]:
+    """
+    水位列名来自 LLM 的工具参数，不能直接拼进 SQL：只接受查询结果中确实存在的列，
+    返回数据库返回的原始列名（规范化后才匹配时取对应的原始列名），找不到或有歧义时返回 None
+    """
+    if watermark_column in columns:
+        return watermark_column
+    target = normalize([watermark_column])[0]
+    matches = [c for c, n in zip(columns, normalize(columns)) if n == target]
+    return matches[0] if len(matches) == 1 else None
+
+
+def _hit_budget(frame: pd.DataFrame, max_rows: int, policy: str) -> Dict[str, Any]:
+    return {
+        "policy": policy,
+        "max_rows": max_rows,
+        "rows_scanned": 0,
+        "rows_returned": int(len(frame)),
+        "bytes": int(frame.memory_usage(index=False, deep=True).sum()),
+        "truncated": False,
+    }
+
+
+# ──────────────────────────────────────────────
+# SQL 查询结果缓存：key = (db_url, 归一化 SQL, 绑定参数)
+# ──────────────────────────────────────────────
+class QueryResultCache:
+    """
+    把查询结果以列式文件缓存到本地磁盘（复用 FrameDiskCache，按磁盘预算 LRU 淘汰）。
+
+    - TTL 内直接返回缓存结果，不访问数据库
+    - 过期后如果指定了水位列（单调递增的自增 id、写入时间等），只拉取水位之后的新行追加到缓存，
+      适合只追加写入的明细表；水位列会被更新的表（如 updated_at）会出现同一行的新旧两个版本
+    - 被预算截断或抽样的结果不缓存
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = RESULT_CACHE_DIR,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+        ttl: float = RESULT_CACHE_TTL,
+    ):
+        self.store = FrameDiskCache(cache_dir, max_bytes)
+        self.ttl = ttl
+        self.incremental_refreshes = 0
+
+    def _put(self, key: str, frame: pd.DataFrame, extra: Dict[str, Any]) -> None:
+        """写磁盘缓存只是优化：磁盘已满、无权限、缓存文件仍被映射占用等写入失败时，不影响已经成功的查询"""
+        try:
+            self.store.put(key, frame, extra)
+        except OSError as e:
+            print(f"写入查询结果缓存失败，已跳过：{e}")
+
+    @staticmethod
+    def make_key(db_url: str, sql: str, params: Optional[Dict[str, Any]] = None) -> str:
+        db_hash = hashlib.sha1(db_url.encode("utf-8")).hexdigest()
+        params_json = json.dumps(params or {}, ensure_ascii=False, sort_keys=True, default=str)
+        return FrameDiskCache.make_key("query_result", db_hash, normalize_sql(sql), params_json)
+
+    def fetch(
+        self,
+        db_url: str,
+        sql: str,
+        params: Optional[Dict[str, Any]] = None,
+        *,
+        max_rows: int = QUERY_MAX_ROWS,
+        policy: str = QUERY_BUDGET_POLICY,
+        watermark_column: Optional[str] = None,
+        normalize: Optional[Callable[[Any], List[str]]] = None,
+    ) -> Tuple[pd.DataFrame, Dict[str, Any], Dict[str, Any]]:
+        """
+        读取查询结果，返回 (DataFrame, 预算统计, 缓存信息)。
+
+        normalize 为列名规范化函数，缓存中保存的是规范化后的列；
+        watermark_column 为 SQL 输出中的水位列名，只对逐行查询生效。
+        """
+        key = self.make_key(db_url, sql, params)
+        normalize = normalize or (lambda cols: [str(c) for c in cols])
+        if watermark_column and not supports_watermark(sql):
+            watermark_column = None
+
+        meta = self.store.get_meta(key)
+        if meta is not None and meta.get("row_count", 0) <= max_rows:
+            age = time.time() - meta["created_at"]
+            extra = meta.get("extra", {})
+            if age < self.ttl:
+                cached = self.store.get(key)
+                if cached is not None:
+                    frame = cached[0]
+                    info = {"hit": True, "mode": "fresh", "age_seconds": round(age, 1)}
+                    return frame, _hit_budget(frame, max_rows, policy), info
+            elif watermark_column and extra.get("watermark_column") == watermark_column and extra.get("watermark_source"):
+                refreshed = self._refresh_incremental(key, db_url, sql, params, max_rows, policy, extra, normalize)
+                if refreshed is not None:
+                    return refreshed
+
+        with engine_registry.connect(db_url) as conn:
+            frame, budget = execute_streaming(conn, sql, params, max_rows=max_rows, policy=policy)
+        raw_columns = [str(c) for c in frame.columns]
+        frame.columns = normalize(frame.columns)
+        if not budget["truncated"]:
+            extra = {}
+            source = _watermark_source(watermark_column, raw_columns, normalize) if watermark_column else None
+            if source is not None:
+                extra = {"watermark_column": watermark_column, "watermark_source": source}
+            self._put(key, frame, extra)
+        return frame, budget, {"hit": False, "mode": "miss"}
+
+    def _refresh_incremental(
+        self,
+        key: str,
+        db_url: str,
+        sql: str,
+        params: Optional[Dict[str, Any]],
+        max_rows: int,
+        policy: str,
+        extra: Dict[str, Any],
+        normalize: Callable[[Any], List[str]],
+    ) -> Optional[Tuple[pd.DataFrame, Dict[str, Any], Dict[str, Any]]]:
+        # watermark_source 为首次查询时已核对过、确实存在于结果中的原始列名
+        watermark_source = extra["watermark_source"]
+        cached = self.store.get(key)
+        if cached is None:
+            return None
+        frame = cached[0]
+        column = normalize([watermark_source])[0]
+        if column not in frame.columns or frame.empty:
+            return None
+        watermark = frame[column].max()
+        if pd.isna(watermark):
+            return None
+
+        # 用 >= 拉取水位及之后的行，再去掉缓存中等于水位的行，避免漏掉与水位同一时刻写入的数据
+        delta_params = {**(params or {}), "_watermark": _to_param(watermark)}
+        try:
+            with engine_registry.connect(db_url) as conn:
+                quoted = conn.dialect.identifier_preparer.quote(watermark_source)
+                delta_sql = (
+                    f"SELECT * FROM (\n{sql.strip().rstrip(';')}\n) AS _watermark_q "
+                    f"WHERE _watermark_q.{quoted} >= :_watermark"
+                )
+                delta, budget = execute_streaming(conn, delta_sql, delta_params, max_rows=max_rows, policy=policy)
+        except DBAPIError as exc:
+            # 子查询包装在个别查询上不可用（如 JOIN 结果有同名列），放弃增量，整体重新查询
+            print(f"⚠️ 增量刷新失败，改为整体重新查询：{exc.orig}")
+            return None
+        delta.columns = normalize(delta.columns)
+
+        kept = frame[frame[column] < watermark]
+        merged = pd.concat([kept, delta], ignore_index=True)
+        if budget["truncated"] or len(merged) > max_rows:
+            # 增量部分超出预算，放弃增量，整体重新查询
+            self.store.invalidate(key)
+            return None
+        self._put(key, merged, extra)
+        self.incremental_refreshes += 1
+        budget["rows_returned"] = int(len(merged))
+        info = {
+            "hit": True,
+            "mode": "incremental",
+            "watermark_column": column,
+            "watermark": str(watermark),
+            "rows_appended": int(len(delta) - (len(frame) - len(kept))),
+        }
+        return merged, budget, info
+
+    def invalidate(self, db_url: str, sql: str, params: Optional[Dict[str, Any]] = None) -> None:
+        self.store.invalidate(self.make_key(db_url, sql, params))
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.store.stats(), "incremental_refreshes": self.incremental_refreshes}
+
+
+query_result_cache = QueryResultCache()
+
+__all__ = ["QueryResultCache", "query_result_cache", "normalize_sql", "supports_watermark"]
@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import inspect, text
+
+from app.config.env_utils import DATABASE_URL, SCHEMA_CACHE_TTL
+from app.db.engine_registry import engine_registry
+
+
+# ──────────────────────────────────────────────
+# 1. 表结构数据模型
+# ──────────────────────────────────────────────
+@dataclass
+class ColumnInfo:
+    name: str
+    type: str
+    nullable: bool = True
+    default: Optional[str] = None
+    primary_key: bool = False
+    comment: str = ""
+
+
+@dataclass
+class ForeignKeyInfo:
+    constrained_columns: List[str]
+    referred_table: str
+    referred_columns: List[str]
+
+
+@dataclass
+class TableInfo:
+    name: str
+    comment: str = ""
+    columns: List[ColumnInfo] = field(default_factory=list)
+    primary_key: List[str] = field(default_factory=list)
+    foreign_keys: List[ForeignKeyInfo] = field(default_factory=list)
+
+
+@dataclass
+class SchemaSnapshot:
+    """某个数据库在某一时刻的完整表结构"""
+    tables: Dict[str, TableInfo]
+    fingerprint: str
+    loaded_at: float
+    text: str = ""
+
+
+# ──────────────────────────────────────────────
+# 2. MySQL：information_schema 批量读取（一次往返取回全部表、字段、主外键）
+# ──────────────────────────────────────────────
+MYSQL_SCHEMA_SQL = """
+SELECT 'T' AS kind, t.TABLE_NAME AS table_name, NULL AS column_name, t.TABLE_COMMENT AS a,
+       NULL AS b, NULL AS c, NULL AS d, NULL AS e, 0 AS pos
+FROM information_schema.TABLES t
+WHERE t.TABLE_SCHEMA = DATABASE() AND t.TABLE_TYPE = 'BASE TABLE'
+UNION ALL
+SELECT 'C', c.TABLE_NAME, c.COLUMN_NAME, c.COLUMN_TYPE, c.IS_NULLABLE, c.COLUMN_DEFAULT, c.COLUMN_KEY,
+       c.COLUMN_COMMENT, c.ORDINAL_POSITION
+FROM information_schema.COLUMNS c
+WHERE c.TABLE_SCHEMA = DATABASE()
+UNION ALL
+SELECT 'K', k.TABLE_NAME, k.COLUMN_NAME, k.CONSTRAINT_NAME, k.REFERENCED_TABLE_NAME, k.REFERENCED_COLUMN_NAME,
+       NULL, NULL, k.ORDINAL_POSITION
+FROM information_schema.KEY_COLUMN_USAGE k
+WHERE k.TABLE_SCHEMA = DATABASE() AND (k.CONSTRAINT_NAME = 'PRIMARY' OR k.REFERENCED_TABLE_NAME IS NOT NULL)
+"""
+
+# 廉价的结构指纹：字段定义与约束的校验和，结构不变时无需重新加载
+MYSQL_FINGERPRINT_SQL = """
+SELECT
+  (SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()) AS column_count,
+  (SELECT COALESCE(SUM(CRC32(CONCAT_WS('|', TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY,
+                                       COLUMN_COMMENT))), 0)
+     FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()) AS column_checksum,
+  (SELECT COALESCE(SUM(CRC32(CONCAT_WS('|', TABLE_NAME, CONSTRAINT_NAME, COLUMN_NAME,
+                                       COALESCE(REFERENCED_TABLE_NAME, '')))), 0)
+     FROM information_schema.KEY_COLUMN_USAGE WHERE TABLE_SCHEMA = DATABASE()) AS key_checksum,
+  (SELECT COALESCE(SUM(CRC32(CONCAT_WS('|', TABLE_NAME, TABLE_COMMENT))), 0)
+     FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()) AS table_checksum
+"""
+
+
+def _load_mysql(conn) -> Dict[str, TableInfo]:
+    rows = conn.execute(text(MYSQL_SCHEMA_SQL)).all()
+    tables: Dict[str, TableInfo] = {}
+    for row in rows:
+        if row.kind == "T":
+            tables[row.table_name] = TableInfo(name=row.table_name, comment=row.a or "")
+
+    columns: Dict[str, List[Tuple[int, ColumnInfo]]] = {}
+    keys: Dict[Tuple[str, str], List[Tuple[int, str, Optional[str], Optional[str]]]] = {}
+    for row in rows:
+        if row.table_name not in tables:
+            continue
+        if row.kind == "C":
+            columns.setdefault(row.table_name, []).append((int(row.pos), ColumnInfo(
+                name=row.column_name,
+                type=row.a,
+                nullable=row.b == "YES",
+                default=row.c,
+                primary_key=row.d == "PRI",
+                comment=row.e or "",
+            )))
+        elif row.kind == "K":
+            keys.setdefault((row.table_name, row.a), []).append((int(row.pos), row.column_name, row.b, row.c))
+
+    for table_name, cols in columns.items():
+        tables[table_name].columns = [col for _, col in sorted(cols, key=lambda x: x[0])]
+    for (table_name, constraint_name), parts in keys.items():
+        parts.sort(key=lambda x: x[0])
+        if constraint_name == "PRIMARY":
+            tables[table_name].primary_key = [p[1] for p in parts]
+        else:
+            tables[table_name].foreign_keys.append(ForeignKeyInfo(
+                constrained_columns=[p[1] for p in parts],
+                referred_table=parts[0][2],
+                referred_columns=[p[3] for p in parts],
+            ))
+    return tables
+
+
+def _mysql_fingerprint(conn) -> str:
+    row = conn.execute(text(MYSQL_FINGERPRINT_SQL)).one()
+    return hashlib.sha1("|".join(str(v) for v in row).encode("utf-8")).hexdigest()
+
+
+# ──────────────────────────────────────────────
+# 3. 其他数据库：SQLAlchemy 2.0 的批量反射接口（get_multi_*）
+# ──────────────────────────────────────────────
+def _load_generic(conn) -> Dict[str, TableInfo]:
+    inspector = inspect(conn)
+    table_names = inspector.get_table_names()
+    multi_columns = inspector.get_multi_columns()
+    multi_pks = inspector.get_multi_pk_constraint()
+    multi_fks = inspector.get_multi_foreign_keys()
+    multi_comments = inspector.get_multi_table_comment() if conn.dialect.supports_comments else {}
+
+    tables: Dict[str, TableInfo] = {}
+    for (schema, table_name), cols in multi_columns.items():
+        if table_name not in table_names:
+            continue
+        pk = (multi_pks.get((schema, table_name)) or {}).get("constrained_columns") or []
+        tables[table_name] = TableInfo(
+            name=table_name,
+            comment=((multi_comments.get((schema, table_name)) or {}).get("text") or ""),
+            columns=[
+                ColumnInfo(
+                    name=col["name"],
+                    type=str(col["type"]),
+                    nullable=bool(col["nullable"]),
+                    default=col.get("default"),
+                    primary_key=col["name"] in pk,
+                    comment=col.get("comment") or "",
+                )
+                for col in cols
+            ],
+            primary_key=list(pk),
+            foreign_keys=[
+                ForeignKeyInfo(
+                    constrained_columns=list(fk["constrained_columns"]),
+                    referred_table=fk["referred_table"],
+                    referred_columns=list(fk["referred_columns"]),
+                )
+                for fk in multi_fks.get((schema, table_name), [])
+            ],
+        )
+    return dict(sorted(tables.items()))
+
+
+# ──────────────────────────────────────────────
+# 4. 渲染为提示词文本（与原 get_database_schema 的格式一致）
+# ──────────────────────────────────────────────
+SCHEMA_HEADER = "当前数据库表结构如下（请严格根据以下信息生成SQL，不要臆想不存在的表或字段）：\n\n"
+
+
+def render_table(table: TableInfo) -> str:
+    table_str = f"表名: {table.name}\n"
+    if table.comment:
+        table_str += f"表说明: {table.comment}\n"
+    table_str += "字段信息:\n"
+    for col in table.columns:
+        nullable = "可为空" if col.nullable else "不可为空"
+        default = f"默认值: {col.default}" if col.default else ""
+        pk = "【主键】" if col.primary_key else ""
+        comment = f"# {col.comment}" if col.comment else ""
+        table_str += f"  - {col.name:20} {col.type:15} {nullable} {default} {pk} {comment}".rstrip() + "\n"
+
+    # 主键（复合主键也会显示）
+    if table.primary_key:
+        table_str += f"主键: {', '.join(table.primary_key)}\n"
+
+    # 外键（比较重要，强烈建议包含）
+    if table.foreign_keys:
+        table_str += "外键:\n"
+        for fk in table.foreign_keys:
+            table_str += f"  - {fk.constrained_columns} → {fk.referred_table}.{fk.referred_columns}\n"
+    return table_str
+
+
+def render_schema(tables: List[TableInfo]) -> str:
+    schema_str = SCHEMA_HEADER
+    for table in tables:
+        schema_str += render_table(table) + "\n"
+    if not tables:
+        schema_str += "(该数据库中没有任何表)\n"
+    return schema_str.strip()
+
+
+# ──────────────────────────────────────────────
+# 5. 进程级表结构目录（TTL 缓存 + 指纹校验 + 显式失效）
+# ──────────────────────────────────────────────
+class SchemaCatalog:
+    """
+    按 db_url 缓存表结构，所有请求共享。
+
+    - TTL 内直接返回缓存
+    - TTL 过期后先查询廉价的结构指纹，指纹未变只续期，变化了才重新加载
+    - invalidate：显式失效（例如执行 DDL 之后）
+    """
+
+    def __init__(self, ttl: float = SCHEMA_CACHE_TTL):
+        self.ttl = ttl
+        self._snapshots: Dict[str, SchemaSnapshot] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def _lock_for(self, db_url: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(db_url, threading.Lock())
+
+    def get_snapshot(self, db_url: Optional[str] = None, force_refresh: bool = False) -> SchemaSnapshot:
+        db_url = db_url or DATABASE_URL
+        snapshot = self._snapshots.get(db_url)
+        if snapshot and not force_refresh and time.time() - snapshot.loaded_at < self.ttl:
+            return snapshot
+
+        with self._lock_for(db_url):
+            snapshot = self._snapshots.get(db_url)
+            if snapshot and not force_refresh and time.time() - snapshot.loaded_at < self.ttl:
+                return snapshot
+            with engine_registry.connect(db_url) as conn:
+                is_mysql = conn.dialect.name in ("mysql", "mariadb")
+                if is_mysql and snapshot and not force_refresh:
+                    if _mysql_fingerprint(conn) == snapshot.fingerprint:
+                        snapshot.loaded_at = time.time()
+                        return snapshot
+                if is_mysql:
+                    fingerprint = _mysql_fingerprint(conn)
+                    tables = _load_mysql(conn)
+                else:
+                    tables = _load_generic(conn)
+                    fingerprint = ""
+            schema_text = render_schema(list(tables.values()))
+            snapshot = SchemaSnapshot(
+                tables=tables,
+                fingerprint=fingerprint or hashlib.sha1(schema_text.encode("utf-8")).hexdigest(),
+                loaded_at=time.time(),
+                text=schema_text,
+            )
+            self._snapshots[db_url] = snapshot
+            return snapshot
+
+    def get_schema_text(self, db_url: Optional[str] = None) -> str:
+        return self.get_snapshot(db_url).text
+
+    def get_fingerprint(self, db_url: Optional[str] = None) -> str:
+        return self.get_snapshot(db_url).fingerprint
+
+    def invalidate(self, db_url: Optional[str] = None) -> None:
+        """显式失效；不传 db_url 时清空全部缓存"""
+        if db_url is None:
+            self._snapshots.clear()
+        else:
+            self._snapshots.pop(db_url, None)
+
+
+schema_catalog = SchemaCatalog()
+
+__all__ = [
+    "ColumnInfo",
+    "ForeignKeyInfo",
+    "TableInfo",
+    "SchemaSnapshot",
+    "SchemaCatalog",
+    "schema_catalog",
+    "render_schema",
+    "render_table",
+]
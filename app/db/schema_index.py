@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from app.config.env_utils import SCHEMA_PRUNE_TOP_K
+from app.db.schema_catalog import SchemaSnapshot, TableInfo, render_schema, schema_catalog
+from app.services.token_counter import count_tokens
+
+_WORD_RE = re.compile(r"[a-z0-9]+|[一-鿿]+")
+_CAMEL_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    面向表名 / 字段名 / 中文描述的本地分词：
+    - 英文标识符按下划线、驼峰拆分，同时保留完整标识符
+    - 中文没有空格，使用单字 + 相邻二元组
+    """
+    if not text:
+        return []
+    tokens: List[str] = []
+    for raw in re.split(r"\s+", _CAMEL_RE.sub(" ", text)):
+        for word in _WORD_RE.findall(raw.lower()):
+            if "一" <= word[0] <= "鿿":
+                tokens.extend(word)
+                tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+            else:
+                tokens.append(word)
+    # 完整的下划线标识符（如 fact_order_summary）也作为一个词
+    tokens.extend(w for w in re.findall(r"[a-z0-9]+(?:_[a-z0-9]+)+", text.lower()))
+    return tokens
+
+
+def _table_document(table: TableInfo) -> List[str]:
+    # 表名权重最高，重复三次；字段名与注释各一次
+    doc = tokenize(table.name) * 3 + tokenize(table.comment)
+    for col in table.columns:
+        doc += tokenize(col.name) + tokenize(col.comment)
+    return doc
+
+
+# ──────────────────────────────────────────────
+# BM25 表级检索索引（纯本地，无需网络）
+# ──────────────────────────────────────────────
+class SchemaIndex:
+    """对一个 SchemaSnapshot 中的所有表建立 BM25 索引"""
+
+    def __init__(self, snapshot: SchemaSnapshot, k1: float = 1.5, b: float = 0.75):
+        self.snapshot = snapshot
+        self.k1 = k1
+        self.b = b
+        self.table_names = list(snapshot.tables)
+        self._tfs: List[Counter] = []
+        self._lengths: List[int] = []
+        df: Counter = Counter()
+        for name in self.table_names:
+            doc = _table_document(snapshot.tables[name])
+            tf = Counter(doc)
+            self._tfs.append(tf)
+            self._lengths.append(len(doc))
+            df.update(tf.keys())
+        n = max(len(self.table_names), 1)
+        self._avg_len = (sum(self._lengths) / n) or 1.0
+        self._idf = {term: math.log(1 + (n - freq + 0.5) / (freq + 0.5)) for term, freq in df.items()}
+
+    def score(self, question: str) -> List[Tuple[str, float]]:
+        terms = set(tokenize(question))
+        lowered = question.lower()
+        scores = []
+        for name, tf, length in zip(self.table_names, self._tfs, self._lengths):
+            s = 0.0
+            for term in terms:
+                freq = tf.get(term)
+                if not freq:
+                    continue
+                s += self._idf[term] * freq * (self.k1 + 1) / (
+                    freq + self.k1 * (1 - self.b + self.b * length / self._avg_len)
+                )
+            # 问题中直接写出了表名，给予额外加权
+            if name.lower() in lowered:
+                s += 100.0
+            scores.append((name, s))
+        return sorted(scores, key=lambda x: x[1], reverse=True)
+
+    def neighbours(self, table_names: List[str]) -> List[str]:
+        """外键邻接表：被选中表引用的表，以及引用了选中表的表"""
+        selected = set(table_names)
+        extra: List[str] = []
+        for name, table in self.snapshot.tables.items():
+            for fk in table.foreign_keys:
+                if name in selected and fk.referred_table not in selected:
+                    extra.append(fk.referred_table)
+                elif fk.referred_table in selected and name not in selected:
+                    extra.append(name)
+        return [n for n in dict.fromkeys(extra) if n in self.snapshot.tables]
+
+    def select(self, question: str, top_k: int = SCHEMA_PRUNE_TOP_K) -> List[str]:
+        ranked = [(name, s) for name, s in self.score(question) if s > 0]
+        if not ranked:
+            # 没有任何词命中，无法判断相关表，保留全部表结构
+            return list(self.table_names)
+        chosen = [name for name, _ in ranked[:top_k]]
+        return chosen + self.neighbours(chosen)
+
+
+_index_cache: Dict[str, SchemaIndex] = {}
+_index_lock = threading.Lock()
+
+
+def get_schema_index(snapshot: SchemaSnapshot) -> SchemaIndex:
+    """按结构指纹缓存索引，表结构不变时无需重建"""
+    index = _index_cache.get(snapshot.fingerprint)
+    if index is None:
+        with _index_lock:
+            index = SchemaIndex(snapshot)
+            _index_cache.clear()
+            _index_cache[snapshot.fingerprint] = index
+    return index
+
+
+def build_pruned_schema(
+    question: str,
+    db_url: Optional[str] = None,
+    top_k: int = SCHEMA_PRUNE_TOP_K,
+) -> Tuple[str, Dict[str, object]]:
+    """
+    只保留与问题相关的表（BM25 Top-K + 外键邻接表），渲染为提示词文本。
+
+    返回 (schema_text, stats)，stats 中包含选中的表与节省的 token 数。
+    """
+    snapshot = schema_catalog.get_snapshot(db_url)
+    index = get_schema_index(snapshot)
+    selected = index.select(question, top_k=top_k)
+    schema_text = render_schema([snapshot.tables[name] for name in selected])
+
+    full_tokens = count_tokens(snapshot.text)
+    pruned_tokens = count_tokens(schema_text)
+    stats = {
+        "total_tables": len(snapshot.tables),
+        "selected_tables": selected,
+        "full_schema_tokens": full_tokens,
+        "pruned_schema_tokens": pruned_tokens,
+        "tokens_saved": full_tokens - pruned_tokens,
+    }
+    print(f"表结构裁剪：{len(selected)}/{len(snapshot.tables)} 张表，节省 {stats['tokens_saved']} tokens")
+    return schema_text, stats
+
+
+__all__ = ["SchemaIndex", "tokenize", "get_schema_index", "build_pruned_schema"]
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.config.env_utils import SQL_CACHE_DB_PATH, SQL_CACHE_MAX_ENTRIES, SQL_CACHE_SIMILARITY, SQL_CACHE_TTL
+from app.db.schema_index import tokenize
+
+_WORD_SPLIT_RE = re.compile(r"\w+", re.UNICODE)
+# 非 ASCII 字符（中文）两侧的空格没有意义，只保留英文单词之间的分隔
+_CJK_SPACE_RE = re.compile(r" (?=[^\x00-\x7f])|(?<=[^\x00-\x7f]) ")
+# 数字与时间粒度决定了 SQL 的过滤条件，近似匹配时必须完全一致
+_GUARD_RE = re.compile(r"\d+|[零一二两三四五六七八九十百千万]+|[年月周日天时分秒季]|top|limit|asc|desc", re.IGNORECASE)
+# 英文单词（含下划线标识符）可能是表名 / 字段名，近似匹配时同样必须完全一致；虚词除外，允许英文问法的措辞差异
+_IDENTIFIER_RE = re.compile(r"[a-z0-9]+(?:_[a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an the of for in on at by to from with and or is are was were be been me my our us i we you "
+    "please show list give get find tell what which who how much many all each per any some".split()
+)
+
+
+def normalize_question(question: str) -> str:
+    """问题归一化：全半角统一、小写、去掉标点；英文单词之间保留一个空格，下划线标识符保持完整"""
+    text = unicodedata.normalize("NFKC", question).lower()
+    return _CJK_SPACE_RE.sub("", " ".join(_WORD_SPLIT_RE.findall(text)))
+
+
+def _guard_tokens(normalized: str) -> Set[str]:
+    """近似匹配时必须完全一致的词项：数字、时间粒度、排序 / 条数，以及所有可能是表名 / 字段名的英文单词"""
+    identifiers = {w for w in _IDENTIFIER_RE.findall(normalized) if w not in _STOPWORDS and not w.isdigit()}
+    return set(_GUARD_RE.findall(normalized)) | identifiers
+
+
+def _vector(normalized: str) -> Tuple[Counter, float]:
+    tf = Counter(tokenize(normalized))
+    return tf, math.sqrt(sum(v * v for v in tf.values())) or 1.0
+
+
+@dataclass
+class CachedSQL:
+    question: str
+    normalized: str
+    sql: str
+    created_at: float
+
+
+@dataclass
+class SQLCacheHit:
+    sql: str
+    match: str  # "exact" 或 "similar"
+    similarity: float
+    cached_question: str
+
+
+# ──────────────────────────────────────────────
+# NL→SQL 缓存：key = (db_url, 表结构指纹, 归一化问题)
+# ──────────────────────────────────────────────
+class SQLCache:
+    """
+    记忆化的 NL→SQL 生成结果。
+
+    - 精确匹配：归一化问题 + 表结构指纹，LRU + TTL 淘汰
+    - 近似匹配：本地词项倒排索引 + 余弦相似度，要求数字 / 时间粒度与表名 / 字段名等标识符完全一致，
+      复用已验证（执行成功）的 SQL，不再调用 LLM；标识符不一致时只接受精确匹配
+    - 可选 SQLite 持久化，进程重启后仍可命中
+    - 表结构指纹变化后，旧 SQL 自动失效
+    """
+
+    def __init__(
+        self,
+        max_entries: int = SQL_CACHE_MAX_ENTRIES,
+        ttl: float = SQL_CACHE_TTL,
+        similarity: float = SQL_CACHE_SIMILARITY,
+        db_path: str = SQL_CACHE_DB_PATH,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.db_path = db_path
+        self._entries: "OrderedDict[Tuple[str, str, str], CachedSQL]" = OrderedDict()
+        # (db_url_hash, fingerprint) -> term -> 归一化问题集合
+        self._inverted: Dict[Tuple[str, str], Dict[str, Set[str]]] = {}
+        self._loaded_scopes: Set[Tuple[str, str]] = set()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        if self.db_path:
+            self._init_db()
+
+    # ---------- SQLite 持久化 ----------
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self) -> None:
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS nl_sql_cache (
+                       db_url_hash TEXT NOT NULL,
+                       fingerprint TEXT NOT NULL,
+                       normalized TEXT NOT NULL,
+                       question TEXT NOT NULL,
+                       sql TEXT NOT NULL,
+                       created_at REAL NOT NULL,
+                       PRIMARY KEY (db_url_hash, fingerprint, normalized))"""
+            )
+
+    def _load_scope(self, scope: Tuple[str, str]) -> None:
+        """首次访问某个 (数据库, 指纹) 时，从 SQLite 预热内存缓存与相似度索引"""
+        if not self.db_path or scope in self._loaded_scopes:
+            return
+        self._loaded_scopes.add(scope)
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT normalized, question, sql, created_at FROM nl_sql_cache "
+                "WHERE db_url_hash = ? AND fingerprint = ? AND created_at > ? ORDER BY created_at DESC LIMIT ?",
+                (scope[0], scope[1], time.time() - self.ttl, self.max_entries),
+            ).fetchall()
+        for normalized, question, sql, created_at in reversed(rows):
+            self._remember(scope, CachedSQL(question, normalized, sql, created_at))
+
+    # ---------- 内存索引 ----------
+    def _remember(self, scope: Tuple[str, str], entry: CachedSQL) -> None:
+        key = (*scope, entry.normalized)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        inverted = self._inverted.setdefault(scope, {})
+        for term in set(tokenize(entry.normalized)):
+            inverted.setdefault(term, set()).add(entry.normalized)
+        while len(self._entries) > self.max_entries:
+            old_key, _ = self._entries.popitem(last=False)
+            self._forget(old_key)
+
+    def _forget(self, key: Tuple[str, str, str]) -> None:
+        self._entries.pop(key, None)
+        inverted = self._inverted.get(key[:2], {})
+        for term in set(tokenize(key[2])):
+            bucket = inverted.get(term)
+            if bucket is not None:
+                bucket.discard(key[2])
+                if not bucket:
+                    inverted.pop(term, None)
+
+    def _alive(self, key: Tuple[str, str, str]) -> Optional[CachedSQL]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry.created_at > self.ttl:
+            self._forget(key)
+            return None
+        return entry
+
+    @staticmethod
+    def _scope(db_url: str, fingerprint: str) -> Tuple[str, str]:
+        return hashlib.sha1(db_url.encode("utf-8")).hexdigest(), fingerprint
+
+    # ---------- 对外接口 ----------
+    def get(self, question: str, db_url: str, fingerprint: str) -> Optional[SQLCacheHit]:
+        normalized = normalize_question(question)
+        scope = self._scope(db_url, fingerprint)
+        with self._lock:
+            self._load_scope(scope)
+            entry = self._alive((*scope, normalized))
+            if entry is not None:
+                self._entries.move_to_end((*scope, normalized))
+                self.hits += 1
+                return SQLCacheHit(entry.sql, "exact", 1.0, entry.question)
+
+            best = self._most_similar(scope, normalized)
+            if best is not None:
+                entry, similarity = best
+                self.similar_hits += 1
+                return SQLCacheHit(entry.sql, "similar", round(similarity, 4), entry.question)
+            self.misses += 1
+            return None
+
+    def _most_similar(self, scope: Tuple[str, str], normalized: str) -> Optional[Tuple[CachedSQL, float]]:
+        inverted = self._inverted.get(scope)
+        if not inverted:
+            return None
+        tf, norm = _vector(normalized)
+        candidates: Set[str] = set()
+        for term in tf:
+            candidates |= inverted.get(term, set())
+        guard = _guard_tokens(normalized)
+        best: Optional[Tuple[CachedSQL, float]] = None
+        for cand in candidates:
+            entry = self._alive((*scope, cand))
+            if entry is None or _guard_tokens(cand) != guard:
+                continue
+            cand_tf, cand_norm = _vector(cand)
+            similarity = sum(v * cand_tf.get(t, 0) for t, v in tf.items()) / (norm * cand_norm)
+            if similarity >= self.similarity and (best is None or similarity > best[1]):
+                best = (entry, similarity)
+        return best
+
+    def put(self, question: str, db_url: str, fingerprint: str, sql: str) -> None:
+        """只应在 SQL 执行成功（已验证）后调用"""
+        normalized = normalize_question(question)
+        scope = self._scope(db_url, fingerprint)
+        entry = CachedSQL(question, normalized, sql, time.time())
+        with self._lock:
+            self._remember(scope, entry)
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO nl_sql_cache VALUES (?, ?, ?, ?, ?, ?)",
+                    (scope[0], scope[1], normalized, question, sql, entry.created_at),
+                )
+
+    def invalidate(self, question: str, db_url: str, fingerprint: str) -> None:
+        """缓存的 SQL 执行失败时调用，避免反复命中错误结果"""
+        scope = self._scope(db_url, fingerprint)
+        normalized = normalize_question(question)
+        with self._lock:
+            self._forget((*scope, normalized))
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute(
+                    "DELETE FROM nl_sql_cache WHERE db_url_hash = ? AND fingerprint = ? AND normalized = ?",
+                    (*scope, normalized),
+                )
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+        }
+
+
+sql_cache = SQLCache()
+
+__all__ = ["SQLCache", "SQLCacheHit", "sql_cache", "normalize_question"]
@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import re
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+
+from app.config.env_utils import QUERY_BUDGET_POLICY, QUERY_MAX_BYTES, QUERY_MAX_EXECUTION_MS, QUERY_MAX_ROWS, \
+    QUERY_STREAM_BATCH_ROWS
+from app.services.dataset_registry import ColumnarDatasetBuilder
+
+BUDGET_POLICIES = ("truncate", "sample", "fail")
+
+_SELECT_RE = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+_LEADING_SELECT_RE = re.compile(r"^\s*select\b", re.IGNORECASE)
+# 字符串 / 反引号标识符 / 注释 / 括号 / 单词，用于找出最外层的关键字
+_SQL_TOKEN_RE = re.compile(
+    r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|--[^\n]*|/\*.*?\*/|[()]|[A-Za-z_]+",
+    re.S,
+)
+# 最外层出现这些关键字时不再追加 LIMIT（已有行数限制，或追加后语义会变）
+_LIMIT_BLOCKERS = {"limit", "fetch", "offset", "for", "into", "procedure"}
+# 支持在语句末尾写 LIMIT n 的数据库
+_LIMIT_DIALECTS = ("mysql", "mariadb", "postgresql", "sqlite")
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """查询结果超过行数 / 字节预算，且策略为 fail"""
+
+
+def add_limit(sql: str, limit: int, dialect: str) -> Optional[str]:
+    """
+    给最外层没有 LIMIT 的 SELECT 在末尾追加 LIMIT，让数据库端就停止产出多余的行；
+    不能安全追加时返回 None，由调用方按原 SQL 执行（行数预算仍由流式拉取保证）。
+
+    不包装为子查询：SELECT * FROM (...) 在 JOIN 结果有同名列时会报 Duplicate column name。
+    """
+    if dialect not in _LIMIT_DIALECTS or not is_select(sql):
+        return None
+    body = sql.strip().rstrip(";").rstrip()
+    depth = 0
+    for token in _SQL_TOKEN_RE.findall(body):
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0 and token.lower() in _LIMIT_BLOCKERS:
+            return None
+    if depth != 0 or ";" in body:
+        return None
+    # 换行后再追加，避免被末尾的单行注释吞掉
+    return f"{body}\nLIMIT {int(limit)}"
+
+
+def is_select(sql: str) -> bool:
+    return bool(_SELECT_RE.match(sql))
+
+
+@contextmanager
+def statement_timeout(conn: Connection, sql: str, timeout_ms: int) -> Iterator[str]:
+    """
+    为单条语句设置最长执行时间，产出实际要执行的 SQL。
+
+    - MySQL：SELECT 开头的语句加 /*+ MAX_EXECUTION_TIME(ms) */ 优化器提示，只作用于这一条语句；
+      WITH 开头的语句无法加提示，临时设置会话变量，执行完后恢复
+    - PostgreSQL：SET LOCAL statement_timeout，只在当前事务内生效
+    - 其他数据库：不做处理
+    """
+    dialect = conn.dialect.name
+    if not timeout_ms or not is_select(sql) or dialect not in ("mysql", "mariadb", "postgresql"):
+        yield sql
+        return
+    if dialect == "postgresql":
+        conn.execute(text(f"SET LOCAL statement_timeout = {int(timeout_ms)}"))
+        yield sql
+        return
+    if _LEADING_SELECT_RE.match(sql):
+        yield _LEADING_SELECT_RE.sub(lambda m: f"{m.group(0)} /*+ MAX_EXECUTION_TIME({int(timeout_ms)}) */", sql, count=1)
+        return
+    previous = conn.execute(text("SELECT @@SESSION.max_execution_time")).scalar()
+    conn.execute(text(f"SET SESSION max_execution_time = {int(timeout_ms)}"))
+    try:
+        yield sql
+    finally:
+        conn.execute(text(f"SET SESSION max_execution_time = {int(previous or 0)}"))
+
+
+def _chunk_bytes(chunk: pd.DataFrame) -> int:
+    return int(chunk.memory_usage(index=False, deep=True).sum())
+
+
+# ──────────────────────────────────────────────
+# 流式执行 SQL：服务端游标 + yield_per 分批拉取，受行数 / 字节预算约束
+# ──────────────────────────────────────────────
+def execute_streaming(
+    conn: Connection,
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    *,
+    max_rows: int = QUERY_MAX_ROWS,
+    max_bytes: int = QUERY_MAX_BYTES,
+    policy: str = QUERY_BUDGET_POLICY,
+    batch_rows: int = QUERY_STREAM_BATCH_ROWS,
+    timeout_ms: int = QUERY_MAX_EXECUTION_MS,
+) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    分批执行查询并构建列式结果，返回 (DataFrame, 预算统计)。
+
+    超出预算时的策略：
+    - truncate：只保留前 max_rows 行（最外层没有 LIMIT 的 SELECT 会在末尾追加 LIMIT）
+    - sample：扫描全部结果，用蓄水池抽样保留 max_rows 行均匀样本
+    - fail：抛出 QueryBudgetExceeded
+
+    timeout_ms 为单条语句的最长执行时间（见 statement_timeout），0 表示不限制。
+
+    注意：mysql-connector 驱动目前不支持服务端游标（SQLAlchemy 会退化为客户端缓冲），
+    truncate / fail 策略下追加的 LIMIT 仍能保证数据库只返回预算内的行；
+    追加 LIMIT 后的语句执行报错时，回退为原 SQL，由流式拉取截断。
+    """
+    if policy not in BUDGET_POLICIES:
+        raise ValueError(f"不支持的预算策略: {policy}，可选：{BUDGET_POLICIES}")
+
+    stats: Dict[str, Any] = {
+        "policy": policy,
+        "max_rows": max_rows,
+        "max_bytes": max_bytes,
+        "rows_scanned": 0,
+        "rows_returned": 0,
+        "bytes": 0,
+        "truncated": False,
+    }
+
+    limited = None
+    if policy in ("truncate", "fail"):
+        # 多取一行，用于判断是否真的超出了预算
+        limited = add_limit(sql, max_rows + 1, conn.dialect.name)
+    if limited is not None:
+        try:
+            # 在保存点中尝试，失败后事务仍可继续使用（PostgreSQL 出错后整个事务不可用）
+            with conn.begin_nested():
+                return _execute(conn, limited, params, dict(stats), max_rows, max_bytes, policy, batch_rows, timeout_ms)
+        except DBAPIError as exc:
+            if exc.connection_invalidated:
+                raise
+            print(f"⚠️ 追加 LIMIT 后执行失败，改为执行原 SQL：{exc.orig}")
+    return _execute(conn, sql, params, stats, max_rows, max_bytes, policy, batch_rows, timeout_ms)
+
+
+def _execute(
+    conn: Connection,
+    sql: str,
+    params: Optional[Dict[str, Any]],
+    stats: Dict[str, Any],
+    max_rows: int,
+    max_bytes: int,
+    policy: str,
+    batch_rows: int,
+    timeout_ms: int,
+) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    with statement_timeout(conn, sql, timeout_ms) as exec_sql:
+        return _stream_frame(conn, exec_sql, params, stats, max_rows, max_bytes, policy, batch_rows)
+
+
+def _stream_frame(
+    conn: Connection,
+    exec_sql: str,
+    params: Optional[Dict[str, Any]],
+    stats: Dict[str, Any],
+    max_rows: int,
+    max_bytes: int,
+    policy: str,
+    batch_rows: int,
+) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    result = conn.execution_options(stream_results=True, yield_per=batch_rows).execute(
+        text(exec_sql), params or {}
+    )
+    columns = list(result.keys())
+    builder = ColumnarDatasetBuilder()
+    builder.append(pd.DataFrame(columns=columns))
+    reservoir: Optional[pd.DataFrame] = None
+    sample_size = max_rows
+    rng = np.random.default_rng()
+
+    try:
+        for partition in result.partitions():
+            chunk = pd.DataFrame.from_records(partition, columns=columns, coerce_float=True)
+            start = stats["rows_scanned"]
+            stats["rows_scanned"] += len(chunk)
+
+            if policy == "sample":
+                # 首批数据确定平均行宽，把字节预算折算为样本行数
+                if reservoir is None and len(chunk):
+                    row_bytes = max(_chunk_bytes(chunk) / len(chunk), 1.0)
+                    sample_size = max(1, min(max_rows, int(max_bytes // row_bytes)))
+                reservoir = _reservoir_update(reservoir, chunk, start, sample_size, rng)
+                continue
+
+            remaining_rows = max_rows - builder.row_count
+            chunk_bytes = _chunk_bytes(chunk)
+            over_rows = len(chunk) > remaining_rows
+            over_bytes = stats["bytes"] + chunk_bytes > max_bytes
+            if over_rows or over_bytes:
+                if policy == "fail":
+                    raise QueryBudgetExceeded(
+                        f"查询结果超过预算（最多 {max_rows} 行 / {max_bytes} 字节），请缩小查询范围或增加过滤条件"
+                    )
+                keep = remaining_rows
+                if over_bytes and len(chunk):
+                    keep = min(keep, int((max_bytes - stats["bytes"]) // (chunk_bytes / len(chunk))))
+                chunk = chunk.iloc[:max(keep, 0)]
+                builder.append(chunk)
+                stats["bytes"] += _chunk_bytes(chunk)
+                stats["truncated"] = True
+                break
+            builder.append(chunk)
+            stats["bytes"] += chunk_bytes
+    finally:
+        result.close()
+
+    if policy == "sample":
+        frame = reservoir if reservoir is not None else pd.DataFrame(columns=columns)
+        stats["truncated"] = stats["rows_scanned"] > len(frame)
+        stats["bytes"] = _chunk_bytes(frame)
+    else:
+        frame = builder.build()
+    stats["rows_returned"] = int(len(frame))
+    return frame.reset_index(drop=True), stats
+
+
+def _reservoir_update(
+    reservoir: Optional[pd.DataFrame],
+    chunk: pd.DataFrame,
+    start: int,
+    size: int,
+    rng: np.random.Generator,
+) -> pd.DataFrame:
+    """向量化的蓄水池抽样（Algorithm R）：start 为本批第一行的全局序号"""
+    if reservoir is None or len(reservoir) < size:
+        need = size - (0 if reservoir is None else len(reservoir))
+        head, chunk = chunk.iloc[:need], chunk.iloc[need:]
+        reservoir = pd.concat([reservoir, head]) if reservoir is not None else head
+        reservoir = reservoir.reset_index(drop=True)
+        start += len(head)
+    if chunk.empty:
+        return reservoir
+
+    global_idx = np.arange(start, start + len(chunk))
+    slots = (rng.random(len(chunk)) * (global_idx + 1)).astype(np.int64)
+    hit = slots < size
+    if hit.any():
+        sel_slots, sel_rows = slots[hit], np.flatnonzero(hit)
+        # 同一槽位被多次命中时只保留最后一次，与逐行执行 Algorithm R 等价
+        _, last = np.unique(sel_slots[::-1], return_index=True)
+        keep = len(sel_slots) - 1 - last
+        sel_slots, sel_rows = sel_slots[keep], sel_rows[keep]
+        replaced = chunk.iloc[sel_rows].set_axis(sel_slots)
+        reservoir = pd.concat([reservoir.drop(index=sel_slots), replaced]).sort_index()
+    return reservoir
+
+
+__all__ = ["add_limit", "execute_streaming", "statement_timeout", "is_select", "QueryBudgetExceeded", "BUDGET_POLICIES"]
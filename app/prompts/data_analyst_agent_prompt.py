@@ -90,7 +90,6 @@ STATISTICAL_ANALYSIS_PROMPT = """
 数据路径：{path}
 数据列：{columns}
 数据行数：{row_count}
-上一轮输出的反思与优化建议（若有）：{reflection}
 
 请执行全面的统计分析，包括：
 1. 描述性统计（数值型字段的均值、中位数、标准差、最值等）
@@ -98,6 +97,9 @@ STATISTICAL_ANALYSIS_PROMPT = """
 3. 相关性分析（识别字段间的关联关系）
 4. 分布分析（数据分布形态、偏度、峰度等）
 
+下方附有基于全部数据预先计算好的统计结果，报告中的数字请直接引用这些结果，不要根据数据样本自行计算；
+你的任务是解读这些统计量，指出其中的业务含义与值得关注的现象。
+
 输出格式要求：
 请以 Markdown 格式返回分析报告，只返回纯 Markdown 内容，不额外输出多余文字、JSON 或代码块说明。
 报告结构示例如下：
@@ -157,7 +159,6 @@ TREND_PREDICTION_PROMPT = """
 数据路径：{path}
 数据列：{columns}
 数据行数：{row_count}
-上一轮输出的反思与优化建议（若有）：{reflection}
 
 请执行趋势预测分析，包括：
 1. 时间序列分析（如果有时间字段）：识别趋势、季节性、周期性
@@ -165,6 +166,10 @@ TREND_PREDICTION_PROMPT = """
 3. 增长率分析：计算同比、环比增长率
 4. 趋势判断：上升、下降、平稳、波动等
 
+下方附有基于全部数据预先计算的时间序列结果（按周期汇总、环比 / 同比增长率、移动平均、线性趋势与 Holt-Winters 预测及预测区间），
+预测值、增长率等数字请直接引用这些结果，不要根据数据样本自行推算；
+你的任务是解读趋势、季节性与预测结果的业务含义，并说明预测的不确定性。
+
 你必须严格遵守以下规则输出：
 1. 只输出纯 Markdown 内容，不要有任何前导文字、解释、JSON、markdown 代码块（如 ```markdown）或结尾说明。
 2. Markdown 必须从第一个字符就是 # ，使用标准 Markdown 语法。
@@ -216,7 +221,6 @@ ANOMALY_DETECTION_PROMPT = """
 数据路径：{path}
 数据列：{columns}
 数据行数：{row_count}
-上一轮输出的反思与优化建议（若有）：{reflection}
 
 请执行异常检测，包括：
 1. 离群值识别：使用统计方法识别异常值
@@ -224,6 +228,10 @@ ANOMALY_DETECTION_PROMPT = """
 3. 数据质量检查：缺失值、重复值、格式异常等
 4. 异常原因分析：尝试解释异常的可能原因
 
+下方附有对全部数据预先执行的离群检测（IQR、z-score、MAD、滚动残差）与数据质量检查结果，
+离群值、缺失值、重复行等数字请直接引用这些结果，不要从数据样本中自行查找；
+你的任务是解释被标记的异常行与异常模式的可能原因，并评估其严重性。
+
 输出格式要求：
 请以 Markdown 格式返回分析报告，只返回纯 Markdown 内容，不额外输出多余文字、JSON 或代码块说明。
 报告结构示例如下：
@@ -266,6 +274,25 @@ ANOMALY_DETECTION_PROMPT = """
   **描述**：显示每个日期的销售金额，并突出显示异常值。
 """
 
+# 补充轮次的增量修改提示词：只输出需要新增或修改的章节，由程序按标题合并回原报告
+SUPPLEMENT_PATCH_PROMPT = """
+上一轮已经生成了下面这份报告，质量评估发现其中存在遗漏或问题，现在只需要对它做增量修改。
+
+已有报告：
+{report}
+
+遗漏或问题：
+{missing_aspects}
+
+改进建议：
+{suggestions}
+
+你必须严格遵守以下规则输出：
+1. 只输出需要新增或修改的章节，每个章节以二级标题（## ）开头并包含该章节的完整内容；未改动的章节不要重复输出。
+2. 修改已有章节时，二级标题与已有报告中的标题保持一致，程序会按标题替换整个章节；新增章节使用新的二级标题。
+3. 不要输出一级标题、前导文字、解释、JSON、markdown 代码块或结尾说明。
+"""
+
 # 统计分析反思提示词（更关注统计指标完整性、分组维度、相关性等）
 STAT_REFLECTION_PROMPT = """
 你是一个专业的数据分析质量评估专家。现在请针对**统计分析**的 Markdown 报告进行严格评估。
@@ -345,6 +372,7 @@ __all__ = [
     "DATA_ANALYST_AGENT_SYSTEM_PROMPT",
     "REFLECTION_PROMPT",
     "STATISTICAL_ANALYSIS_PROMPT",
+    "SUPPLEMENT_PATCH_PROMPT",
     "TREND_PREDICTION_PROMPT",
     "ANOMALY_DETECTION_PROMPT",
     "STAT_REFLECTION_PROMPT",
@@ -39,8 +39,11 @@ DATA_QUERY_AGENT_SYSTEM_PROMPT = """
     "path": "data/sales.csv",
     "columns": [...],
     "row_count": 1234,
-    "sample_rows": [...]
+    "dataset_id": "工具返回的 dataset_id",
+    "fingerprint": "工具返回的 fingerprint"
   }
+- 工具只返回数据集句柄（dataset_id、columns、row_count、fingerprint）和少量预览行，完整数据保存在数据集注册表中；
+  最终答复中必须原样给出工具返回的 dataset_id 与 fingerprint，不要抄写数据行。
 
 请始终站在后续数据分析 Agent 的视角思考：
 - 它需要什么样的字段、什么粒度的数据？
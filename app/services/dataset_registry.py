@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel, Field
+
+from app.config.env_utils import DATASET_REGISTRY_MAX_BYTES, DATASET_REGISTRY_MAX_ITEMS
+from app.services.flatten import RecordFlattener
+
+
+def normalize_columns(columns: Iterable[Any]) -> List[str]:
+    """规范化列名：小写、去空格、空格与中划线统一为下划线。"""
+    return [str(c).strip().lower().replace(" ", "_").replace("-", "_") for c in columns]
+
+
+def records_to_frame(records: Any, flattener: Optional[RecordFlattener] = None) -> pd.DataFrame:
+    """
+    JSON 记录（字典列表或单个字典）展平为 DataFrame，并规范化列名。
+    分批入库（流式读取、分页）时传入同一个 flattener，各批复用第一批推断出的 schema。
+    """
+    frame = (flattener or RecordFlattener()).flatten(records)
+    frame.columns = normalize_columns(frame.columns)
+    return frame
+
+
+# ──────────────────────────────────────────────
+# 1. 轻量句柄（在 LangGraph 状态 / checkpoint 中流转）
+# ──────────────────────────────────────────────
+class DatasetHandle(BaseModel):
+    """数据集句柄，只携带元信息，真正的数据保存在进程内的 dataset_registry 中"""
+    dataset_id: str = Field(description="数据集 ID，用于从数据集注册表中取回完整数据")
+    columns: List[str] = Field(default_factory=list, description="数据集的列名")
+    row_count: int = Field(0, description="数据集的行数")
+    fingerprint: str = Field("", description="数据内容指纹，用于判断数据是否变化")
+
+
+# ──────────────────────────────────────────────
+# 2. 列式数据集（pandas / NumPy 承载，保留 dtype 信息）
+# ──────────────────────────────────────────────
+class ColumnarDataset:
+    """
+    基于 pandas DataFrame 的列式数据集。
+
+    - 数据按列存放在 NumPy 数组中，不再转换为 list[dict]
+    - 对外提供 dtype、指纹、样本行等只读视图
+    - aggregates：数据库端下推计算的全量聚合统计（明细只是样本时由它反映全量数据）
+    - analytics：分析引擎（统计、异常、预测等）的计算结果缓存，数据不变时反思重跑无需重算
+    - frame 的列可能是只读的内存映射数组（文件解析缓存 / 查询结果缓存命中时由 np.load(mmap_mode="r") 得到），
+      原地修改会报 "assignment destination is read-only"；需要修改时先 frame.copy()
+    """
+
+    def __init__(
+        self,
+        frame: pd.DataFrame,
+        source: str = "",
+        path: str = "",
+        aggregates: Optional[Dict[str, Any]] = None,
+    ):
+        if not all(isinstance(c, str) for c in frame.columns):
+            # 分析引擎与提示词都按字符串列名取列，非字符串列名（如 0、1）在登记时统一转为字符串
+            frame = frame.set_axis([str(c) for c in frame.columns], axis=1)
+        self.frame = frame
+        self.source = source
+        self.path = path
+        self.aggregates = aggregates
+        self.analytics: Dict[str, Any] = {}
+        self._fingerprint: Optional[str] = None
+
+    @property
+    def columns(self) -> List[str]:
+        return [str(c) for c in self.frame.columns]
+
+    @property
+    def row_count(self) -> int:
+        return int(len(self.frame))
+
+    @property
+    def dtypes(self) -> Dict[str, str]:
+        return {str(c): str(t) for c, t in self.frame.dtypes.items()}
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.frame.memory_usage(index=False, deep=True).sum())
+
+    @property
+    def fingerprint(self) -> str:
+        """基于逐行哈希计算的内容指纹（懒计算并缓存）"""
+        if self._fingerprint is None:
+            hasher = hashlib.blake2b(digest_size=16)
+            hasher.update("\x1f".join(f"{c}:{t}" for c, t in self.dtypes.items()).encode("utf-8"))
+            try:
+                row_hashes = pd.util.hash_pandas_object(self.frame, index=False)
+            except TypeError:
+                # 含有 dict / list 等不可哈希的单元格时，退化为按字符串哈希
+                row_hashes = pd.util.hash_pandas_object(self.frame.astype(str), index=False)
+            row_hashes = row_hashes.to_numpy(dtype=np.uint64)
+            hasher.update(row_hashes.tobytes())
+            self._fingerprint = hasher.hexdigest()
+        return self._fingerprint
+
+    def head_records(self, n: int = 5) -> List[Dict[str, Any]]:
+        """取前 n 行，转换为 list[dict]，仅用于预览或提示词"""
+        return self.frame.head(n).to_dict(orient="records")
+
+    def to_frame(self) -> pd.DataFrame:
+        return self.frame
+
+    def handle(self, dataset_id: str) -> DatasetHandle:
+        return DatasetHandle(
+            dataset_id=dataset_id,
+            columns=self.columns,
+            row_count=self.row_count,
+            fingerprint=self.fingerprint,
+        )
+
+
+class ColumnarDatasetBuilder:
+    """
+    增量构建列式数据集：逐块 append DataFrame，最后一次性合并。
+
+    - 用于分块流式读取，调用方只需持有当前块，内存峰值由块大小决定
+    - 各块列顺序以第一块为准，后续块出现的新列追加在末尾（之前的块中为缺失值）
+    """
+
+    def __init__(self, source: str = "", path: str = ""):
+        self.source = source
+        self.path = path
+        self._chunks: List[pd.DataFrame] = []
+        self._columns: Optional[List[str]] = None
+        self.row_count = 0
+
+    def append(self, chunk: pd.DataFrame) -> None:
+        columns = [str(c) for c in chunk.columns]
+        if self._columns is None:
+            self._columns = columns
+        elif columns != self._columns:
+            known = set(self._columns)
+            self._columns += [c for c in columns if c not in known]
+        if chunk.empty:
+            return
+        self._chunks.append(chunk)
+        self.row_count += len(chunk)
+
+    def build(self) -> pd.DataFrame:
+        if not self._chunks:
+            return pd.DataFrame(columns=self._columns or [])
+        frame = pd.concat(self._chunks, ignore_index=True, copy=False)
+        if [str(c) for c in frame.columns] != self._columns:
+            frame = frame.reindex(columns=self._columns)
+        self._chunks = [frame]
+        return frame
+
+
+# ──────────────────────────────────────────────
+# 3. 进程内数据集注册表（LRU 淘汰）
+# ──────────────────────────────────────────────
+class DatasetRegistry:
+    """
+    进程内的数据集注册表。
+
+    - register：登记一个 DataFrame，返回 DatasetHandle
+    - get：根据 dataset_id 取回 ColumnarDataset
+    - 超过数量或内存上限时，按最近最少使用（LRU）淘汰
+    """
+
+    def __init__(self, max_items: int = DATASET_REGISTRY_MAX_ITEMS, max_bytes: int = DATASET_REGISTRY_MAX_BYTES):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._datasets: "OrderedDict[str, ColumnarDataset]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    def register(
+        self,
+        frame: pd.DataFrame,
+        *,
+        source: str = "",
+        path: str = "",
+        aggregates: Optional[Dict[str, Any]] = None,
+    ) -> DatasetHandle:
+        dataset = ColumnarDataset(frame, source=source, path=path, aggregates=aggregates)
+        dataset_id = uuid.uuid4().hex
+        with self._lock:
+            self._datasets[dataset_id] = dataset
+            self._sizes[dataset_id] = dataset.nbytes
+            self._evict(keep=dataset_id)
+        return dataset.handle(dataset_id)
+
+    def get(self, dataset_id: str) -> ColumnarDataset:
+        with self._lock:
+            dataset = self._datasets.get(dataset_id)
+            if dataset is None:
+                raise KeyError(f"数据集不存在或已被淘汰: {dataset_id}")
+            self._datasets.move_to_end(dataset_id)
+            return dataset
+
+    def describe(self, dataset_id: str, preview_rows: int = 5) -> Dict[str, Any]:
+        """生成给工具 / LLM 查看的数据集摘要：句柄 + dtype + 少量预览行"""
+        dataset = self.get(dataset_id)
+        return {
+            **dataset.handle(dataset_id).model_dump(),
+            "dtypes": dataset.dtypes,
+            "preview_rows": dataset.head_records(preview_rows),
+        }
+
+    def drop(self, dataset_id: str) -> None:
+        with self._lock:
+            self._datasets.pop(dataset_id, None)
+            self._sizes.pop(dataset_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._datasets.clear()
+            self._sizes.clear()
+
+    def __contains__(self, dataset_id: str) -> bool:
+        return dataset_id in self._datasets
+
+    def __len__(self) -> int:
+        return len(self._datasets)
+
+    def _evict(self, keep: str) -> None:
+        while len(self._datasets) > 1 and (
+            len(self._datasets) > self.max_items or sum(self._sizes.values()) > self.max_bytes
+        ):
+            oldest = next(iter(self._datasets))
+            if oldest == keep:
+                break
+            self.drop(oldest)
+
+
+dataset_registry = DatasetRegistry()
+
+__all__ = [
+    "DatasetHandle",
+    "ColumnarDataset",
+    "ColumnarDatasetBuilder",
+    "DatasetRegistry",
+    "dataset_registry",
+    "normalize_columns",
+]
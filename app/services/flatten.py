@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+from itertools import chain
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import orjson
+import pandas as pd
+
+from app.config.env_utils import FLATTEN_LIST_POLICY, FLATTEN_MAX_DEPTH, FLATTEN_SAMPLE_ROWS
+
+LIST_POLICIES = ("stringify", "explode", "keep")
+
+# 路径上值的类型（由样本推断）
+_DICT, _LIST, _FLOAT, _INT, _BOOL, _STR, _OBJECT = "dict", "list", "float", "int", "bool", "str", "object"
+
+
+def _infer_kind(values: List[Any], sample_rows: int) -> Optional[str]:
+    """样本中全是 None 时返回 None（暂不确定类型）"""
+    types = set()
+    for v in values:
+        if v is None:
+            continue
+        types.add(type(v))
+        if len(types) > 3 or sample_rows <= 0:
+            break
+        sample_rows -= 1
+    if dict in types:
+        return _DICT
+    if list in types:
+        return _LIST
+    if types == {bool}:
+        return _BOOL
+    if types == {int}:
+        return _INT
+    if types and types <= {int, float}:
+        return _FLOAT
+    if types == {str}:
+        return _STR
+    return _OBJECT if types else None
+
+
+def _dumps(value: Any) -> Any:
+    if isinstance(value, (dict, list)):
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return value
+
+
+# ──────────────────────────────────────────────
+# 嵌套 JSON 记录展平（替代 pd.json_normalize）
+# ──────────────────────────────────────────────
+class RecordFlattener:
+    """
+    按列展平嵌套 JSON 记录：每一层只对整列做一次列表推导取值，直接构建 NumPy / pandas 列，
+    不像 json_normalize 那样为每条记录构造一个展平后的字典。
+
+    - 各路径的值类型（嵌套对象 / 列表 / 数值 / 字符串）从第一批数据的前 sample_rows 条推断一次，
+      之后的批次（流式读取、分页）复用同一个 schema；新出现的 key 仍会补充为新列
+    - max_depth：最多展开的嵌套层数，更深的对象序列化为 JSON 字符串；0 表示不限
+    - list_policy：列表值的处理方式
+        stringify：序列化为 JSON 字符串（默认，便于去重、分组与哈希）
+        explode：把一个列表列展开为多行（explode_path 指定，默认取第一个列表列），其余列表列序列化
+        keep：保留为 Python list（与 json_normalize 一致）
+    - 列名以 "." 连接各层 key，与 json_normalize 相同
+    """
+
+    def __init__(
+        self,
+        max_depth: int = FLATTEN_MAX_DEPTH,
+        list_policy: str = FLATTEN_LIST_POLICY,
+        explode_path: Optional[str] = None,
+        sample_rows: int = FLATTEN_SAMPLE_ROWS,
+    ):
+        if list_policy not in LIST_POLICIES:
+            raise ValueError(f"list_policy 只能是 {LIST_POLICIES} 之一，收到：{list_policy}")
+        self.max_depth = max_depth
+        self.list_policy = list_policy
+        self.explode_path = explode_path
+        self.sample_rows = sample_rows
+        self.kinds: Dict[Tuple[str, ...], str] = {}
+
+    # ---------- schema ----------
+    def _kind(self, path: Tuple[str, ...], values: List[Any]) -> str:
+        kind = self.kinds.get(path)
+        if kind is None:
+            kind = _infer_kind(values, self.sample_rows)
+            if kind is None:
+                return _OBJECT
+            self.kinds[path] = kind
+        return kind
+
+    def _expand(self, depth: int) -> bool:
+        return self.max_depth <= 0 or depth < self.max_depth
+
+    # ---------- 列构建 ----------
+    @staticmethod
+    def _column(values: List[Any], kind: str) -> Any:
+        if any(isinstance(v, (dict, list)) for v in values):
+            # schema 沿用第一批推断的类型，后续批次在标量列上出现对象 / 列表时序列化为 JSON 字符串，不把原始对象放进单元格
+            return pd.Series([_dumps(v) for v in values], dtype=object)
+        if kind == _FLOAT:
+            try:
+                # None 直接转为 NaN
+                return np.array(values, dtype=np.float64)
+            except (TypeError, ValueError):
+                pass
+        elif kind in (_INT, _BOOL):
+            # 没有缺失值时 NumPy 直接推断出 int64 / bool；含 None 或类型漂移时退回 pandas 推断
+            array = np.array(values)
+            if array.ndim == 1 and array.dtype.kind in "iub":
+                return array
+        elif kind == _STR:
+            return np.array(values, dtype=object)
+        # 缺失值 / 类型漂移：交给 pandas 在 C 层推断（int 含缺失值时与 json_normalize 一样转为 float64）
+        return pd.Series(values)
+
+    def _build(
+        self,
+        values: List[Any],
+        path: Tuple[str, ...],
+        depth: int,
+        out: Dict[str, Any],
+        all_dicts: bool,
+    ) -> None:
+        dicts = values if all_dicts else [v for v in values if type(v) is dict]
+        keys = dict.fromkeys(chain.from_iterable(dicts))
+        for key in keys:
+            child_path = path + (str(key),)
+            name = ".".join(child_path)
+            if all_dicts:
+                child = [v.get(key) for v in values]
+            else:
+                child = [v.get(key) if type(v) is dict else None for v in values]
+            kind = self._kind(child_path, child)
+
+            if kind == _DICT and self._expand(depth + 1):
+                child_all_dicts = all(type(v) is dict for v in child)
+                if not child_all_dicts and any(v is not None and type(v) is not dict for v in child):
+                    # 同一个 key 有的记录是对象、有的是标量：标量单独成列
+                    out[name] = self._column([None if type(v) is dict else _dumps(v) for v in child], _OBJECT)
+                self._build(child, child_path, depth + 1, out, child_all_dicts)
+            elif kind == _LIST and self.list_policy == "explode" and self._explode_target(name):
+                out[name] = child
+            elif kind == _LIST and self.list_policy == "keep":
+                out[name] = pd.Series(child, dtype=object)
+            elif kind in (_DICT, _LIST):
+                out[name] = pd.Series([_dumps(v) for v in child], dtype=object)
+            else:
+                out[name] = self._column(child, kind)
+
+    def _explode_target(self, name: str) -> bool:
+        if self.explode_path is None:
+            # 未指定时展开遇到的第一个列表列
+            self.explode_path = name
+        return name == self.explode_path
+
+    # ---------- 展开为多行 ----------
+    def _explode(self, frame: pd.DataFrame, name: str, lists: List[Any]) -> pd.DataFrame:
+        lengths = np.fromiter(
+            (len(v) if type(v) is list and v else 1 for v in lists), dtype=np.int64, count=len(lists)
+        )
+        # 空列表 / 缺失值保留一行，展开列为空
+        elements = list(chain.from_iterable(v if type(v) is list and v else (None,) for v in lists))
+        rest = frame.take(np.repeat(np.arange(len(frame)), lengths))
+        rest.reset_index(drop=True, inplace=True)
+
+        depth = name.count(".") + 1
+        if any(type(v) is dict for v in elements) and self._expand(depth):
+            child = RecordFlattener(
+                max_depth=self.max_depth - depth if self.max_depth > 0 else 0,
+                list_policy="stringify",
+                sample_rows=self.sample_rows,
+            )
+            exploded = child.flatten(elements)
+            exploded.columns = [f"{name}.{c}" for c in exploded.columns]
+        else:
+            values = [_dumps(v) for v in elements]
+            exploded = pd.DataFrame({name: self._column(values, _infer_kind(values, self.sample_rows) or _OBJECT)})
+        return pd.concat([rest, exploded], axis=1)
+
+    def flatten(self, records: Any) -> pd.DataFrame:
+        if isinstance(records, dict):
+            records = [records]
+        if not isinstance(records, list):
+            raise TypeError(f"无法展平为表格的数据类型：{type(records).__name__}")
+        if not records:
+            return pd.DataFrame()
+
+        all_dicts = all(type(r) is dict for r in records)
+        out: Dict[str, Any] = {}
+        if not all_dicts:
+            # 数组元素是标量（或混有标量）时放在 value 列
+            scalars = [None if type(r) is dict else r for r in records]
+            if any(v is not None for v in scalars):
+                values = [_dumps(v) for v in scalars]
+                out["value"] = self._column(values, _infer_kind(values, self.sample_rows) or _OBJECT)
+        self._build(records, (), 0, out, all_dicts)
+
+        explode_values = None
+        if self.list_policy == "explode" and isinstance(out.get(self.explode_path), list):
+            explode_values = out.pop(self.explode_path)
+        frame = pd.DataFrame(out, copy=False)
+        if explode_values is not None:
+            frame = self._explode(frame, self.explode_path, explode_values)
+        return frame
+
+
+def flatten_records(
+    records: Any,
+    max_depth: int = FLATTEN_MAX_DEPTH,
+    list_policy: str = FLATTEN_LIST_POLICY,
+    explode_path: Optional[str] = None,
+) -> pd.DataFrame:
+    return RecordFlattener(max_depth, list_policy, explode_path).flatten(records)
+
+
+__all__ = ["LIST_POLICIES", "RecordFlattener", "flatten_records"]
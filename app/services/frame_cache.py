@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# ──────────────────────────────────────────────
+# 本地磁盘 DataFrame 缓存（列式 .npy 存储，可内存映射）
+# ──────────────────────────────────────────────
+# 每个缓存项是一个目录：
+#   meta.json      列名、每列的编码方式与 dtype、调用方附加的元信息
+#   c{i}.npy       第 i 列的数值数组（np.load(mmap_mode="r") 直接映射）
+#   c{i}.pkl       字符串 / 对象列的字典表（codes 存在 c{i}.npy 中）
+# 目录的 mtime 作为最近访问时间，超过磁盘预算时按 LRU 淘汰。
+
+_META_FILE = "meta.json"
+
+
+def _encode_column(series: pd.Series, entry_dir: Path, idx: int) -> Dict[str, Any]:
+    """把一列写入磁盘，返回该列的元信息"""
+    dtype = series.dtype
+    npy_path = entry_dir / f"c{idx}.npy"
+
+    if isinstance(dtype, pd.DatetimeTZDtype):
+        values = series.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy(dtype="datetime64[ns]")
+        np.save(npy_path, values.view("int64"))
+        return {"kind": "datetime", "tz": str(dtype.tz)}
+    if pd.api.types.is_datetime64_dtype(dtype):
+        np.save(npy_path, series.to_numpy(dtype="datetime64[ns]").view("int64"))
+        return {"kind": "datetime", "tz": None}
+    if isinstance(dtype, np.dtype) and dtype.kind in "biufc":
+        np.save(npy_path, series.to_numpy())
+        return {"kind": "numeric"}
+
+    # 字符串 / 类别 / 可空扩展类型：字典编码，codes 可内存映射，字典表单独保存
+    try:
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    except TypeError:
+        # dict / list 等不可哈希的单元格，整列序列化
+        with open(entry_dir / f"c{idx}.pkl", "wb") as f:
+            pickle.dump(series.to_numpy(dtype=object), f, protocol=pickle.HIGHEST_PROTOCOL)
+        return {"kind": "pickle"}
+    np.save(npy_path, codes.astype(np.int32 if len(uniques) < 2 ** 31 else np.int64))
+    with open(entry_dir / f"c{idx}.pkl", "wb") as f:
+        pickle.dump(np.asarray(uniques, dtype=object), f, protocol=pickle.HIGHEST_PROTOCOL)
+    return {"kind": "dictionary", "dtype": str(dtype)}
+
+
+def _decode_column(meta: Dict[str, Any], entry_dir: Path, idx: int) -> Any:
+    kind = meta["kind"]
+    if kind == "pickle":
+        with open(entry_dir / f"c{idx}.pkl", "rb") as f:
+            return pickle.load(f)
+
+    values = np.load(entry_dir / f"c{idx}.npy", mmap_mode="r")
+    if kind == "numeric":
+        return values
+    if kind == "datetime":
+        column = pd.Series(values.view("datetime64[ns]"))
+        if meta.get("tz"):
+            column = column.dt.tz_localize("UTC").dt.tz_convert(meta["tz"])
+        return column
+
+    with open(entry_dir / f"c{idx}.pkl", "rb") as f:
+        uniques = pickle.load(f)
+    # 末尾追加 NaN，缺失值的 code 为 -1，正好取到最后一个元素
+    lookup = np.append(uniques, np.nan).astype(object)
+    column = pd.Series(lookup.take(np.asarray(values)), dtype=object)
+    if meta.get("dtype") not in (None, "object"):
+        try:
+            column = column.astype(meta["dtype"])
+        except (TypeError, ValueError):
+            pass
+    return column
+
+
+class FrameDiskCache:
+    """
+    基于本地磁盘的 DataFrame 缓存。
+
+    - make_key：由任意可 JSON 序列化的参数生成缓存 key
+    - get / put：读写缓存，数值列以内存映射方式加载，命中时只需毫秒级
+    - 总占用超过 max_bytes 时按最近最少使用（LRU）淘汰
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.cache_dir / key
+
+    def get_meta(self, key: str) -> Optional[Dict[str, Any]]:
+        meta_path = self._entry_dir(key) / _META_FILE
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def get(self, key: str) -> Optional[Tuple[pd.DataFrame, Dict[str, Any]]]:
+        """命中返回 (frame, 附加元信息)，未命中返回 None"""
+        entry_dir = self._entry_dir(key)
+        meta = self.get_meta(key)
+        if meta is None:
+            self.misses += 1
+            return None
+        try:
+            data = {
+                col: _decode_column(col_meta, entry_dir, idx)
+                for idx, (col, col_meta) in enumerate(zip(meta["columns"], meta["encodings"]))
+            }
+            frame = pd.DataFrame(data, columns=meta["columns"], copy=False)
+        except (OSError, ValueError, KeyError, pickle.UnpicklingError) as e:
+            print(f"读取缓存失败，已删除损坏的缓存项 {key}: {e}")
+            self.invalidate(key)
+            self.misses += 1
+            return None
+        # 刷新访问时间，用于 LRU
+        os.utime(entry_dir, None)
+        self.hits += 1
+        return frame, meta.get("extra", {})
+
+    def put(self, key: str, frame: pd.DataFrame, extra: Optional[Dict[str, Any]] = None) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_dir = self.cache_dir / f".tmp-{uuid.uuid4().hex}"
+        tmp_dir.mkdir()
+        try:
+            encodings = [_encode_column(frame.iloc[:, i], tmp_dir, i) for i in range(frame.shape[1])]
+            meta = {
+                "columns": [str(c) for c in frame.columns],
+                "encodings": encodings,
+                "row_count": int(len(frame)),
+                "created_at": time.time(),
+                "extra": extra or {},
+            }
+            with open(tmp_dir / _META_FILE, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False, default=str)
+            with self._lock:
+                self.invalidate(key)
+                os.replace(tmp_dir, self._entry_dir(key))
+                self._evict(keep=key)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def invalidate(self, key: str) -> None:
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def clear(self) -> None:
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _entries(self):
+        if not self.cache_dir.exists():
+            return []
+        entries = []
+        for entry_dir in self.cache_dir.iterdir():
+            if not entry_dir.is_dir() or entry_dir.name.startswith(".tmp-"):
+                continue
+            size = sum(p.stat().st_size for p in entry_dir.iterdir())
+            entries.append((entry_dir.stat().st_mtime, size, entry_dir))
+        return entries
+
+    def _evict(self, keep: str) -> None:
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in entries:
+            if total <= self.max_bytes:
+                break
+            if entry_dir.name == keep:
+                continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._entries()
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+__all__ = ["FrameDiskCache"]
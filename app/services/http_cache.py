@@ -0,0 +1,377 @@
+from __future__ import annotations
+
+import asyncio
+import fnmatch
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from app.config.env_utils import HTTP_CACHE_DEFAULT_TTL, HTTP_CACHE_DIR, HTTP_CACHE_ENABLED, HTTP_CACHE_MAX_BYTES, \
+    HTTP_CACHE_RULES, HTTP_CACHE_STALE_WHILE_REVALIDATE
+from app.services.http_client import HTTPClientPool, http_client_pool
+
+_CACHEABLE_METHODS = ("GET", "HEAD")
+# 需要随缓存一起保存的响应头（用于条件请求、计算有效期与还原响应）
+_KEPT_HEADERS = ("etag", "last-modified", "cache-control", "content-type", "expires", "date", "link")
+
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    directives: Dict[str, Optional[str]] = {}
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, arg = part.partition("=")
+        directives[name.strip().lower()] = arg.strip().strip('"') or None
+    return directives
+
+
+def _seconds(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def load_rules(raw: str = HTTP_CACHE_RULES) -> List[Dict[str, Any]]:
+    try:
+        rules = json.loads(raw or "[]")
+    except json.JSONDecodeError as e:
+        print(f"HTTP_CACHE_RULES 不是合法的 JSON，已忽略：{e}")
+        return []
+    return [r for r in rules if isinstance(r, dict) and r.get("pattern")]
+
+
+# ──────────────────────────────────────────────
+# 磁盘 HTTP 缓存：ETag / Last-Modified 条件请求 + max-age + stale-while-revalidate
+# ──────────────────────────────────────────────
+class CachedHTTPClient:
+    """
+    包装 HTTPClientPool，对 GET 请求做磁盘缓存，接口与 HTTPClientPool 的 request / arequest 一致。
+
+    - 有效期内直接返回缓存（hit）
+    - 过期但仍在 stale-while-revalidate 窗口内：立即返回旧副本（stale），后台重新验证
+    - 其余情况带 If-None-Match / If-Modified-Since 发条件请求，304 时复用缓存内容（revalidated）
+    - 有效期优先取 URL 模式覆盖规则，其次是 Cache-Control 的 s-maxage / max-age，再次是 Expires
+    - 返回的 httpx.Response 中，extensions["http_cache"] 记录本次命中状态
+    """
+
+    def __init__(
+        self,
+        pool: HTTPClientPool,
+        cache_dir: str = HTTP_CACHE_DIR,
+        max_bytes: int = HTTP_CACHE_MAX_BYTES,
+        default_ttl: float = HTTP_CACHE_DEFAULT_TTL,
+        default_swr: float = HTTP_CACHE_STALE_WHILE_REVALIDATE,
+        rules: Optional[List[Dict[str, Any]]] = None,
+        enabled: bool = HTTP_CACHE_ENABLED,
+    ):
+        self.pool = pool
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.default_swr = default_swr
+        self.rules = load_rules() if rules is None else rules
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._revalidating: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._metrics = {"hit": 0, "stale": 0, "revalidated": 0, "miss": 0, "bypass": 0, "stored": 0}
+
+    # ---------- key 与存储 ----------
+    @staticmethod
+    def make_key(method: str, url: str, params: Any = None, headers: Any = None, json_body: Any = None) -> str:
+        request = httpx.Request(method, url, params=params)
+        raw = json.dumps(
+            [method.upper(), str(request.url), sorted((headers or {}).items()), json_body],
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        return self.cache_dir / f"{key}.json", self.cache_dir / f"{key}.body"
+
+    def _load(self, key: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            body = body_path.read_bytes()
+        except (OSError, json.JSONDecodeError):
+            return None
+        try:
+            # 刷新访问时间供 LRU 淘汰参考；读取后文件可能已被淘汰，不影响返回已读到的内容
+            os.utime(meta_path, None)
+        except OSError:
+            pass
+        return meta, body
+
+    def _store(self, key: str, meta: Dict[str, Any], body: Optional[bytes]) -> bool:
+        """写磁盘缓存只是优化：磁盘已满、无权限等写入失败时返回 False，响应照常返回给调用方"""
+        meta_path, body_path = self._paths(key)
+        tag = uuid.uuid4().hex
+        tmp_body, tmp_meta = body_path.with_suffix(f".{tag}.tmp"), meta_path.with_suffix(f".{tag}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            if body is not None:
+                tmp_body.write_bytes(body)
+                os.replace(tmp_body, body_path)
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(tmp_meta, meta_path)
+        except OSError as e:
+            print(f"写入 HTTP 缓存失败，已跳过：{e}")
+            for tmp in (tmp_body, tmp_meta):
+                try:
+                    tmp.unlink(missing_ok=True)
+                except OSError:
+                    pass
+            return False
+        self._evict()
+        return True
+
+    def _evict(self) -> None:
+        with self._lock:
+            metas = []
+            for meta_path in self.cache_dir.glob("*.json"):
+                body_path = meta_path.with_suffix(".body")
+                try:
+                    stat = meta_path.stat()
+                    size = stat.st_size + (body_path.stat().st_size if body_path.exists() else 0)
+                except OSError:
+                    # 其他线程 / 进程刚刚淘汰了这一项
+                    continue
+                metas.append((stat.st_mtime, size, meta_path, body_path))
+            total = sum(m[1] for m in metas)
+            for _, size, meta_path, body_path in sorted(metas):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    meta_path.unlink(missing_ok=True)
+                    body_path.unlink(missing_ok=True)
+                except OSError as e:
+                    print(f"淘汰 HTTP 缓存失败，已跳过：{e}")
+                    continue
+                total -= size
+
+    # ---------- 有效期 ----------
+    def _rule_for(self, url: str) -> Optional[Dict[str, Any]]:
+        return next((r for r in self.rules if fnmatch.fnmatch(url, r["pattern"])), None)
+
+    def _freshness(self, url: str, headers: httpx.Headers) -> Optional[Tuple[float, float]]:
+        """返回 (ttl, stale_while_revalidate)；不可缓存时返回 None"""
+        cc = parse_cache_control(headers.get("cache-control"))
+        rule = self._rule_for(url)
+        if rule is not None:
+            swr = rule.get("stale_while_revalidate")
+            return float(rule.get("ttl", 0)), float(self.default_swr if swr is None else swr)
+        if "no-store" in cc:
+            return None
+        ttl = _seconds(cc.get("s-maxage")) or _seconds(cc.get("max-age"))
+        if ttl is None and headers.get("expires"):
+            try:
+                ttl = max(parsedate_to_datetime(headers["expires"]).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                ttl = 0.0
+        if ttl is None:
+            ttl = self.default_ttl
+        if "no-cache" in cc:
+            ttl = 0.0
+        swr = _seconds(cc.get("stale-while-revalidate"))
+        return ttl, self.default_swr if swr is None else swr
+
+    def _meta_for(self, url: str, resp: httpx.Response) -> Optional[Dict[str, Any]]:
+        freshness = self._freshness(url, resp.headers)
+        if freshness is None:
+            return None
+        ttl, swr = freshness
+        headers = {h: resp.headers[h] for h in _KEPT_HEADERS if h in resp.headers}
+        if ttl <= 0 and swr <= 0 and not ("etag" in headers or "last-modified" in headers):
+            # 既不能直接复用、也无法条件请求的响应没有缓存价值
+            return None
+        now = time.time()
+        return {
+            "url": str(resp.request.url),
+            "status": resp.status_code,
+            "headers": headers,
+            "stored_at": now,
+            "fresh_until": now + ttl,
+            "stale_until": now + ttl + swr,
+        }
+
+    # ---------- 请求辅助 ----------
+    @staticmethod
+    def _conditional_headers(headers: Optional[Dict[str, str]], meta: Dict[str, Any]) -> Dict[str, str]:
+        headers = dict(headers or {})
+        if "etag" in meta["headers"]:
+            headers["If-None-Match"] = meta["headers"]["etag"]
+        if "last-modified" in meta["headers"]:
+            headers["If-Modified-Since"] = meta["headers"]["last-modified"]
+        return headers
+
+    @staticmethod
+    def _cached_response(method: str, meta: Dict[str, Any], body: bytes, status: str) -> httpx.Response:
+        resp = httpx.Response(
+            meta["status"],
+            headers=meta["headers"],
+            content=body,
+            request=httpx.Request(method, meta["url"]),
+        )
+        resp.extensions["http_cache"] = status
+        return resp
+
+    def _count(self, status: str) -> None:
+        with self._lock:
+            self._metrics[status] += 1
+
+    def _lookup(self, key: str) -> Tuple[Optional[Tuple[Dict[str, Any], bytes]], str]:
+        """返回 (缓存项, 状态)：状态为 hit / stale / expired / none"""
+        cached = self._load(key)
+        if cached is None:
+            return None, "none"
+        now = time.time()
+        if now < cached[0]["fresh_until"]:
+            return cached, "hit"
+        if now < cached[0]["stale_until"]:
+            return cached, "stale"
+        return cached, "expired"
+
+    def _on_response(
+        self,
+        key: str,
+        method: str,
+        url: str,
+        resp: httpx.Response,
+        cached: Optional[Tuple[Dict[str, Any], bytes]],
+    ) -> httpx.Response:
+        if resp.status_code == 304 and cached is not None:
+            # 内容未变化：沿用缓存内容，按新响应头刷新有效期
+            merged = httpx.Response(
+                cached[0]["status"],
+                headers={**cached[0]["headers"], **{h: resp.headers[h] for h in _KEPT_HEADERS if h in resp.headers}},
+                request=resp.request,
+            )
+            meta = self._meta_for(url, merged) or {**cached[0], "stored_at": time.time()}
+            self._store(key, meta, None)
+            self._count("revalidated")
+            return self._cached_response(method, meta, cached[1], "revalidated")
+        if resp.status_code == 200:
+            meta = self._meta_for(url, resp)
+            if meta is not None and self._store(key, meta, resp.content):
+                self._count("stored")
+        self._count("miss")
+        resp.extensions["http_cache"] = "miss"
+        return resp
+
+    def _request_kwargs(self, kwargs: Dict[str, Any], cached: Optional[Tuple[Dict[str, Any], bytes]]) -> Dict[str, Any]:
+        if cached is None:
+            return kwargs
+        return {**kwargs, "headers": self._conditional_headers(kwargs.get("headers"), cached[0])}
+
+    def _cache_key(self, method: str, url: str, kwargs: Dict[str, Any]) -> Optional[str]:
+        if not self.enabled or method.upper() not in _CACHEABLE_METHODS:
+            return None
+        return self.make_key(method, url, kwargs.get("params"), kwargs.get("headers"), kwargs.get("json"))
+
+    # ---------- 异步 ----------
+    async def arequest(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        key = self._cache_key(method, url, kwargs)
+        if key is None:
+            self._count("bypass")
+            return await self.pool.arequest(method, url, **kwargs)
+
+        cached, state = await asyncio.to_thread(self._lookup, key)
+        if state == "hit":
+            self._count("hit")
+            return self._cached_response(method, cached[0], cached[1], "hit")
+        if state == "stale":
+            self._count("stale")
+            self._schedule_async_revalidate(key, method, url, kwargs, cached)
+            return self._cached_response(method, cached[0], cached[1], "stale")
+
+        resp = await self.pool.arequest(method, url, **self._request_kwargs(kwargs, cached))
+        return await asyncio.to_thread(self._on_response, key, method, url, resp, cached)
+
+    def _schedule_async_revalidate(self, key, method, url, kwargs, cached) -> None:
+        with self._lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+
+        async def revalidate() -> None:
+            try:
+                resp = await self.pool.arequest(method, url, **self._request_kwargs(kwargs, cached))
+                await asyncio.to_thread(self._on_response, key, method, url, resp, cached)
+            except Exception as e:
+                print(f"后台重新验证缓存失败 {url}: {e}")
+            finally:
+                with self._lock:
+                    self._revalidating.discard(key)
+
+        task = asyncio.get_running_loop().create_task(revalidate())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    # ---------- 同步 ----------
+    def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        key = self._cache_key(method, url, kwargs)
+        if key is None:
+            self._count("bypass")
+            return self.pool.request(method, url, **kwargs)
+
+        cached, state = self._lookup(key)
+        if state == "hit":
+            self._count("hit")
+            return self._cached_response(method, cached[0], cached[1], "hit")
+        if state == "stale":
+            self._count("stale")
+            self._schedule_sync_revalidate(key, method, url, kwargs, cached)
+            return self._cached_response(method, cached[0], cached[1], "stale")
+
+        resp = self.pool.request(method, url, **self._request_kwargs(kwargs, cached))
+        return self._on_response(key, method, url, resp, cached)
+
+    def _schedule_sync_revalidate(self, key, method, url, kwargs, cached) -> None:
+        with self._lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="http-revalidate")
+
+        def revalidate() -> None:
+            try:
+                resp = self.pool.request(method, url, **self._request_kwargs(kwargs, cached))
+                self._on_response(key, method, url, resp, cached)
+            except Exception as e:
+                print(f"后台重新验证缓存失败 {url}: {e}")
+            finally:
+                with self._lock:
+                    self._revalidating.discard(key)
+
+        self._executor.submit(revalidate)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._metrics, "revalidating": len(self._revalidating)}
+
+    def clear(self) -> None:
+        for path in self.cache_dir.glob("*"):
+            path.unlink(missing_ok=True)
+
+
+cached_http_client = CachedHTTPClient(http_client_pool)
+
+__all__ = ["CachedHTTPClient", "cached_http_client", "parse_cache_control"]
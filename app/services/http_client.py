@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import threading
+import time
+import weakref
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import httpx
+
+from app.config.env_utils import API_REQUEST_TIMEOUT, HTTP_CONNECT_TIMEOUT, HTTP_KEEPALIVE_EXPIRY, \
+    HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_MAX_PER_HOST, HTTP_POOL_TIMEOUT
+
+
+# ──────────────────────────────────────────────
+# 进程级 HTTP 连接池（httpx，keep-alive 复用连接）
+# ──────────────────────────────────────────────
+class HTTPClientPool:
+    """
+    共享的 HTTP 客户端，避免每次请求都重新做 DNS、TCP、TLS 握手。
+
+    - arequest：异步请求，httpx.AsyncClient 绑定事件循环，因此每个事件循环各持有一个客户端
+    - request：同步请求，进程内共享一个 httpx.Client（线程安全）
+    - astream / stream：流式读取响应体，用于大体积 JSON
+    - 单个主机的并发请求数受 max_per_host 限制，避免把内部 API 打满
+    - stats：请求数、新建连接数、连接复用率、主机并发等待时间、连接池中的连接数
+    """
+
+    def __init__(
+        self,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive: int = HTTP_MAX_KEEPALIVE,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+        max_per_host: int = HTTP_MAX_PER_HOST,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+        read_timeout: float = API_REQUEST_TIMEOUT,
+        pool_timeout: float = HTTP_POOL_TIMEOUT,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout, pool=pool_timeout)
+        self.max_per_host = max_per_host
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._async_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._sync_client: Optional[httpx.Client] = None
+        self._sync_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Any] = {
+            "requests": 0,
+            "errors": 0,
+            "new_connections": 0,
+            "in_flight": 0,
+            "host_wait_total": 0.0,
+            "host_wait_max": 0.0,
+            "hosts": {},
+        }
+
+    # ---------- 客户端 ----------
+    def _client_kwargs(self) -> Dict[str, Any]:
+        return {"limits": self.limits, "timeout": self.timeout, "follow_redirects": True}
+
+    def get_async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(**self._client_kwargs())
+            self._async_clients[loop] = client
+        return client
+
+    def get_sync_client(self) -> httpx.Client:
+        if self._sync_client is None or self._sync_client.is_closed:
+            with self._lock:
+                if self._sync_client is None or self._sync_client.is_closed:
+                    self._sync_client = httpx.Client(**self._client_kwargs())
+        return self._sync_client
+
+    # ---------- 指标 ----------
+    def _on_trace(self, event: str) -> None:
+        # httpcore 只在新建连接时触发 connect_tcp，复用 keep-alive 连接时不会触发
+        if event == "connection.connect_tcp.complete":
+            with self._lock:
+                self._metrics["new_connections"] += 1
+
+    def _trace(self, event: str, info: Dict[str, Any]) -> None:
+        self._on_trace(event)
+
+    async def _atrace(self, event: str, info: Dict[str, Any]) -> None:
+        self._on_trace(event)
+
+    def _begin(self, host: str, waited: float) -> None:
+        with self._lock:
+            m = self._metrics
+            m["requests"] += 1
+            m["in_flight"] += 1
+            m["host_wait_total"] += waited
+            m["host_wait_max"] = max(m["host_wait_max"], waited)
+            host_stats = m["hosts"].setdefault(host, {"requests": 0, "in_flight": 0, "errors": 0})
+            host_stats["requests"] += 1
+            host_stats["in_flight"] += 1
+
+    def _end(self, host: str, failed: bool) -> None:
+        with self._lock:
+            m = self._metrics
+            m["in_flight"] -= 1
+            m["hosts"][host]["in_flight"] -= 1
+            if failed:
+                m["errors"] += 1
+                m["hosts"][host]["errors"] += 1
+
+    # ---------- 请求 ----------
+    @contextlib.asynccontextmanager
+    async def _ahost_slot(self, url: str) -> AsyncIterator[None]:
+        host = httpx.URL(url).host
+        semaphores = self._async_semaphores.setdefault(asyncio.get_running_loop(), {})
+        semaphore = semaphores.setdefault(host, asyncio.Semaphore(self.max_per_host))
+
+        start = time.perf_counter()
+        async with semaphore:
+            self._begin(host, time.perf_counter() - start)
+            failed = True
+            try:
+                yield
+                failed = False
+            finally:
+                self._end(host, failed)
+
+    @contextlib.contextmanager
+    def _host_slot(self, url: str) -> Iterator[None]:
+        host = httpx.URL(url).host
+        with self._lock:
+            semaphore = self._sync_semaphores.setdefault(host, threading.BoundedSemaphore(self.max_per_host))
+
+        start = time.perf_counter()
+        with semaphore:
+            self._begin(host, time.perf_counter() - start)
+            failed = True
+            try:
+                yield
+                failed = False
+            finally:
+                self._end(host, failed)
+
+    async def arequest(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        client = self.get_async_client()
+        async with self._ahost_slot(url):
+            return await client.request(method, url, extensions={"trace": self._atrace}, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        client = self.get_sync_client()
+        with self._host_slot(url):
+            return client.request(method, url, extensions={"trace": self._trace}, **kwargs)
+
+    @contextlib.asynccontextmanager
+    async def astream(self, method: str, url: str, **kwargs: Any) -> AsyncIterator[httpx.Response]:
+        """流式请求：响应体不整体读入内存，由调用方按块读取（占用主机并发名额直到读完）"""
+        client = self.get_async_client()
+        async with self._ahost_slot(url):
+            async with client.stream(method, url, extensions={"trace": self._atrace}, **kwargs) as response:
+                yield response
+
+    @contextlib.contextmanager
+    def stream(self, method: str, url: str, **kwargs: Any) -> Iterator[httpx.Response]:
+        client = self.get_sync_client()
+        with self._host_slot(url):
+            with client.stream(method, url, extensions={"trace": self._trace}, **kwargs) as response:
+                yield response
+
+    def _pool_connections(self) -> List[Dict[str, int]]:
+        clients = list(self._async_clients.values())
+        if self._sync_client is not None:
+            clients.append(self._sync_client)
+        pools = []
+        for client in clients:
+            pool = getattr(getattr(client, "_transport", None), "_pool", None)
+            connections = list(getattr(pool, "connections", []))
+            pools.append({
+                "connections": len(connections),
+                "idle": sum(1 for c in connections if c.is_idle()),
+            })
+        return pools
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            m = {**self._metrics, "hosts": {h: dict(v) for h, v in self._metrics["hosts"].items()}}
+        requests = m["requests"]
+        return {
+            "requests": requests,
+            "errors": m["errors"],
+            "in_flight": m["in_flight"],
+            "new_connections": m["new_connections"],
+            "connection_reuse_ratio": round(1 - m["new_connections"] / requests, 4) if requests else 0.0,
+            "host_wait_avg_ms": round(m["host_wait_total"] / requests * 1000, 3) if requests else 0.0,
+            "host_wait_max_ms": round(m["host_wait_max"] * 1000, 3),
+            "hosts": m["hosts"],
+            "pools": self._pool_connections(),
+            "limits": {
+                "max_connections": self.limits.max_connections,
+                "max_keepalive_connections": self.limits.max_keepalive_connections,
+                "max_per_host": self.max_per_host,
+            },
+        }
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环的异步客户端与同步客户端（应用退出时调用）"""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+        self._async_semaphores.pop(loop, None)
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client = None
+
+
+http_client_pool = HTTPClientPool()
+
+__all__ = ["HTTPClientPool", "http_client_pool"]
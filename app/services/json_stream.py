@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+import re
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, Iterator, List, Optional, Tuple
+
+import orjson
+
+# 结构字符；字符串整体用 _STRING_END 一次跳过
+_STRUCTURAL = re.compile(rb'[\[\]{}",:]')
+# 元素内部只关心括号与字符串
+_BRACKETS = re.compile(rb'[\[\]{}"]')
+_STRING_END = re.compile(rb'(?:[^"\\]|\\.)*"', re.S)
+_NON_SPACE = re.compile(rb"\S")
+_SCALAR_END = re.compile(rb"[,\]]")
+_SCALAR = re.compile(rb"[^,}\]\s]+")
+# 元素内部括号过多时不再逐个尝试解析，改为精确扫描
+_MAX_SPECULATIVE_TRIES = 8
+
+_OBJECT, _ARRAY = 0x7B, 0x5B  # b"{", b"["
+
+
+# ──────────────────────────────────────────────
+# 流式 JSON 路径提取：只解析 data_path 子树，逐条产出记录
+# ──────────────────────────────────────────────
+class JSONPathStream:
+    """
+    增量解析 JSON 字节流，只取出 data_path（如 data.items）处的值。
+
+    - 目标是数组：逐个元素用 orjson 解析后产出，其余部分只扫描、不建对象
+    - 目标是对象或标量：整体解析后作为一条记录产出
+    - 缓冲区只保留未处理完的元素，内存峰值约为「单个分块 + 单条记录」
+
+    用法：对每个分块调用 feed() 取回已完整的记录，结束时调用 close()。
+    """
+
+    def __init__(self, data_path: Optional[str] = None):
+        self.target = tuple(data_path.split(".")) if data_path else ()
+        self.found = False
+        self.bytes_read = 0
+        self._buf = b""
+        self._pos = 0
+        # 每层容器：[类型, 当前 key, 是否期待 key]
+        self._stack: List[list] = []
+        self._mode = "seek"
+        self._at_target = not self.target
+        self._target_depth = 0
+        self._elem_start: Optional[int] = None
+        self._last_delim: Optional[int] = None
+
+    # ---------- 对外接口 ----------
+    def feed(self, chunk: bytes) -> List[Any]:
+        self.bytes_read += len(chunk)
+        records: List[Any] = []
+        if self._mode == "done":
+            # 目标已取完，剩余内容直接丢弃
+            return records
+        self._buf += chunk
+        self._scan(records)
+        return records
+
+    def close(self) -> List[Any]:
+        """输入结束：目标为顶层标量等没有结束符的情况在此处产出"""
+        records: List[Any] = []
+        if self._mode == "single" and self._elem_start is not None:
+            tail = self._buf[self._elem_start:].strip()
+            if tail:
+                records.append(orjson.loads(tail))
+            self._mode = "done"
+        elif self._mode not in ("seek", "done"):
+            raise ValueError("JSON 数据不完整：目标数组未结束")
+        self._buf, self._pos = b"", 0
+        return records
+
+    # ---------- 缓冲区 ----------
+    def _shift(self, offset: int) -> None:
+        """丢弃已处理的前缀后，修正记录在缓冲区中的下标"""
+        self._pos = 0
+        if offset:
+            if self._elem_start is not None:
+                self._elem_start -= offset
+            if self._last_delim is not None:
+                self._last_delim -= offset
+
+    def _keep_from(self) -> int:
+        marks = [m for m in (self._elem_start, self._last_delim) if m is not None]
+        return min(marks + [self._pos])
+
+    def _suspend(self, at: int) -> None:
+        """数据不足：从 at 处（或更早的未完成元素处）等待下一个分块"""
+        keep = min(self._keep_from(), at) if self._mode != "seek" else at
+        self._buf = self._buf[keep:]
+        self._shift(keep)
+        self._pos = at - keep
+
+    # ---------- 扫描 ----------
+    def _path_matches(self) -> bool:
+        return len(self._stack) == len(self.target) and all(
+            frame[0] == _OBJECT and frame[1] == key for frame, key in zip(self._stack, self.target)
+        )
+
+    def _enter_target(self, records: List[Any]) -> bool:
+        """定位到目标值的起始处；返回 False 表示需要更多数据"""
+        buf = self._buf
+        m = _NON_SPACE.search(buf, self._pos)
+        if m is None:
+            self._suspend(len(buf))
+            return False
+        self.found = True
+        self._at_target = False
+        start = m.start()
+        if buf[start] == _ARRAY:
+            self._mode = "array"
+            self._stack.append([_ARRAY, None, False])
+            self._target_depth = len(self._stack)
+            self._last_delim = start + 1
+            self._pos = start + 1
+        else:
+            self._mode = "single"
+            self._elem_start = start
+            self._pos = start
+        return True
+
+    def _scan(self, records: List[Any]) -> None:
+        while True:
+            if self._at_target and not self._enter_target(records):
+                return
+            if self._mode == "array" and len(self._stack) == self._target_depth:
+                if not self._scan_array_level(records):
+                    return
+                if self._mode == "done":
+                    return
+                continue
+            if self._mode == "single":
+                self._scan_single(records)
+                return
+            if not self._scan_structural(records):
+                return
+
+    def _scan_structural(self, records: List[Any]) -> bool:
+        """查找目标路径阶段：跟踪容器栈与 key"""
+        buf = self._buf
+        m = _STRUCTURAL.search(buf, self._pos)
+        if m is None:
+            self._suspend(len(buf))
+            return False
+        i = m.start()
+        c = buf[i]
+        if c == 0x22:  # "
+            end = _STRING_END.match(buf, i + 1)
+            if end is None:
+                self._suspend(i)
+                return False
+            frame = self._stack[-1] if self._stack else None
+            if frame is not None and frame[0] == _OBJECT and frame[2] and len(self._stack) <= len(self.target):
+                frame[1] = orjson.loads(buf[i:end.end()])
+            self._pos = end.end()
+        elif c == 0x3A:  # :
+            self._stack[-1][2] = False
+            self._pos = i + 1
+            if self._mode == "seek" and self._path_matches():
+                self._at_target = True
+        elif c == 0x2C:  # ,
+            if self._stack and self._stack[-1][0] == _OBJECT:
+                self._stack[-1][2] = True
+            self._pos = i + 1
+        elif c in (_OBJECT, _ARRAY):
+            self._stack.append([c, None, c == _OBJECT])
+            self._pos = i + 1
+        else:
+            if self._stack:
+                self._stack.pop()
+            self._pos = i + 1
+        return True
+
+    def _scan_array_level(self, records: List[Any]) -> bool:
+        """目标数组这一层：逐个切出元素并解析"""
+        buf = self._buf
+        m = _NON_SPACE.search(buf, self._pos)
+        if m is None:
+            self._suspend(len(buf))
+            return False
+        i = m.start()
+        c = buf[i]
+        if c == _OBJECT:
+            batch = self._parse_batch(i)
+            if batch is not None:
+                end, batch_records = batch
+                records.extend(batch_records)
+                self._elem_start, self._last_delim = None, None
+                self._pos = end
+                return True
+        if c in (_OBJECT, _ARRAY):
+            parsed = self._parse_element(i)
+            if parsed is None:
+                self._elem_start = i
+                self._suspend(i)
+                return False
+            end, record = parsed
+            records.append(record)
+            self._elem_start, self._last_delim = None, None
+            self._pos = end
+            return True
+        if c == 0x22:  # 字符串元素
+            end = _STRING_END.match(buf, i + 1)
+            if end is None:
+                self._suspend(i)
+                return False
+            self._pos = end.end()
+            return True
+        if c == 0x2C or c == 0x5D:  # , 或 ]
+            if self._last_delim is not None:
+                scalar = buf[self._last_delim:i].strip()
+                if scalar:
+                    records.append(orjson.loads(scalar))
+            self._last_delim = i + 1
+            self._pos = i + 1
+            if c == 0x5D:
+                self._stack.pop()
+                self._mode = "done"
+                self._last_delim = None
+            return True
+        # 数字 / true / false / null：等到下一个分隔符时整体解析
+        m = _SCALAR_END.search(buf, i)
+        if m is None:
+            self._suspend(i)
+            return False
+        self._pos = m.start()
+        return True
+
+    def _scan_single(self, records: List[Any]) -> bool:
+        """目标是对象 / 标量：整体解析"""
+        buf = self._buf
+        i = self._elem_start
+        if buf[i] in (_OBJECT, _ARRAY):
+            parsed = self._parse_element(i)
+            if parsed is None:
+                self._suspend(i)
+                return False
+            records.append(parsed[1])
+            self._mode = "done"
+            self._elem_start = None
+            return True
+        if buf[i] == 0x22:
+            # 字符串标量以右引号结束：引号还没到（分块切在字符串中间）时等待，
+            # 不能退回到按 , } ] 切分，字符串内部可能含有逗号
+            m = _STRING_END.match(buf, i + 1)
+            if m is None:
+                self._suspend(i)
+                return False
+            end = m.end()
+        else:
+            # 嵌套位置上的其他标量：以 , } ] 结束；顶层标量在 close() 中处理
+            m = _SCALAR.match(buf, i)
+            if m is None or m.end() == len(buf):
+                self._suspend(i)
+                return False
+            end = m.end()
+        records.append(orjson.loads(buf[i:end]))
+        self._mode = "done"
+        self._elem_start = None
+        return True
+
+    def _parse_batch(self, start: int) -> Optional[Tuple[int, List[Any]]]:
+        """
+        批量快速路径：把缓冲区中从 start 起连续的完整对象元素拼成一个数组，一次交给 orjson 解析。
+        切点取缓冲区中靠后的右花括号：只有恰好落在元素结尾时拼出的数组才合法，否则换前一个再试。
+        """
+        buf = self._buf
+        end = len(buf)
+        for _ in range(_MAX_SPECULATIVE_TRIES):
+            end = buf.rfind(b"}", start, end)
+            if end < 0:
+                return None
+            try:
+                values = orjson.loads(b"[" + buf[start:end + 1] + b"]")
+            except orjson.JSONDecodeError:
+                continue
+            return end + 1, values
+        return None
+
+    def _parse_element(self, start: int) -> Optional[Tuple[int, Any]]:
+        """解析从 start 开始的容器元素，返回 (结束位置, 值)；数据不完整时返回 None"""
+        buf = self._buf
+        closer = b"}" if buf[start] == _OBJECT else b"]"
+        # 快速路径：扁平记录只需找到第一个右括号并尝试解析
+        pos = start
+        for _ in range(_MAX_SPECULATIVE_TRIES):
+            end = buf.find(closer, pos + 1)
+            if end < 0:
+                return None
+            try:
+                return end + 1, orjson.loads(buf[start:end + 1])
+            except orjson.JSONDecodeError:
+                pos = end
+        # 深层嵌套：精确跟踪括号深度，跳过字符串
+        depth, pos = 0, start
+        while True:
+            m = _BRACKETS.search(buf, pos)
+            if m is None:
+                return None
+            i = m.start()
+            c = buf[i]
+            if c == 0x22:
+                end = _STRING_END.match(buf, i + 1)
+                if end is None:
+                    return None
+                pos = end.end()
+                continue
+            depth += 1 if c in (_OBJECT, _ARRAY) else -1
+            pos = i + 1
+            if depth == 0:
+                return pos, orjson.loads(buf[start:pos])
+
+
+def iter_json_records(chunks: Iterable[bytes], data_path: Optional[str] = None) -> Iterator[Any]:
+    stream = JSONPathStream(data_path)
+    for chunk in chunks:
+        yield from stream.feed(chunk)
+    yield from stream.close()
+
+
+async def aiter_json_records(chunks: AsyncIterable[bytes], data_path: Optional[str] = None) -> AsyncIterator[Any]:
+    stream = JSONPathStream(data_path)
+    async for chunk in chunks:
+        for record in stream.feed(chunk):
+            yield record
+    for record in stream.close():
+        yield record
+
+
+__all__ = ["JSONPathStream", "iter_json_records", "aiter_json_records"]
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import csv
+import io
+import math
+from dataclasses import dataclass, field
+from itertools import accumulate
+from typing import Any, Dict, List, Tuple
+
+import pandas as pd
+
+from app.config.env_utils import PROMPT_CELL_MAX_CHARS
+from app.services.token_counter import count_tokens
+
+
+@dataclass
+class PromptBlock:
+    """序列化后的数据块：文本、实际放入的行数、token 数与做了字典编码的列"""
+    text: str
+    rows: int
+    total_rows: int
+    tokens: int
+    encoded_columns: List[str] = field(default_factory=list)
+
+
+# ──────────────────────────────────────────────
+# 单元格格式化：数值去掉多余小数位，日期去掉零点时间，长文本截断
+# ──────────────────────────────────────────────
+def _format_float(value: float) -> str:
+    if not math.isfinite(value):
+        return "" if math.isnan(value) else str(value)
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return f"{value:.6g}"
+
+
+def _format_text(value: Any, max_chars: int) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    text = " ".join(str(value).split())
+    return text if len(text) <= max_chars else text[:max_chars - 1] + "…"
+
+
+def format_column(series: pd.Series, max_chars: int = PROMPT_CELL_MAX_CHARS) -> List[str]:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        stamps = series.dt.tz_localize(None) if series.dt.tz is not None else series
+        present = stamps.dropna()
+        only_dates = bool((present == present.dt.normalize()).all())
+        text = stamps.dt.strftime("%Y-%m-%d" if only_dates else "%Y-%m-%d %H:%M:%S")
+        return text.fillna("").tolist()
+    if pd.api.types.is_bool_dtype(series):
+        return ["" if pd.isna(v) else str(bool(v)).lower() for v in series]
+    if pd.api.types.is_float_dtype(series):
+        return [_format_float(v) for v in series.to_numpy(dtype="float64", na_value=math.nan)]
+    if pd.api.types.is_integer_dtype(series):
+        return ["" if pd.isna(v) else str(int(v)) for v in series]
+    return [_format_text(v, max_chars) for v in series]
+
+
+# ──────────────────────────────────────────────
+# 字典编码：重复出现的文本值换成短编码，仅在确实节省 token 时启用
+# ──────────────────────────────────────────────
+def _dictionary(name: str, cells: List[str]) -> Tuple[List[str], str]:
+    """返回 (编码后的单元格, 字典说明)；不值得编码时字典说明为空"""
+    distinct = [v for v in dict.fromkeys(cells) if v]
+    if not distinct or len(distinct) == len([c for c in cells if c]):
+        return cells, ""
+    codes = {v: str(i) for i, v in enumerate(distinct)}
+    legend = f"{name}: " + " | ".join(f"{code}={v}" for v, code in codes.items())
+    encoded = [codes.get(c, "") for c in cells]
+    if count_tokens("\n".join(encoded)) + count_tokens(legend) >= count_tokens("\n".join(cells)):
+        return cells, ""
+    return encoded, legend
+
+
+def _csv_lines(rows: List[List[str]]) -> List[str]:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue().splitlines()
+
+
+def _render(columns: List[str], cells: Dict[str, List[str]], text_columns: List[str]) -> Tuple[str, List[str], List[str]]:
+    """返回 (表头文本, 各数据行, 做了字典编码的列)"""
+    legends, encoded_columns = [], []
+    for name in text_columns:
+        cells[name], legend = _dictionary(name, cells[name])
+        if legend:
+            legends.append(legend)
+            encoded_columns.append(name)
+
+    header = []
+    if legends:
+        header.append("字典编码（单元格中的数字对应右侧取值）：" + "；".join(legends))
+    header.extend(_csv_lines([columns]))
+    lines = _csv_lines([list(row) for row in zip(*(cells[c] for c in columns))]) if columns else []
+    return "\n".join(header), lines, encoded_columns
+
+
+def serialize_frame(
+    frame: pd.DataFrame,
+    budget_tokens: int,
+    max_chars: int = PROMPT_CELL_MAX_CHARS,
+) -> PromptBlock:
+    """
+    把数据行序列化为紧凑的 CSV 文本（替代 json.dumps(indent=2)：列名只出现一次，没有缩进与引号开销），
+    重复出现的分类值做字典编码，并按 token 预算截取尽可能多的前若干行。
+    调用方应先把最有代表性的行排在前面。
+    """
+    total = len(frame)
+    columns = [str(c) for c in frame.columns]
+    frame = frame.set_axis(columns, axis=1)
+    cells = {name: format_column(frame[name], max_chars) for name in columns}
+    text_columns = [
+        name for name in columns
+        if frame[name].dtype == object or isinstance(frame[name].dtype, (pd.CategoricalDtype, pd.StringDtype))
+    ]
+
+    header, lines, _ = _render(columns, dict(cells), text_columns)
+    # 每行单独计数再累加，一次估出能放下多少行
+    cumulative = list(accumulate(count_tokens(line) for line in lines))
+    available = budget_tokens - count_tokens(header)
+    rows = sum(1 for used in cumulative if used <= available)
+
+    while True:
+        # 按实际保留的行重新生成字典（只包含这些行中出现的取值），整体计数仍超出预算时逐行回退
+        kept = {name: values[:rows] for name, values in cells.items()}
+        header, lines, encoded_columns = _render(columns, kept, text_columns)
+        text = "\n".join([header] + lines)
+        tokens = count_tokens(text)
+        if tokens <= budget_tokens or rows == 0:
+            break
+        rows -= 1
+    return PromptBlock(
+        text=text,
+        rows=rows,
+        total_rows=total,
+        tokens=tokens,
+        encoded_columns=encoded_columns,
+    )
+
+
+__all__ = ["PromptBlock", "format_column", "serialize_frame"]
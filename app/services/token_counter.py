@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Optional
+
+from app.config.env_utils import TOKEN_ENCODING
+
+_CJK_RE = re.compile(r"[　-〿㐀-䶿一-鿿＀-￯]")
+
+
+@lru_cache(maxsize=1)
+def _get_encoding(name: str = TOKEN_ENCODING) -> Optional[object]:
+    """加载 tiktoken 编码；离线环境下首次下载词表会失败，此时返回 None 走估算"""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        print(f"tiktoken 编码 {name} 加载失败，改用字符数估算 token：{e}")
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算：中日韩字符约 1 token / 字，其余约 4 字符 / token"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def count_tokens(text: str) -> int:
+    """统计文本的 token 数（优先使用 tiktoken）"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+__all__ = ["count_tokens", "estimate_tokens"]
@@ -0,0 +1,91 @@
+"""
+嵌套 JSON 展平性能对比：pd.json_normalize vs RecordFlattener
+
+用法：
+    python -m benchmarks.flatten_benchmark
+    python -m benchmarks.flatten_benchmark --sizes 10000 100000 1000000 --width 40 --depth 3
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import random
+import time
+from typing import Any, Dict, List, Tuple
+
+import pandas as pd
+
+from app.services.dataset_registry import normalize_columns
+from app.services.flatten import RecordFlattener
+
+
+def make_records(n: int, width: int, depth: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """生成 n 条嵌套记录：每层 width 个字段，混合数值 / 字符串 / 布尔 / 缺失值，最深 depth 层"""
+    rng = random.Random(seed)
+    cities = ["北京", "上海", "广州", "深圳", "杭州"]
+
+    def node(level: int, i: int) -> Dict[str, Any]:
+        fields: Dict[str, Any] = {}
+        for j in range(width):
+            kind = j % 5
+            if kind == 0:
+                fields[f"n{j}"] = i * 31 + j
+            elif kind == 1:
+                fields[f"f{j}"] = rng.random() * 1000 if rng.random() > 0.05 else None
+            elif kind == 2:
+                fields[f"s{j}"] = cities[(i + j) % len(cities)]
+            elif kind == 3:
+                fields[f"b{j}"] = (i + j) % 2 == 0
+            else:
+                fields[f"t{j}"] = [i % 3, j]
+        if level < depth:
+            fields["child"] = node(level + 1, i)
+        return fields
+
+    return [{"id": i, **node(1, i)} for i in range(n)]
+
+
+def run_json_normalize(records: List[Dict[str, Any]]) -> pd.DataFrame:
+    frame = pd.json_normalize(records)
+    frame.columns = normalize_columns(frame.columns)
+    return frame
+
+
+def run_flattener(records: List[Dict[str, Any]]) -> pd.DataFrame:
+    frame = RecordFlattener(list_policy="keep").flatten(records)
+    frame.columns = normalize_columns(frame.columns)
+    return frame
+
+
+def timed(fn, records: List[Dict[str, Any]], repeat: int) -> Tuple[float, pd.DataFrame]:
+    best, frame = float("inf"), None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        frame = fn(records)
+        best = min(best, time.perf_counter() - start)
+    return best, frame
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="json_normalize 与 RecordFlattener 的展平耗时对比")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--width", type=int, default=5, help="每层字段数")
+    parser.add_argument("--depth", type=int, default=2, help="嵌套层数")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'记录数':>10} {'列数':>6} {'json_normalize(s)':>18} {'RecordFlattener(s)':>19} {'加速比':>8} {'结果一致':>8}")
+    for n in args.sizes:
+        records = make_records(n, args.width, args.depth)
+        repeat = 1 if n >= 1_000_000 else args.repeat
+        fast_s, fast = timed(run_flattener, records, repeat)
+        base_s, base = timed(run_json_normalize, records, repeat)
+        # list_policy=keep 时两者列集合与取值应一致（列顺序可能不同）
+        same = sorted(base.columns) == sorted(fast.columns) and base.equals(fast[base.columns])
+        print(f"{n:>10} {len(fast.columns):>6} {base_s:>18.3f} {fast_s:>19.3f} {base_s / fast_s:>7.1f}x {str(same):>8}")
+        del records, base, fast
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,21 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api import api
+from app.services.http_client import http_client_pool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # 关闭共享的 HTTP 连接池
+    await http_client_pool.aclose()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,